@@ -1,10 +1,11 @@
 import decimal
-from sheets.utils import remove_exponent, error_matcher
+from sheets.utils import error_matcher, convert_location_to_idx
 import re
 from sheets.CellError import CellError
+from sheets.Numeric import DECIMAL_BACKEND
 
 # there will only be 4 types of cells
-# Decimals (numbers)
+# Numbers (Decimals, or floats or ints depending on the numeric mode)
 # Strings (text, dates, etc) [For these we don't need to adjust
 # their representation]
 # Formulas (strings that start with "=" and which we need to calculate
@@ -43,24 +44,37 @@ class Cell_location_obj:
 class Cell:
     """Cell Class: The Fundamental unit of our Spread Sheet."""
 
-    def __init__(self, location, contents: str):
+    def __init__(self, location, contents: str, numeric=DECIMAL_BACKEND):
         """
         args:
             location: the location of the cell given in spreadsheet format
             contents: the user input string representing the cell
+            numeric: the numeric backend of the workbook, which decides the
+                     type numbers are held as (see sheets.Numeric)
         """
         self.children = {}  # str object
         self.contents = None
         self.value = None
         self.location = location
-        self.parsed_formula = None
+        self.numeric = numeric
+        self.formula_template = None
         self.set_contents(contents)
 
-    def cache_formula(self, formula):
-        self.parsed_formula = formula
+    def set_formula_template(self, template, contents=None, keep_value=False):
+        """Sets the formula template of the cell.  Without contents, the text of
+        the formula is only built from the template when it is asked for."""
+        self.contents = contents
+        self.formula_template = template
+        if not keep_value:
+            self.value = None
+
+    def get_formula_template(self):
+        return self.formula_template
 
-    def get_cached_formula(self):
-        return self.parsed_formula
+    def is_formula(self) -> bool:
+        return self.formula_template is not None or (
+            self.contents is not None and self.contents[0] == "="
+        )
 
     def set_contents(self, contents: str, keep_value=False):
         """
@@ -68,6 +82,7 @@ class Cell:
         """
         if not isinstance(contents, str) and contents is not None:
             raise TypeError("Contents must be a string")
+        self.formula_template = None
         if contents is not None and contents.strip() == "":
             self.contents = None
         elif contents is not None:
@@ -85,27 +100,7 @@ class Cell:
             if contents[0] == "'":
                 self.value = str(contents[1:])
             elif contents[0] == "=":
-                if isinstance(formula_value, bool):
-                    self.value = formula_value
-                elif contents.strip().lower() == "=version()":
-                    self.value = formula_value
-                elif formula_value is not None and not isinstance(
-                    formula_value, CellError
-                ):
-                    try:
-                        # if isinstance(formula_value,bool):
-                        #     raise decimal.InvalidOperation("We refuse to convert bools")
-                        decimal_value = decimal.Decimal(formula_value)
-                        if decimal_value.is_finite():
-                            self.value = remove_exponent(decimal_value)
-                        else:
-                            self.value = formula_value
-                        if self.value == -0:
-                            self.value = decimal.Decimal(0)
-                    except decimal.InvalidOperation:
-                        self.value = formula_value
-                else:
-                    self.value = formula_value
+                self.set_formula_value(formula_value)
             elif error_matcher(contents) is not None:
                 self.value = error_matcher(contents)
                 pass
@@ -113,19 +108,45 @@ class Cell:
                 self.value = contents.lower() == "true"
 
             else:
-                try:
-                    decimal_value = decimal.Decimal(contents)
-                    if decimal_value.is_finite():
-                        self.value = remove_exponent(decimal_value)
-                    else:
-                        self.value = contents
-                except decimal.InvalidOperation:
-                    self.value = contents
+                number = self.numeric.parse(contents)
+                self.value = contents if number is None else number
+
+    def set_formula_value(self, formula_value):
+        """Sets the value of a formula cell to the value its formula evaluated to."""
+        if isinstance(formula_value, bool):
+            self.value = formula_value
+        elif self._is_version_formula():
+            self.value = formula_value
+        elif formula_value is not None and not isinstance(formula_value, CellError):
+            try:
+                self.value = self.numeric.store(formula_value)
+            except (decimal.InvalidOperation, ValueError):
+                self.value = formula_value
+        else:
+            self.value = formula_value
+
+    def update_value(self, formula_value):
+        """Sets the value of the cell after its formula has been evaluated.
+        Cells without a formula keep the value of their contents."""
+        if self.is_formula():
+            self.set_formula_value(formula_value)
+        else:
+            self.set_cell_value(self.contents, formula_value=formula_value)
+
+    def _is_version_formula(self) -> bool:
+        # Formulas with relative references can't be =VERSION(), so there is
+        # no need to build their text.
+        if self.contents is None and self.formula_template.is_relative:
+            return False
+        return self.get_contents().strip().lower() == "=version()"
 
     def get_value(self):
         return self.value
 
     def get_contents(self) -> str:
+        if self.contents is None and self.formula_template is not None:
+            row, col = convert_location_to_idx(self.location.rsplit("!", 1)[-1])
+            self.contents = self.formula_template.render(row, col)
         return self.contents
 
     def set_children(self, children):
@@ -0,0 +1,299 @@
+import functools
+import lark
+from sheets.CellError import CellError
+from sheets.CellErrorType import CellErrorType
+from sheets.RangeRef import RangeRef
+from sheets.Functions import function_directory
+from sheets.Numeric import DECIMAL_BACKEND
+from sheets.Parser import (
+    ERROR_MAPPING,
+    FormulaEvaluator,
+    compare_values,
+    concatenate_values,
+    add_values,
+    apply_unary_op,
+    multiply_values,
+    parse_template_ref,
+)
+from sheets.utils import (
+    convert_location_to_idx,
+    convert_idx_to_location,
+    get_highest_precedence_error,
+)
+
+class CompiledFormula:
+    """A formula compiled into nested Python closures.
+
+    Every node of the parse tree becomes a function of a FormulaEvaluator, so
+    evaluating the formula is a chain of plain function calls rather than a
+    walk over the lark tree.  Relative references are resolved against the
+    evaluator's location, so one compiled formula is shared by every cell
+    holding the same formula template."""
+
+    def __init__(self, tree: lark.Tree, root):
+        """
+        args:
+            tree: the template tree the formula was compiled from
+            root: the closure for the root node of the tree
+        """
+        self.tree = tree
+        self.root = root
+
+    def evaluate(self, evaluator):
+        """Returns the value of the formula, recording the cells it references
+        in the evaluator."""
+        return self.root(evaluator)
+
+
+def compile_constant(value):
+    """Compiles a value that is known when the formula is compiled.  The value
+    is kept on the closure so that the nodes above it can be folded too."""
+
+    def evaluate(evaluator):
+        return value
+
+    evaluate.value = value
+    return evaluate
+
+
+def is_constant(node) -> bool:
+    return hasattr(node, "value")
+
+
+def fold(node, children, evaluator):
+    """Evaluates node once, at compile time, if all of its children are
+    constants.  Anything that fails to evaluate is left to fail at run time
+    the way it always has."""
+    if not all(is_constant(child) for child in children):
+        return node
+    try:
+        return compile_constant(node(evaluator))
+    except Exception:
+        return node
+
+
+def compile_binary_op(left, op, right, apply_op):
+    """Compiles a binary operator node.  As with formula_decor, both operands
+    are evaluated first and the highest precedence error among them wins."""
+
+    def evaluate(evaluator):
+        l = left(evaluator)
+        r = right(evaluator)
+        error = get_highest_precedence_error([l, r])
+        if error is not None:
+            return error
+        return apply_op(l, op, r)
+
+    return evaluate
+
+
+def constant_location(location):
+    return lambda evaluator: location
+
+
+def compile_location(cell_ref_tok):
+    """Compiles a template cell reference into a function returning the
+    location it refers to from the cell being evaluated."""
+    if cell_ref_tok.type == "CELLREF_BOTH_ABS":
+        return constant_location(cell_ref_tok.value.lower().replace("$", ""))
+
+    (row, row_is_relative, col, col_is_relative) = parse_template_ref(
+        cell_ref_tok.value
+    )
+    if row_is_relative and col_is_relative:
+        return lambda evaluator: convert_idx_to_location(
+            evaluator.row + row, evaluator.col + col
+        )
+    if row_is_relative:
+        return lambda evaluator: convert_idx_to_location(evaluator.row + row, col)
+    return lambda evaluator: convert_idx_to_location(row, evaluator.col + col)
+
+
+def compile_cell(sheet_name, locate):
+    """Compiles a cell reference.  A sheet_name of None refers to the sheet of
+    the cell being evaluated."""
+
+    def evaluate(evaluator):
+        cell_sheet = evaluator.sheet_name if sheet_name is None else sheet_name
+        location = locate(evaluator)
+        evaluator.refs.add(str(cell_sheet) + "!" + location)
+        try:
+            return evaluator.workbook.get_cell_value(cell_sheet, location)
+        except ValueError as E:
+            return CellError(
+                CellErrorType.BAD_REFERENCE,
+                "During parsing an invalid cell location was discovered.",
+                E,
+            )
+        except KeyError as E:
+            return CellError(
+                CellErrorType.BAD_REFERENCE,
+                "During parsing a sheet was given that was not found in the workbook.",
+                E,
+            )
+
+    return evaluate
+
+
+def compile_corner(cell_ref_tok):
+    """Compiles a corner of a cell range into a function returning its row
+    and column indexes from the cell being evaluated."""
+    if cell_ref_tok.type == "CELLREF_BOTH_ABS":
+        corner = convert_location_to_idx(cell_ref_tok.value)
+        return lambda evaluator: corner
+
+    (row, row_is_relative, col, col_is_relative) = parse_template_ref(
+        cell_ref_tok.value
+    )
+    if row_is_relative and col_is_relative:
+        return lambda evaluator: (evaluator.row + row, evaluator.col + col)
+    if row_is_relative:
+        return lambda evaluator: (evaluator.row + row, col)
+    return lambda evaluator: (row, evaluator.col + col)
+
+
+def compile_range(sheet_name, loc_1_tok, loc_2_tok):
+    """Compiles a cell range into a function returning a RangeRef.  The cells
+    of the range are only read once a function asks for them."""
+    corner_1 = compile_corner(loc_1_tok)
+    corner_2 = compile_corner(loc_2_tok)
+
+    def evaluate(evaluator):
+        row_1, col_1 = corner_1(evaluator)
+        row_2, col_2 = corner_2(evaluator)
+        return RangeRef(
+            evaluator,
+            evaluator.sheet_name if sheet_name is None else sheet_name,
+            min(row_1, row_2),
+            min(col_1, col_2),
+            max(row_1, row_2),
+            max(col_1, col_2),
+        )
+
+    return evaluate
+
+
+class FormulaCompiler(lark.Transformer):
+    """Compiles formula template trees (see FormulaToTemplate) into
+    CompiledFormulas.  Mirrors FormulaEvaluator node for node, so a compiled
+    formula returns exactly what interpreting the original tree would.
+
+    Subtrees without cell references, such as (6*1 - 2/(5+1) * 1000) or
+    IF(TRUE, 2, 4), are folded into constants as they are compiled, so they
+    are not recomputed every time the formula is evaluated."""
+
+    def __init__(self, formula_functions=None, numeric=DECIMAL_BACKEND):
+        """
+        args:
+            formula_functions: the FunctionRegistry of functions formulas may
+                               call; the workbook's function_directory by
+                               default
+            numeric: the numeric backend of the workbook (see sheets.Numeric),
+                     which numbers are compiled and folded in
+        """
+        super().__init__()
+        if formula_functions is None:
+            formula_functions = function_directory
+        self.formula_functions = formula_functions
+        self.numeric = numeric
+        self.add_values = functools.partial(add_values, numeric=numeric)
+        self.multiply_values = functools.partial(multiply_values, numeric=numeric)
+        # Constant subtrees never touch the workbook or the cell's location
+        self.folding_evaluator = FormulaEvaluator(
+            None, None, formula_functions, numeric=numeric
+        )
+
+    def compile(self, tree: lark.Tree) -> CompiledFormula:
+        return CompiledFormula(tree, self.transform(tree))
+
+    def fold_binary_op(self, left, op, right, apply_op):
+        return fold(
+            compile_binary_op(left, op, right, apply_op),
+            [left, right],
+            self.folding_evaluator,
+        )
+
+    def parens(self, children):
+        return children[0]
+
+    def comp_expr(self, children):
+        (left, op, right) = children
+        return self.fold_binary_op(left, str(op), right, compare_values)
+
+    def concat_expr(self, children):
+        (left, right) = children
+        return self.fold_binary_op(
+            left, None, right, lambda l, op, r: concatenate_values(l, r)
+        )
+
+    def add_expr(self, children):
+        (left, op, right) = children
+        return self.fold_binary_op(left, str(op), right, self.add_values)
+
+    def mul_expr(self, children):
+        (left, op, right) = children
+        return self.fold_binary_op(left, str(op), right, self.multiply_values)
+
+    def unary_op(self, children):
+        (op, operand) = children
+        op = str(op)
+        numeric = self.numeric
+
+        def evaluate(evaluator):
+            r = operand(evaluator)
+            if isinstance(r, CellError):
+                return r
+            return apply_unary_op(op, r, numeric)
+
+        return fold(evaluate, [operand], self.folding_evaluator)
+
+    def number(self, children):
+        return compile_constant(self.numeric.literal(str(children[0])))
+
+    def string(self, children):
+        return compile_constant(str(children[0])[1:-1])
+
+    def boolean(self, children):
+        value = children[0].lower()
+        if value == "false":
+            return compile_constant(False)
+        elif value == "true":
+            return compile_constant(True)
+        else:
+            raise ValueError("Invalid boolean value???")
+
+    def error(self, children):
+        return compile_constant(ERROR_MAPPING[children[0].lower()])
+
+    def cell(self, children):
+        if len(children) == 2:
+            return compile_cell(str(children[0]), compile_location(children[1]))
+        return compile_cell(None, compile_location(children[0]))
+
+    def range_expr(self, children):
+        if len(children) == 3:
+            return compile_range(str(children[0]), children[1], children[2])
+        return compile_range(None, children[0], children[1])
+
+    def function(self, children):
+        """Functions are looked up, and their arguments counted, when the
+        formula is compiled.  Calls to pure functions with constant arguments
+        are folded."""
+        func_name = str(children[0])
+        args = children[1:]
+
+        info = self.formula_functions.get(func_name)
+        if info is None:
+            return lambda evaluator: CellError(
+                CellErrorType.BAD_NAME, f"{func_name} is not a valid function name"
+            )
+        error = info.check_args(len(args))
+        if error is not None:
+            return lambda evaluator: error
+
+        def evaluate(evaluator):
+            return info.bind(evaluator)(args)
+
+        if not info.pure:
+            return evaluate
+        return fold(evaluate, args, self.folding_evaluator)
@@ -0,0 +1,194 @@
+import collections
+import decimal
+from sheets.CellError import CellError
+from sheets.Numeric import is_number
+from sheets.utils import get_highest_precedence_error
+
+# Criterion operators, longest first so "<=" isn't read as "<"
+CRITERION_OPERATORS = ["<=", ">=", "<>", "=", "<", ">"]
+
+# The kinds of value a criterion compares, in the order they sort in.  Values
+# of different kinds are never equal, and are never less or greater than one
+# another either.
+NUMBER, TEXT, BOOLEAN, EMPTY, ERROR = range(5)
+
+
+def get_criteria_key(value) -> tuple:
+    """Returns the (kind, value) a cell value is indexed under.  Text is
+    compared case-insensitively, as in formulas."""
+    if value is None:
+        return (EMPTY, None)
+    if isinstance(value, bool):
+        return (BOOLEAN, value)
+    if is_number(value):
+        return (NUMBER, value)
+    if isinstance(value, str):
+        return (TEXT, value.lower())
+    return (ERROR, value.get_type())
+
+
+def parse_criterion(criterion):
+    """Returns the (operator, key) of a criterion given to SUMIF, COUNTIF and
+    the like.  Text may start with one of CRITERION_OPERATORS, as in ">=10"
+    or "<>apple"; the rest is read as a number or a boolean if it is one.
+    Anything else matches the values equal to it, and an empty cell or
+    an empty string matches empty cells."""
+    if not isinstance(criterion, str):
+        return ("=", get_criteria_key(criterion))
+
+    operator = "="
+    for prefix in CRITERION_OPERATORS:
+        if criterion.startswith(prefix):
+            operator = prefix
+            criterion = criterion[len(prefix):]
+            break
+
+    if criterion == "":
+        return (operator, (EMPTY, None))
+    if criterion.lower() in ("true", "false"):
+        return (operator, (BOOLEAN, criterion.lower() == "true"))
+    try:
+        number = decimal.Decimal(criterion)
+    except decimal.InvalidOperation:
+        return (operator, (TEXT, criterion.lower()))
+    if not number.is_finite():
+        return (operator, (TEXT, criterion.lower()))
+    return (operator, (NUMBER, number))
+
+
+def matches(operator: str, key: tuple, other: tuple) -> bool:
+    """Whether a value indexed under key meets the criterion (operator, other)."""
+    if operator == "=":
+        return key == other
+    if operator == "<>":
+        return key != other
+    if key[0] != other[0] or key[0] in (EMPTY, ERROR):
+        return False
+    if operator == "<":
+        return key[1] < other[1]
+    if operator == "<=":
+        return key[1] <= other[1]
+    if operator == ">":
+        return key[1] > other[1]
+    return key[1] >= other[1]
+
+
+class CriteriaIndex:
+    """Maps each (kind, value) in one column of a cell range to the rows it
+    appears in, as SUMIF, COUNTIF and the like test them against their
+    criteria."""
+
+    def __init__(self, sheet, epoch: int, values: list, refs: list):
+        """
+        args:
+            sheet: the Sheet the values were read from
+            epoch: the sheet's epoch for the column when they were read
+            values: the values of the column, in order
+            refs: the references to the cells the values were read from
+        """
+        self.sheet = sheet
+        self.epoch = epoch
+        self.refs = refs
+        self.rows = collections.defaultdict(list)  # {(kind, value): [row]}
+        for row, value in enumerate(values):
+            self.rows[get_criteria_key(value)].append(row)
+
+    def find(self, operator: str, key: tuple) -> list:
+        """Returns the rows whose values meet the criterion (operator, key).
+        Equality is a single lookup; the other operators only compare the
+        distinct values of the column."""
+        if operator == "=":
+            return self.rows.get(key, [])
+        found = []
+        for other, rows in self.rows.items():
+            if matches(operator, other, key):
+                found.extend(rows)
+        return found
+
+
+class CriteriaIndexCache:
+    """A bounded LRU cache of CriteriaIndexes, shared by every conditional
+    aggregate in a workbook.
+
+    Many SUMIFs and COUNTIFs over the same table test the same columns, so
+    each column is read and indexed once rather than scanned by every
+    formula.  As with LookupIndexCache, an index is rebuilt once its column
+    changes (see Sheet.get_col_epoch)."""
+
+    DEFAULT_CAPACITY = 1000
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        """
+        args:
+            capacity: the maximum number of indexes held in the cache
+        """
+        if capacity < 1:
+            raise ValueError("Criteria index capacity must be at least 1")
+        self.capacity = capacity
+        self.entries = collections.OrderedDict()  # {column of a range: CriteriaIndex}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def match(self, cell_range, criterion):
+        """Returns the set of positions (see RangeRef.get_values_at) of the
+        cells of the range meeting the criterion, or an error if the criterion
+        is one or the range's sheet doesn't exist.  Every cell of the range is
+        recorded as a reference of the formula being evaluated, just as if it
+        had been read."""
+        if isinstance(criterion, CellError):
+            return criterion
+        operator, key = parse_criterion(criterion)
+
+        sheet = cell_range.get_sheet()
+        if sheet is None:
+            # Every cell is a #REF! until the sheet exists
+            return get_highest_precedence_error(cell_range.get_values())
+
+        num_cols = cell_range.get_num_cols()
+        positions = set()
+        for col in range(num_cols):
+            index = self._get_index(cell_range, sheet, col)
+            for row in index.find(operator, key):
+                positions.add(row * num_cols + col)
+        return positions
+
+    def _get_index(self, cell_range, sheet, col: int) -> CriteriaIndex:
+        entry_key = (cell_range.sheet_name, cell_range.left + col, cell_range.top, cell_range.bottom)
+        epoch = sheet.get_col_epoch(cell_range.left + col)
+
+        index = self.entries.get(entry_key)
+        if index is not None and index.sheet is sheet and index.epoch == epoch:
+            self.hits += 1
+            self.entries.move_to_end(entry_key)
+            cell_range.evaluator.refs.update(index.refs)
+            return index
+
+        self.misses += 1
+        index = CriteriaIndex(
+            sheet, epoch, cell_range.get_column(col), cell_range.get_column_refs(col)
+        )
+        self.entries[entry_key] = index
+        self.entries.move_to_end(entry_key)
+        self._evict(self.capacity)
+        return index
+
+    def clear(self):
+        """Empties the cache.  The counters are left untouched."""
+        self.entries.clear()
+
+    def get_stats(self) -> dict:
+        """Returns the hit/miss/eviction counters along with the current size
+        and capacity of the cache."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.entries),
+            "capacity": self.capacity,
+        }
+
+    def _evict(self, capacity: int):
+        while len(self.entries) > capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
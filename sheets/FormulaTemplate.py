@@ -0,0 +1,109 @@
+import lark
+from sheets.Parser import parser, parse_template_ref, TemplateToFormula, CellRefFinder
+from sheets.utils import (
+    check_valid_cell_location,
+    convert_location_to_idx,
+    convert_idx_to_location,
+)
+
+
+def locate(cell_ref_tok, row: int, col: int) -> str:
+    """Returns the location a template cell reference refers to from the cell
+    at (row, col)."""
+    if cell_ref_tok.type == "CELLREF_BOTH_ABS":
+        return cell_ref_tok.value.lower().replace("$", "")
+    ref_row, row_is_relative, ref_col, col_is_relative = parse_template_ref(
+        cell_ref_tok.value
+    )
+    return convert_idx_to_location(
+        ref_row + row if row_is_relative else ref_row,
+        ref_col + col if col_is_relative else ref_col,
+    )
+
+
+class FormulaTemplate:
+    """A formula whose relative cell references are stored as offsets from the
+    cell holding it, e.g. =A1+1 in B2 is stored as =R[-1]C[-1]+1.
+
+    The same template is shared, along with its compiled formula, by every
+    cell the formula is filled or copied into; the cell's own location acts as
+    the anchor the offsets are resolved against.  The formula's text is only
+    rebuilt from the template when somebody asks for the cell's contents.
+
+    The references of the template are found once, when it is created, so
+    the cells a formula depends on are known without evaluating it."""
+
+    def __init__(self, tree: lark.Tree, compiled):
+        """
+        args:
+            tree: the parse tree with relative references in R1C1 form
+            compiled: the CompiledFormula for the tree
+        """
+        self.tree = tree
+        self.compiled = compiled
+        self.text = None
+
+        row_offsets = [0]
+        col_offsets = [0]
+        self.is_relative = False
+        for token in tree.scan_values(
+            lambda v: isinstance(v, lark.Token) and v.type.startswith("CELLREF")
+        ):
+            if token.type == "CELLREF_BOTH_ABS":
+                continue
+            row, row_is_relative, col, col_is_relative = parse_template_ref(token)
+            if row_is_relative:
+                row_offsets.append(row)
+            if col_is_relative:
+                col_offsets.append(col)
+            self.is_relative = True
+        self.row_offsets = (min(row_offsets), max(row_offsets))
+        self.col_offsets = (min(col_offsets), max(col_offsets))
+
+        self.refs = CellRefFinder()
+        self.refs.visit(tree)
+        # INDIRECT's references are only known once it has been evaluated
+        self.is_dynamic = "INDIRECT" in self.refs.functions
+
+    def get_sheet_names(self) -> set:
+        """Returns the names of the sheets the formula refers to, as written."""
+        return self.refs.sheet_names
+
+    def get_cell_refs(self, sheet_name: str, row: int, col: int) -> set:
+        """Returns every cell and range the formula in the cell at (row, col)
+        of the given sheet may reference, in the same forms that
+        FormulaEvaluator records: "sheet!location" for a cell and (sheet,
+        top, left, bottom, right) for a range."""
+        refs = set()
+        for ref_sheet, cell_ref_tok in self.refs.cells:
+            ref_sheet = sheet_name if ref_sheet is None else ref_sheet
+            refs.add(ref_sheet + "!" + locate(cell_ref_tok, row, col))
+        for ref_sheet, corner_1, corner_2 in self.refs.ranges:
+            ref_sheet = sheet_name if ref_sheet is None else ref_sheet
+            row_1, col_1 = convert_location_to_idx(locate(corner_1, row, col))
+            row_2, col_2 = convert_location_to_idx(locate(corner_2, row, col))
+            refs.add(
+                (ref_sheet, min(row_1, row_2), min(col_1, col_2), max(row_1, row_2), max(col_1, col_2))
+            )
+        return refs
+
+    def fits(self, row: int, col: int) -> bool:
+        """Returns True if every relative reference of the template is still
+        on the sheet when anchored at (row, col)."""
+        return check_valid_cell_location(
+            convert_idx_to_location(row + self.row_offsets[0], col + self.col_offsets[0])
+        ) and check_valid_cell_location(
+            convert_idx_to_location(row + self.row_offsets[1], col + self.col_offsets[1])
+        )
+
+    def render(self, row: int, col: int) -> str:
+        """Returns the text of the formula for the cell at (row, col).
+        Templates without relative references read the same in every cell, so
+        their text is only built once."""
+        if self.text is not None:
+            return self.text
+        tree = TemplateToFormula(row, col).transform(self.tree)
+        text = "=" + parser.reconstructor.reconstruct(tree, insert_spaces=False)
+        if not self.is_relative:
+            self.text = text
+        return text
@@ -0,0 +1,169 @@
+import collections
+import decimal
+from sheets.CellError import CellError
+from sheets.CellErrorType import CellErrorType
+
+# The argument types results are memoized for.  Anything else, such as a cell
+# range or an error, is passed straight through to the function.
+MEMOIZABLE_TYPES = (decimal.Decimal, float, int, str, bool, type(None))
+
+
+class FunctionInfo:
+    """What the engine knows about a spreadsheet function, declared once when
+    the function is registered.
+
+    A pure function's result depends on nothing but the values of its
+    arguments, so calls with constant arguments are folded when a formula is
+    compiled, and calls may be memoized.  A range argument is never constant,
+    so reading the cells of its ranges doesn't make a function impure;
+    reading cells its arguments don't reference does.  A lazy function
+    receives its arguments unevaluated and evaluates only those it needs,
+    so that the cells it skips aren't references of the formula."""
+
+    def __init__(
+        self,
+        name: str,
+        function_class,
+        min_args: int = 0,
+        max_args: int = None,
+        pure: bool = True,
+        lazy: bool = False,
+        memoize: bool = False,
+    ):
+        """
+        args:
+            name: the name formulas call the function by, in uppercase
+            function_class: the SheetFunction subclass implementing it
+            min_args, max_args: the number of arguments it accepts, counting
+                                each range as one; max_args None for no limit
+            pure: whether the result depends only on the argument values
+            lazy: whether the function receives its arguments unevaluated
+            memoize: whether results are worth caching by argument values,
+                     which only pays off for calls costing more than the
+                     lookup; only pure functions receiving their arguments
+                     evaluated may be memoized
+        """
+        if memoize and not pure:
+            raise ValueError(f"{name} must be pure to be memoized")
+        if memoize and lazy:
+            raise ValueError(f"{name} must receive its arguments evaluated to be memoized")
+        self.name = name
+        self.function_class = function_class
+        self.min_args = min_args
+        self.max_args = max_args
+        self.pure = pure
+        self.lazy = lazy
+        self.memoize = memoize
+
+    def check_args(self, num_args: int):
+        """Returns a TYPE_ERROR if the function can't be called with num_args
+        arguments, and None otherwise."""
+        if num_args < self.min_args:
+            return CellError(
+                CellErrorType.TYPE_ERROR,
+                f"{self.name} requires at least {self.min_args} argument(s)",
+            )
+        if self.max_args is not None and num_args > self.max_args:
+            return CellError(
+                CellErrorType.TYPE_ERROR,
+                f"{self.name} accepts at most {self.max_args} argument(s)",
+            )
+        return None
+
+    def bind(self, evaluator):
+        """Returns the function, ready to be called on the arguments of a
+        formula being evaluated by the evaluator."""
+        function = self.function_class(evaluator)
+        function.lazy = self.lazy
+        if self.memoize and evaluator.workbook is not None:
+            function.results = evaluator.workbook.function_results
+            function.name = self.name
+        return function
+
+
+class FunctionRegistry:
+    """The functions formulas may call, by case-insensitive name."""
+
+    def __init__(self):
+        self.functions = {}  # {name: FunctionInfo}
+
+    def register(self, name: str, function_class, **kwargs) -> FunctionInfo:
+        """Registers a function under name, replacing any function already
+        registered under it.  The keyword arguments are those of
+        FunctionInfo."""
+        info = FunctionInfo(name.upper(), function_class, **kwargs)
+        self.functions[info.name] = info
+        return info
+
+    def get(self, name: str):
+        """Returns the FunctionInfo of the named function, or None if there is
+        no such function."""
+        return self.functions.get(name.upper())
+
+    def __contains__(self, name: str) -> bool:
+        return name.upper() in self.functions
+
+    def __iter__(self):
+        return iter(self.functions)
+
+    def __len__(self) -> int:
+        return len(self.functions)
+
+
+class FunctionResultCache:
+    """A bounded LRU cache of the results of memoized function calls, shared
+    by every formula in a workbook.  Calls are keyed by the function name and
+    the type and text of each argument, so 1 and 1.0 (or 1 and TRUE) are
+    never mistaken for one another."""
+
+    DEFAULT_CAPACITY = 10000
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        """
+        args:
+            capacity: the maximum number of results held in the cache
+        """
+        if capacity < 1:
+            raise ValueError("Function result capacity must be at least 1")
+        self.capacity = capacity
+        self.entries = collections.OrderedDict()  # {(name, argument keys): result}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def call(self, function, args: list):
+        """Returns function.call_evaluated(args), from the cache if the
+        function has been called on the same values before."""
+        if not all(isinstance(arg, MEMOIZABLE_TYPES) for arg in args):
+            return function.call_evaluated(args)
+        key = (function.name, tuple((type(arg), str(arg)) for arg in args))
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        self.misses += 1
+        result = function.call_evaluated(args)
+        self.entries[key] = result
+        self._evict(self.capacity)
+        return result
+
+    def clear(self):
+        """Empties the cache.  The counters are left untouched."""
+        self.entries.clear()
+
+    def get_stats(self) -> dict:
+        """Returns the hit/miss/eviction counters along with the current size
+        and capacity of the cache."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.entries),
+            "capacity": self.capacity,
+        }
+
+    def _evict(self, capacity: int):
+        while len(self.entries) > capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
@@ -1,25 +1,21 @@
 import decimal
 from sheets.CellError import CellError
 from sheets.CellErrorType import CellErrorType
+from sheets.RangeRef import RangeRef
+from sheets.RangeAggregate import RangeAggregate, sum_aggregates
+from sheets.FunctionRegistry import FunctionRegistry
+from sheets.Numeric import is_number
 from sheets.utils import get_highest_precedence_error
+import functools
 import lark
-from lark import Token, Tree
 import re
-from sheets.utils import convert_to
+from sheets.utils import convert_to, convert_location_to_idx
 
 # TODO Error SxTuff:
 #  1. WHat if evaluation fails (parse error).
 #  2. What if args are wrong type (Type error, but annoying to check).
 #  3. What if args are a cell erorr? What do we return.
 
-def flatten_2d_list(two_d_list):
-    # Use a list comprehension to flatten the 2D list
-    return [item for sublist in two_d_list for item in sublist]
-
-def get_column(my_list, column_index):
-    return [row[column_index] for row in my_list if len(row) > column_index]
-
-
 def convert_to_string(arg):
     if isinstance(arg, str):
         return arg
@@ -46,82 +42,115 @@ def convert_to_bool(arg):
         return bool(arg)
 
 
-def reparse_cellrange(match_object):
-    if not match_object:
-        return None
-
-    # Extracting groups from the match object
-    sheet_name_group = match_object.group(1) if match_object.group(1) else ""
-    start_cell_ref = match_object.group(3)
-    end_cell_ref = match_object.group(6)
+# References INDIRECT accepts, such as A1, $B$2, Sheet1!C3 or 'My Sheet'!A1:B10
+CELL_RANGE_PATTERN = re.compile(
+    r"^(([A-Za-z_][A-Za-z0-9_]*|\'[^']*\')!)?((\$)?[A-Za-z]+(\$)?[1-9][0-9]*)\:((\$)?[A-Za-z]+(\$)?[1-9][0-9]*$)"
+)
+CELL_REF_PATTERN = re.compile(
+    r"^(([A-Za-z_][A-Za-z0-9_]*|\'[^']*\')!)?((\$)?[A-Za-z]+(\$)?[1-9][0-9]*$)"
+)
+
+
+@functools.lru_cache(maxsize=4096)
+def resolve_reference(reference: str):
+    """Resolves the (stripped) text given to INDIRECT.  Returns a tuple
+    (sheet name, location, bounds) where bounds is None for a single cell and
+    (top, left, bottom, right) for a cell range, whose location is None.  The
+    sheet name is None if the reference doesn't name one.  Returns None if the
+    text isn't a reference.
+
+    Thousands of cells tend to INDIRECT to a handful of targets, so resolved
+    references are cached by their text."""
+    match_object = CELL_RANGE_PATTERN.match(reference)
+    if match_object:
+        sheet_name = (match_object.group(1) or "").replace("'", "").strip("!")
+        row_1, col_1 = convert_location_to_idx(match_object.group(3).replace("$", ""))
+        row_2, col_2 = convert_location_to_idx(match_object.group(6).replace("$", ""))
+        bounds = (min(row_1, row_2), min(col_1, col_2), max(row_1, row_2), max(col_1, col_2))
+        return (sheet_name or None, None, bounds)
+
+    match_object = CELL_REF_PATTERN.match(reference)
+    if match_object:
+        # The quotes are kept on the sheet name, as in a formula
+        sheet_name = match_object.group(1)[:-1] if match_object.group(1) else None
+        location = match_object.group(3).lower().replace("$", "")
+        return (sheet_name, location, None)
+    return None
 
-    # Sanitizing the sheet name: remove leading/trailing quotes and exclamation mark
-    sheet_name = sheet_name_group.replace("'", "").strip("!")
-
-    # Sanitizing cell references: remove dollar signs
-    start_cell_ref_clean = start_cell_ref.replace("$", "")
-    end_cell_ref_clean = end_cell_ref.replace("$", "")
-
-    # Creating Tokens
-    # For the sheet name, create a token only if the sheet name exists
-    if sheet_name:
-        sheet_name_token = Token("SHEET_NAME", sheet_name)
-        start_cell_token = Token("CELLREF_NO_ABS", start_cell_ref_clean)
-        end_cell_token = Token("CELLREF_NO_ABS", end_cell_ref_clean)
-        ast = Tree("range_expr", [sheet_name_token, start_cell_token, end_cell_token])
-    else:
-        start_cell_token = Token("CELLREF_NO_ABS", start_cell_ref_clean)
-        end_cell_token = Token("CELLREF_NO_ABS", end_cell_ref_clean)
-        ast = Tree("range_expr", [start_cell_token, end_cell_token])
-
-    return ast
-
-
-def reparse_cellref(match_object):
-    # argument to self.interpreter.cell instead of calling directly to teh workbook.
-    sheet_name = (
-        match_object.group(1)[:-1] if match_object.group(1) else None
-    )  # Remove trailing '!' from sheet name
-    cell_ref = match_object.group(3)
-    ref_type = "CELL_REF_NO_ABS"
-    if match_object.group(4) == "$":
-        ref_type = "CELL_REF_ROW_ABS"
-    if match_object.group(5) == "$":
-        if ref_type == "CELL_REF_ROW_ABS":
-            ref_type = "CELL_REF_BOTH_ABS"
-        else:
-            ref_type = "CELL_REF_COL_ABS"
-    if sheet_name:
-        sheet_type = "QUOTED_SHEET_NAME" if "'" in sheet_name else "SHEET_NAME"
-        return lark.Tree(
-            "cell", [lark.Token(sheet_type, sheet_name), lark.Token(ref_type, cell_ref)]
-        )
-    else:
-        return lark.Tree("cell", [lark.Token(ref_type, cell_ref)])
 
 class SheetFunction:
-    def __init__(self, interpeter: lark.visitors.Interpreter, lazy=False, flatten=False):
+    # Whether func receives its arguments unevaluated, the FunctionResultCache
+    # memoized results are kept in, and the name they are kept under, as
+    # declared when the function was registered (see FunctionInfo.bind)
+    lazy = False
+    results = None
+    name = None
+
+    def __init__(self, interpeter: lark.visitors.Interpreter, flatten=False, skip_empty=False):
+        """
+        args:
+            flatten -- replace cell ranges among the arguments by their values
+            skip_empty -- leave empty cells out of flattened ranges
+        """
         self.interpeter = interpeter
-        self.lazy = lazy
         self.flatten = flatten
+        self.skip_empty = skip_empty
 
     def eval_arg(self, arg):
         return self.interpeter.visit(arg)
 
+    def to_numbers(self, args) -> list:
+        """Converts values to numbers in the workbook's numeric mode, treating
+        empty cells as 0 and booleans as 0 or 1.  Raises a TypeError, a
+        ValueError or a decimal.InvalidOperation if one isn't a number."""
+        to_number = self.interpeter.numeric.to_number
+        return [to_number(arg) for arg in args]
+
+    def iter_args(self, args):
+        """Yields the values of the unevaluated arguments one at a time,
+        evaluating each only when it is reached.  Cell ranges are expanded
+        into the values of their cells, which are read as they are reached
+        too, so a function that stops once its result is decided never
+        evaluates, or depends on, the arguments after.  Such a function
+        returns the first error it reaches, not the highest precedence one
+        among all its arguments as eager functions do, since it never sees
+        the errors after it stops."""
+        for arg in args:
+            value = self.eval_arg(arg)
+            if isinstance(value, RangeRef):
+                yield from value.iter_values(self.skip_empty)
+            else:
+                yield value
+
     def __call__(self, args):
-        if not self.lazy:
+        if self.lazy:
             return self.func(args)
 
         args = [self.eval_arg(arg) for arg in args]
+        if self.results is not None:
+            return self.results.call(self, args)
+        return self.call_evaluated(args)
+
+    def call_evaluated(self, args):
+        """Returns the result of the function on its evaluated arguments."""
         if self.flatten:
-            new_args = []
-            for arg in args:
-                if isinstance(arg,list):
-                    new_args.extend(self.eval_arg(sub_arg) for sub_arg in flatten_2d_list(arg))
-                else:
-                    new_args.append(arg)
-            args = new_args
+            args = self.flatten_args(args)
+        return self.apply(args)
+
+    def flatten_args(self, args):
+        """Replaces the cell ranges among the evaluated arguments by the values
+        of their cells."""
+        new_args = []
+        for arg in args:
+            if isinstance(arg, RangeRef):
+                new_args.extend(arg.get_values(self.skip_empty))
+            else:
+                new_args.append(arg)
+        return new_args
 
+    def apply(self, args):
+        """Calls func on the evaluated arguments, unless one of them is an
+        error."""
         highest_precedence_error = get_highest_precedence_error(args)
         if highest_precedence_error is not None:
             return highest_precedence_error
@@ -132,42 +161,111 @@ class SheetFunction:
         pass
 
 
+class NumericAggregate(SheetFunction):
+    """Base class for SUM, MIN, MAX and AVERAGE.
+
+    Ranges that hold nothing but numbers are aggregated from the workbook's
+    RangeAggregates, which are kept up to date as cells change, so a range
+    isn't read again because one of its cells changed.  Numbers among the
+    other arguments are folded in with them.
+
+    Otherwise the arguments are flattened as usual.  When every value is
+    already a number of the workbook's numeric mode there are no errors to
+    find and nothing to convert, so the whole list is handed to aggregate in
+    one call.  Anything else is handled value by value by func.
+
+    RangeAggregates keep exact Decimal totals, so they are only used in the
+    decimal numeric mode."""
+
+    # Whether combine needs the minimum and maximum of each range
+    track_extremes = False
+
+    def __init__(self, interpreter: lark.visitors.Interpreter):
+        super().__init__(interpreter, flatten=True, skip_empty=True)
+
+    def call_evaluated(self, args):
+        if not self.interpeter.numeric.supports_range_aggregates:
+            return self.apply(self.flatten_args(args))
+        aggregates = self.get_aggregates(args)
+        if aggregates:
+            result = self.combine(aggregates)
+            if result is not None:
+                return result
+        return self.apply(self.flatten_args(args))
+
+    def get_aggregates(self, args):
+        """Returns a RangeAggregate for each argument holding numbers, or None
+        if an argument is anything but a number or a range of them."""
+        aggregates = []
+        for arg in args:
+            if isinstance(arg, RangeRef):
+                aggregate = arg.get_aggregate(self.track_extremes)
+                if aggregate is None or not aggregate.is_numeric():
+                    return None
+            elif type(arg) is decimal.Decimal:
+                aggregate = RangeAggregate(None, 0, None, [], [arg], self.track_extremes)
+            else:
+                return None
+            if aggregate.count > 0:
+                aggregates.append(aggregate)
+        return aggregates
+
+    def apply(self, args):
+        types = set(map(type, args))
+        if not types or not types <= self.interpeter.numeric.number_types:
+            return super().apply(args)
+        return self.aggregate(args)
+
+    def combine(self, aggregates):
+        """Returns the result from the aggregates of the arguments, or None
+        if it has to be computed from their values."""
+        pass
+
+    def aggregate(self, numbers):
+        pass
+
+
 class AND(SheetFunction):
+    """Stops at the first FALSE.  The first error reached before it is
+    returned, whatever its precedence, and one after it is never evaluated,
+    so =AND(1/0, #REF!) is #DIV/0! and =AND(FALSE, 1/0) is FALSE."""
+
     def __init__(self, interpeter: lark.visitors.Interpreter):
-        super().__init__(interpeter, lazy=True)
+        super().__init__(interpeter, skip_empty=True)
 
     def func(self, args):
-        final_val = True
-        for arg in args:
+        for arg in self.iter_args(args):
+            if isinstance(arg, CellError):
+                return arg
             arg = convert_to_bool(arg)
             if isinstance(arg, CellError):
                 return arg
-            final_val = final_val and arg
-        return final_val
+            if not arg:
+                return False
+        return True
 
 
 class OR(SheetFunction):
+    """Stops at the first TRUE.  The first error reached before it is
+    returned, whatever its precedence, and one after it is never evaluated,
+    so =OR(1/0, #REF!) is #DIV/0! and =OR(TRUE, 1/0) is TRUE."""
+
     def __init__(self, interpeter: lark.visitors.Interpreter):
-        super().__init__(interpeter, lazy=True)
+        super().__init__(interpeter, skip_empty=True)
 
     def func(self, args):
-        if len(args) < 1:
-            return CellError(
-                CellErrorType.TYPE_ERROR, "Or function requires at least 1 argument."
-            )
-        final_val = False
-        for arg in args:
+        for arg in self.iter_args(args):
+            if isinstance(arg, CellError):
+                return arg
             arg = convert_to_bool(arg)
             if isinstance(arg, CellError):
                 return arg
-            final_val = final_val or arg
-        return final_val
+            if arg:
+                return True
+        return False
 
 
 class NOT(SheetFunction):
-    def __init__(self, interpeter: lark.visitors.Interpreter):
-        super().__init__(interpeter, lazy=True)
-
     def func(self, args):
         if len(args) != 1:
             return CellError(
@@ -181,33 +279,27 @@ class NOT(SheetFunction):
 
 
 class XOR(SheetFunction):
+    """TRUE if some of the arguments are TRUE and some are FALSE, so it stops
+    as soon as it has seen one of each.  Any error reached before then makes
+    it a #VALUE! error."""
+
     def __init__(self, interpeter: lark.visitors.Interpreter):
-        super().__init__(interpeter, lazy=False)
-        self.and_func = AND(interpeter)
-        self.or_func = OR(interpeter)
+        super().__init__(interpeter, skip_empty=True)
 
-    # So this defo isn't the most efficient but rn I'm too lazy to speed it up
     def func(self, args):
-        if len(args) < 1:
-            return CellError(
-                CellErrorType.TYPE_ERROR, "Or function requires at least 1 argument."
-            )
-        anded = self.and_func(args)
-        ored = self.or_func(args)
-        if isinstance(anded, CellError) or isinstance(ored, CellError):
-            return CellError(CellErrorType.TYPE_ERROR, "Unsupported type condition")
-        if isinstance(anded, CellError):
-            return anded
-        if isinstance(ored, CellError):
-            return ored
-
-        return not anded and ored
+        seen = set()
+        for arg in self.iter_args(args):
+            if not isinstance(arg, CellError):
+                arg = convert_to_bool(arg)
+            if isinstance(arg, CellError):
+                return CellError(CellErrorType.TYPE_ERROR, "Unsupported type condition")
+            seen.add(arg)
+            if len(seen) == 2:
+                return True
+        return False
 
 
 class EXACT(SheetFunction):
-    def __init__(self, interpreter: lark.visitors.Interpreter):
-        super().__init__(interpreter, lazy=True)
-
     def func(self, args):
         if len(args) != 2:
             return CellError(
@@ -219,69 +311,170 @@ class EXACT(SheetFunction):
         return convert_to(l,str) == convert_to(r,str)
 
 
-class SUM(SheetFunction):
-    def __init__(self, interpreter: lark.visitors.Interpreter):
-        super().__init__(interpreter, lazy=True, flatten=True)
+class SUM(NumericAggregate):
+    def combine(self, aggregates):
+        return sum_aggregates(aggregates)
+
+    def aggregate(self, numbers):
+        return sum(numbers)
 
     def func(self, args):
-        if len(args)==0:
-            return CellError(CellErrorType.TYPE_ERROR,"SUM requires at least 1 argument")
         try:
-            return sum([convert_to(arg, decimal.Decimal) for arg in args ])
-        except TypeError:
+            return sum(self.to_numbers(args))
+        except (TypeError, ValueError, decimal.InvalidOperation):
             return CellError(CellErrorType.TYPE_ERROR, "Arguments to SUM were invalid")
 
 
-class MAX(SheetFunction):
-    def __init__(self, interpreter: lark.visitors.Interpreter):
-        super().__init__(interpreter, lazy=True, flatten=True)
+class MAX(NumericAggregate):
+    track_extremes = True
+
+    def combine(self, aggregates):
+        return max(aggregate.get_max() for aggregate in aggregates)
+
+    def aggregate(self, numbers):
+        return max(numbers)
+
     def func(self, args):
-        if len(args) == 0:
-            return CellError(CellErrorType.TYPE_ERROR, "MAX requires at least 1 argument")
         args = list(filter(lambda x: x != None, args))
         if len(args)==0:
             return 0
         try:
-            return max([convert_to(arg, decimal.Decimal) for arg in args ])
-        except TypeError:
+            return max(self.to_numbers(args))
+        except (TypeError, ValueError, decimal.InvalidOperation):
             return CellError(CellErrorType.TYPE_ERROR, "Arguments to MAX were invalid")
 
 
-class MIN(SheetFunction):
-    def __init__(self, interpreter: lark.visitors.Interpreter):
-        super().__init__(interpreter, lazy=True, flatten=True)
+class MIN(NumericAggregate):
+    track_extremes = True
+
+    def combine(self, aggregates):
+        return min(aggregate.get_min() for aggregate in aggregates)
+
+    def aggregate(self, numbers):
+        return min(numbers)
+
     def func(self, args):
-        if len(args) == 0:
-            return CellError(CellErrorType.TYPE_ERROR, "MIN requires at least 1 argument")
         args = list(filter(lambda x: x != None, args))
 
         if len(args)==0:
             return 0
         try:
-            return min([convert_to(arg, decimal.Decimal) for arg in args ])
-        except TypeError:
+            return min(self.to_numbers(args))
+        except (TypeError, ValueError, decimal.InvalidOperation):
             return CellError(CellErrorType.TYPE_ERROR, "Arguments to MIN were invalid")
 
 
-class AVERAGE(SheetFunction):
-    def __init__(self, interpreter: lark.visitors.Interpreter):
-        super().__init__(interpreter, lazy=True, flatten=True)
+class AVERAGE(NumericAggregate):
+    def combine(self, aggregates):
+        total = sum_aggregates(aggregates)
+        if total is None:
+            return None
+        return total / sum(aggregate.count for aggregate in aggregates)
+
+    def aggregate(self, numbers):
+        return self.interpeter.numeric.divide(sum(numbers), len(numbers))
+
     def func(self, args):
-        if len(args) == 0:
-            return CellError(CellErrorType.TYPE_ERROR, "Avg requires at least 1 argument")
         args = list(filter(lambda x: x != None, args))
         if len(args) == 0:
             return CellError(CellErrorType.DIVIDE_BY_ZERO, "Averaging over no elements yields div by 0.")
         try:
-            return sum([convert_to(arg, decimal.Decimal) for arg in args ]) / len(args)
-        except TypeError:
+            return self.interpeter.numeric.divide(sum(self.to_numbers(args)), len(args))
+        except (TypeError, ValueError, decimal.InvalidOperation):
             return CellError(CellErrorType.TYPE_ERROR, "Arguments to Average were invalid")
 
 
-class HLOOKUP(SheetFunction):
-    def __init__(self,interpreter : lark.visitors.Interpreter):
-        super().__init__(interpreter,lazy=False)
+class ConditionalAggregate(SheetFunction):
+    """Base class for SUMIF, COUNTIF and AVERAGEIF, and for SUMIFS, COUNTIFS
+    and AVERAGEIFS, which only aggregate the cells meeting every one of their
+    criteria.
+
+    Criteria are matched through the workbook's CriteriaIndexes, so many
+    conditional aggregates over the same table cost one index of each column
+    and a hash lookup per criterion.  Only the matching cells of the range
+    being aggregated are read."""
+
+    # Whether the range to aggregate comes first, followed by pairs of
+    # criteria ranges and criteria (SUMIFS), rather than coming last (SUMIF)
+    multiple_criteria = False
+    # Whether there is a range to aggregate at all, as there isn't for COUNTIF
+    aggregates_values = True
+
+    def func(self, args):
+        name = type(self).__name__
+        if self.multiple_criteria:
+            value_range = args[0] if self.aggregates_values else None
+            criteria = args[1:] if self.aggregates_values else args
+            if len(criteria) % 2 != 0:
+                return CellError(
+                    CellErrorType.TYPE_ERROR,
+                    f"{name} requires a criterion for every criteria range",
+                )
+        else:
+            criteria = args[:2]
+            value_range = args[2] if len(args) > 2 else args[0]
+        ranges = list(criteria[::2])
+        if self.aggregates_values:
+            ranges.append(value_range)
+        if not all(isinstance(arg, RangeRef) for arg in ranges):
+            return CellError(CellErrorType.TYPE_ERROR, f"Ranges given to {name} must be cell ranges.")
+
+        if self.aggregates_values and not self.multiple_criteria:
+            # As in Excel, only the top left corner of the range to sum counts
+            value_range = value_range.get_resized(criteria[0].get_num_rows(), criteria[0].get_num_cols())
+            ranges[-1] = value_range
+        size = (ranges[0].get_num_rows(), ranges[0].get_num_cols())
+        if any((arg.get_num_rows(), arg.get_num_cols()) != size for arg in ranges):
+            return CellError(CellErrorType.TYPE_ERROR, f"Ranges given to {name} must be the same size.")
+
+        positions = None
+        for cell_range, criterion in zip(criteria[::2], criteria[1::2]):
+            matched = cell_range.match_criterion(criterion)
+            if isinstance(matched, CellError):
+                return matched
+            positions = matched if positions is None else positions & matched
+
+        if not self.aggregates_values:
+            return self.interpeter.numeric.to_number(len(positions))
+        values = value_range.get_values_at(positions)
+        error = get_highest_precedence_error(values)
+        if error is not None:
+            return error
+        return self.aggregate([value for value in values if is_number(value)])
+
+    def aggregate(self, numbers):
+        pass
 
+
+class SUMIF(ConditionalAggregate):
+    def aggregate(self, numbers):
+        return sum(numbers)
+
+
+class COUNTIF(ConditionalAggregate):
+    aggregates_values = False
+
+
+class AVERAGEIF(ConditionalAggregate):
+    def aggregate(self, numbers):
+        if len(numbers) == 0:
+            return CellError(CellErrorType.DIVIDE_BY_ZERO, "Averaging over no elements yields div by 0.")
+        return self.interpeter.numeric.divide(sum(numbers), len(numbers))
+
+
+class SUMIFS(SUMIF):
+    multiple_criteria = True
+
+
+class COUNTIFS(COUNTIF):
+    multiple_criteria = True
+
+
+class AVERAGEIFS(AVERAGEIF):
+    multiple_criteria = True
+
+
+class HLOOKUP(SheetFunction):
     def func(self, args):
         key = self.eval_arg(args[0])
         arg_range = self.eval_arg(args[1])
@@ -290,37 +483,27 @@ class HLOOKUP(SheetFunction):
         if error:
             return error
 
-        if not isinstance(arg_range, list):
+        if not isinstance(arg_range, RangeRef):
             return CellError(CellErrorType.TYPE_ERROR, "second argument to lookup must be a cell range.")
 
         if (
-                not isinstance(index, decimal.Decimal)
+                not is_number(index)
                 or index <= 0
                 or index.as_integer_ratio()[1] != 1
-                or index > len(arg_range)
+                or index > arg_range.get_num_rows()
         ):
             return CellError(CellErrorType.TYPE_ERROR, "Index must be a positive integer")
 
-        search_row = arg_range[0]
-        search_row = [self.eval_arg(elem) for elem in search_row]
-
-        error = get_highest_precedence_error(search_row)
-        if error:
-            return error
-
-        try:
-            col_idx = search_row.index(key)
-        except ValueError:
+        col_idx = arg_range.find_in_row(key)
+        if isinstance(col_idx, CellError):
+            return col_idx
+        if col_idx is None:
             return CellError(CellErrorType.TYPE_ERROR, "Key in HLOOKUP not found")
-        result_col = get_column(arg_range, col_idx)
-        result_col = [self.eval_arg(elem) for elem in result_col]
+        result_col = arg_range.get_column(col_idx)
         return result_col[int(index)-1]
 
 
 class VLOOKUP(SheetFunction):
-    def __init__(self, interpreter: lark.visitors.Interpreter):
-        super().__init__(interpreter, lazy=False)
-
     def func(self, args):
         key = self.eval_arg(args[0])
         arg_range = self.eval_arg(args[1])
@@ -330,39 +513,29 @@ class VLOOKUP(SheetFunction):
         if error:
             return error
 
-        if not isinstance(arg_range, list):
+        if not isinstance(arg_range, RangeRef):
             return CellError(CellErrorType.TYPE_ERROR, "second argument to lookup must be a cell range.")
 
         if (
-            not isinstance(index, decimal.Decimal)
+            not is_number(index)
             or index <= 0
             or index.as_integer_ratio()[1] != 1
-            or index > len(arg_range[0])
+            or index > arg_range.get_num_cols()
 
         ):
             return CellError(CellErrorType.TYPE_ERROR, "Index must be a positive integer")
 
-        search_col = get_column(arg_range,0)
-        search_col = [self.eval_arg(elem) for elem in search_col ]
-        error = get_highest_precedence_error(search_col)
-
-        if error:
-            return error
-
-        try:
-            row_idx = search_col.index(key)
-        except ValueError:
+        row_idx = arg_range.find_in_column(key)
+        if isinstance(row_idx, CellError):
+            return row_idx
+        if row_idx is None:
             return CellError(CellErrorType.TYPE_ERROR, "Key in VLOOKUP not found")
 
-        result_row = arg_range[row_idx]
-        result_row = [self.eval_arg(elem) for elem in result_row]
+        result_row = arg_range.get_row(row_idx)
         return result_row[int(index)-1]
 
 
 class IF(SheetFunction):
-    def __init__(self, interpreter: lark.visitors.Interpreter):
-        super().__init__(interpreter, lazy=False)
-
     def func(self, args):
         """In this case"""
         num_args = len(args)
@@ -386,9 +559,6 @@ class IF(SheetFunction):
 
 
 class IFERROR(SheetFunction):
-    def __init__(self, interpreter: lark.visitors.Interpreter):
-        super().__init__(interpreter, lazy=False)
-
     def func(self, args):
         """In this case"""
         num_args = len(args)
@@ -408,9 +578,6 @@ class IFERROR(SheetFunction):
 
 
 class ISERROR(SheetFunction):
-    def __init__(self, interpreter: lark.visitors.Interpreter):
-        super().__init__(interpreter, lazy=False)
-
     def func(self, args):
         """In this case"""
         num_args = len(args)
@@ -424,9 +591,6 @@ class ISERROR(SheetFunction):
 
 
 class CHOOSE(SheetFunction):
-    def __init__(self, interpreter: lark.visitors.Interpreter):
-        super().__init__(interpreter, lazy=False)
-
     def func(self, args):
         """In this case"""
         num_args = len(args)
@@ -440,7 +604,7 @@ class CHOOSE(SheetFunction):
             return index
 
         if (
-            not isinstance(index, decimal.Decimal)
+            not is_number(index)
             or index <= 0
             or index.as_integer_ratio()[1] != 1
             or index > len(args) - 1
@@ -451,9 +615,6 @@ class CHOOSE(SheetFunction):
 
 
 class ISBLANK(SheetFunction):
-    def __init__(self, interpreter: lark.visitors.Interpreter):
-        super().__init__(interpreter, lazy=False)
-
     def func(self, args):
         value = self.eval_arg(args[0])
         if value == False or value == "" or value == 0:
@@ -465,9 +626,6 @@ class ISBLANK(SheetFunction):
 
 
 class VERSION(SheetFunction):
-    def __init__(self, interpreter: lark.visitors.Interpreter):
-        super().__init__(interpreter, lazy=True)
-
     def func(self, args):
         """In this case"""
         version = "1.4"
@@ -481,9 +639,6 @@ class VERSION(SheetFunction):
 
 
 class INDIRECT(SheetFunction):
-    def __init__(self, interpreter: lark.visitors.Interpreter):
-        super().__init__(interpreter, lazy=False)
-
     def func(self, args):
         if len(args) != 1:
             return CellError(
@@ -501,49 +656,50 @@ class INDIRECT(SheetFunction):
                 "Argument to function Indirect must be a string",
             )
 
-        arg = arg.strip()
-        # TODO: Precompile regex: use sheet name part
-        # Precompile
-        match_object = re.match(
-            r"^(([A-Za-z_][A-Za-z0-9_]*|\'[^']*\')!)?((\$)?[A-Za-z]+(\$)?[1-9][0-9]*)\:((\$)?[A-Za-z]+(\$)?[1-9][0-9]*$)",
-            arg,
-        )
-        if match_object:
-            cell_range = reparse_cellrange(match_object)
-            return self.interpeter.range_expr(cell_range)
-
-
-        match_object = re.match(
-            r"^(([A-Za-z_][A-Za-z0-9_]*|\'[^']*\')!)?((\$)?[A-Za-z]+(\$)?[1-9][0-9]*$)",
-            arg,
-        )
-        if match_object:
-            cell_ref = reparse_cellref(match_object)
-            return self.interpeter.cell(cell_ref)
-        else:
+        target = resolve_reference(arg.strip())
+        if target is None:
             return CellError(
                 CellErrorType.BAD_REFERENCE,
-                f"Argument to function given as {arg} is not a valid cell location!",
+                f"Argument to function given as {arg.strip()} is not a valid cell location!",
             )
-
-
-function_directory = {
-    "AND": AND,
-    "OR": OR,
-    "NOT": NOT,
-    "XOR": XOR,
-    "EXACT": EXACT,
-    "SUM": SUM,
-    "IF": IF,
-    "IFERROR": IFERROR,
-    "ISBLANK": ISBLANK,
-    "ISERROR": ISERROR,
-    "CHOOSE": CHOOSE,
-    "INDIRECT": INDIRECT,
-    "MAX" : MAX,
-    "MIN": MIN,
-    "AVERAGE": AVERAGE,
-    "VLOOKUP" : VLOOKUP,
-    "HLOOKUP" : HLOOKUP,
-    "VERSION" : VERSION
-}
+        sheet_name, location, bounds = target
+        if sheet_name is None:
+            sheet_name = self.interpeter.sheet_name
+        if bounds is not None:
+            return RangeRef(self.interpeter, sheet_name, *bounds)
+        return self.interpeter.read_cell(sheet_name, location)
+
+
+# Every function formulas may call.  Pure calls are only folded when every
+# argument is a constant, and a range never is, so functions reading the cells
+# of their ranges are pure too.  INDIRECT is not: it reads whatever cell its
+# constant text names.  The lazy functions evaluate only the arguments they
+# need, so the cells of the others aren't references of the formula.  Only the
+# numeric aggregates are memoized: a call of theirs on scalars costs several
+# times a cache lookup, while the other functions cost less than one (see
+# function_memo_benchmark.py).  Calls on ranges are never memoized.
+function_directory = FunctionRegistry()
+function_directory.register("AND", AND, lazy=True)
+function_directory.register("OR", OR, min_args=1, lazy=True)
+function_directory.register("NOT", NOT, min_args=1, max_args=1)
+function_directory.register("XOR", XOR, min_args=1, lazy=True)
+function_directory.register("EXACT", EXACT, min_args=2, max_args=2)
+function_directory.register("SUM", SUM, min_args=1, memoize=True)
+function_directory.register("IF", IF, min_args=2, max_args=3, lazy=True)
+function_directory.register("IFERROR", IFERROR, min_args=1, max_args=2, lazy=True)
+function_directory.register("ISBLANK", ISBLANK, min_args=1, max_args=1, lazy=True)
+function_directory.register("ISERROR", ISERROR, min_args=1, max_args=1, lazy=True)
+function_directory.register("CHOOSE", CHOOSE, min_args=2, lazy=True)
+function_directory.register("INDIRECT", INDIRECT, min_args=1, max_args=1, pure=False, lazy=True)
+function_directory.register("MAX", MAX, min_args=1, memoize=True)
+function_directory.register("MIN", MIN, min_args=1, memoize=True)
+function_directory.register("AVERAGE", AVERAGE, min_args=1, memoize=True)
+function_directory.register("VLOOKUP", VLOOKUP, min_args=3, max_args=3, lazy=True)
+function_directory.register("HLOOKUP", HLOOKUP, min_args=3, max_args=3, lazy=True)
+function_directory.register("VERSION", VERSION, max_args=0)
+function_directory.register("SUMIF", SUMIF, min_args=2, max_args=3)
+function_directory.register("COUNTIF", COUNTIF, min_args=2, max_args=2)
+function_directory.register("AVERAGEIF", AVERAGEIF, min_args=2, max_args=3)
+function_directory.register("SUMIFS", SUMIFS, min_args=3)
+function_directory.register("COUNTIFS", COUNTIFS, min_args=2)
+function_directory.register("AVERAGEIFS", AVERAGEIFS, min_args=3)
@@ -1,3 +1,8 @@
+import collections
+from sheets.RangeIndex import RangeIndex
+from sheets.utils import convert_location_to_idx
+
+
 class Node:
     def __init__(self, sheet_location, cell_location) -> None:
         self.children = []  # List of Nodes
@@ -13,97 +18,300 @@ class Node:
 
 class Graph:
     def __init__(self):
-        # key is child: value is list of parents
-        # {Sheet_Name : {location : node}}
+        # Every cell with an edge is a node with a dense integer ID, and the
+        # edges are kept between IDs, so an edge costs a slot in two dicts of
+        # ints rather than two tuples of strings, and the graph is traversed
+        # without hashing any strings.  The IDs of cells left without edges
+        # are reused (see release_unused).
+        self.node_ids = []  # List[Dict{cell_location: node ID}], by sheet ID
+        self.nodes = []  # List[(sheet ID, cell_location) or None], by node ID
+        self.free_ids = []  # IDs of the None entries of nodes
+        self.unused_ids = set()  # IDs which may have been left without edges
+
+        # key is child: value is the parents, as the keys of a dict so that
+        # they are kept in the order they were added without duplicates, and
+        # a cell referenced by thousands of formulas adds and removes each
+        # of them in O(1)
         # CHILD LOCATION -> PARENT LOCATION()
-        # A1 -> B1 | B1:[A1]
-        self.children_to_parents = {}  # Dict{sheet_name: Dict{cell_location: List[(sheet_location_object, cell_location_objects)]}}
+        # A1 -> B1 | B1:{A1: None}
+        self.parent_ids = []  # List[Dict{parent ID: None}], by node ID
 
         # child -> parent
-        # key is parent: value is list of children
-        self.parents_to_children = {}  # Dict{sheet_name: Dict{cell_location: List[(sheet_location_object, cell_location_objects)]}}
+        # key is parent: value is the set of its children, kept in step with
+        # parent_ids so a formula's edges can be found (and removed)
+        # without going back to the references it recorded
+        self.child_ids = []  # List[Set[child ID]], by node ID
+
+        # Cell ranges are children too, kept apart from single cells so that
+        # each is one edge however many cells it covers.  The parents of a
+        # cell are the parents of the cell itself together with the parents
+        # of every range holding it (see get_parents_from_cell).
+        self.range_parents = {}  # Dict{sheet ID: RangeIndex of node IDs}
+        self.node_ranges = {}  # Dict{node ID: Set[(sheet ID, (top, left, bottom, right))]}
+
+        # A topological order of the cells, kept up to date as edges are
+        # added (Pearce-Kelly), in which every cell comes before the cells
+        # referencing it.  An edge closing a cycle can't be in order, so it
+        # is kept as a back edge instead.  Range edges aren't ordered.
+        self.order = []  # List[position or None], by node ID
+        self.lowest = 0  # The lowest and highest positions given so far
+        self.highest = 0
+        self.back_edges = set()  # Set[(parent ID, child ID)]
+        self.back_edge_children = collections.Counter()  # Counter{child ID: back edges}
+
+        # Nodes and ranges are kept by sheet ID rather than by sheet name, so
+        # renaming a sheet only changes the name its ID is found by
+        self.sheet_ids = {}  # Dict{sheet_name: sheet ID}
+        self.sheet_names = []  # List[sheet_name or None], by sheet ID
 
         # self.sheet_map = {} # Dict{sheet_name: List of Nodes}
 
+    @property
+    def children_to_parents(self) -> dict:
+        """The parents of every referenced cell, as {sheet_name: {location:
+        {(sheet_name, location): None}}}.  Built on each access."""
+        return self._get_edge_view(self.parent_ids)
+
+    @property
+    def parents_to_children(self) -> dict:
+        """The children of every formula, as {sheet_name: {location:
+        {(sheet_name, location)}}}.  Built on each access."""
+        view = self._get_edge_view(self.child_ids)
+        return {
+            sheet_name: {location: set(children) for location, children in cells.items()}
+            for sheet_name, cells in view.items()
+        }
+
+    def _get_edge_view(self, adjacency: list) -> dict:
+        view = {}
+        for sheet_name, sheet_id in self.sheet_ids.items():
+            cells = self.node_ids[sheet_id]
+            edges = {
+                location: {self.get_node(other): None for other in adjacency[node_id]}
+                for location, node_id in cells.items()
+                if adjacency[node_id]
+            }
+            if edges:
+                view[sheet_name] = edges
+        return view
+
+    def _intern_sheet(self, sheet_name: str) -> int:
+        # Returns the ID of a sheet, giving it one if it has none
+        sheet_id = self.sheet_ids.get(sheet_name)
+        if sheet_id is None:
+            sheet_id = self.sheet_ids[sheet_name] = len(self.sheet_names)
+            self.sheet_names.append(sheet_name)
+            self.node_ids.append({})
+        return sheet_id
+
+    def intern(self, sheet_name: str, cell_loc: str) -> int:
+        """Returns the ID of a cell, giving it one if it has none."""
+        sheet_id = self._intern_sheet(sheet_name)
+        cells = self.node_ids[sheet_id]
+        node_id = cells.get(cell_loc)
+        if node_id is not None:
+            return node_id
+        if self.free_ids:
+            node_id = self.free_ids.pop()
+            self.nodes[node_id] = (sheet_id, cell_loc)
+        else:
+            node_id = len(self.nodes)
+            self.nodes.append((sheet_id, cell_loc))
+            self.parent_ids.append({})
+            self.child_ids.append(set())
+            self.order.append(None)
+        cells[cell_loc] = node_id
+        # Until it has an edge
+        self.unused_ids.add(node_id)
+        return node_id
+
+    def get_node_id(self, sheet_name: str, cell_loc: str):
+        """Returns the ID of a cell, or None if it has none."""
+        sheet_id = self.sheet_ids.get(sheet_name)
+        return self.node_ids[sheet_id].get(cell_loc) if sheet_id is not None else None
+
+    def get_node(self, node_id: int) -> tuple:
+        """Returns the (sheet name, location) of a node ID."""
+        sheet_id, cell_loc = self.nodes[node_id]
+        return self.sheet_names[sheet_id], cell_loc
+
+    def release_unused(self):
+        """Frees the IDs of the cells left without edges since the last call,
+        for other cells to reuse.  IDs held on to across the call may then
+        stand for another cell."""
+        for node_id in self.unused_ids:
+            cell = self.nodes[node_id]
+            if cell is None or self.parent_ids[node_id] or self.child_ids[node_id] or node_id in self.node_ranges:
+                continue
+            sheet_id, cell_loc = cell
+            cells = self.node_ids[sheet_id]
+            if cells.get(cell_loc) == node_id:
+                del cells[cell_loc]
+            self.nodes[node_id] = None
+            self.order[node_id] = None
+            self.free_ids.append(node_id)
+        self.unused_ids = set()
+
     def rename_sheet(self, old_sheet_name, new_sheet_name):
         """
         Does all the necessary updates to change the old_sheet_name to the new_sheet_name.
 
         """
-        # just handles children_to_parents for now
-        # collects the children in the new sheet name
-        children_of_overlapping_sheet = self.children_to_parents.get(new_sheet_name)
-        if old_sheet_name in self.children_to_parents:
-            self.children_to_parents[new_sheet_name] = self.children_to_parents.get(
-                old_sheet_name
-            )
-        else:
-            self.add_sheet(new_sheet_name)
-        # This merging part here is actually pretty expensive
-        if children_of_overlapping_sheet is not None:
-            for location, parents in children_of_overlapping_sheet.items():
-                if location in self.children_to_parents.get(new_sheet_name):
-                    self.children_to_parents[new_sheet_name][location].extend(
-                        [
-                            parent
-                            for parent in parents
-                            if parent
-                            not in self.children_to_parents[new_sheet_name][location]
-                        ]
-                    )
-                else:
-                    self.children_to_parents[new_sheet_name][location] = parents
-
-        # Now the children list has been properly renamed and merged with the parent list
-        # We need to go through and update the sheet names of the parents.
-        for sheet_name, sheet in self.children_to_parents.items():
-            for child_loc, list in sheet.items():
-                for parent_loc, parent_sheet in list:
-                    if parent_sheet == old_sheet_name:
-                        list.remove((parent_loc, parent_sheet))
-                        list.append((parent_loc, new_sheet_name))
-
-        # Now everything on the children_to_parents side is complete.
+        # The sheet keeps its ID, so only the name it is found by changes
+        sheet_id = self.sheet_ids.pop(old_sheet_name, None)
+        if sheet_id is None:
+            return
+        self.sheet_names[sheet_id] = new_sheet_name
+        other_id = self.sheet_ids.get(new_sheet_name)
+        self.sheet_ids[new_sheet_name] = sheet_id
+        if other_id is None:
+            return
+
+        # Cells were referenced under the new name before the sheet had it, so
+        # they move to the renamed sheet, merged with its cells of the same
+        # location
+        self.sheet_names[other_id] = None
+        cells = self.node_ids[sheet_id]
+        merged = []
+        for cell_loc, node_id in self.node_ids[other_id].items():
+            self.nodes[node_id] = (sheet_id, cell_loc)
+            if cell_loc in cells:
+                merged.append((node_id, cells[cell_loc]))
+            else:
+                cells[cell_loc] = node_id
+        self.node_ids[other_id] = {}
+
+        other_ranges = self.range_parents.pop(other_id, None)
+        if other_ranges is not None:
+            index = self.range_parents.setdefault(sheet_id, RangeIndex())
+            for bounds, parents in other_ranges.get_ranges():
+                for parent in parents:
+                    index.add(bounds, parent)
+                    ranges = self.node_ranges[parent]
+                    ranges.discard((other_id, bounds))
+                    ranges.add((sheet_id, bounds))
+
+        for node_id, into in merged:
+            self._merge(node_id, into)
+
+    def _merge(self, node_id: int, into: int):
+        # Moves every edge of a cell to another with the same name
+        self.unused_ids.add(node_id)
+        for parent in list(self.parent_ids[node_id]):
+            self._remove_edge(parent, node_id)
+            self._add_edge(into if parent == node_id else parent, into)
+        for child in list(self.child_ids[node_id]):
+            self._remove_edge(node_id, child)
+            self._add_edge(into, child)
+        for range_sheet_id, bounds in list(self.node_ranges.get(node_id, ())):
+            self._remove_range_edge(node_id, range_sheet_id, bounds)
+            self._add_range_edge(into, range_sheet_id, bounds)
 
     def add_connection(
         self, parent_sheet_name, parent_cell_loc, child_sheet_name, child_cell_loc
     ):
-        """Adds a parent in the graph data structure.
+        """Adds a parent in the graph data structure.  Adding an edge that is
+        already in the graph does nothing.
         sheet_name: the name of the sheet the referenced cell is in
         cell_loc : the location of the referenced cell
         parent_sheet_name : the name of the sheet of the referencing cell
         parent_cell_loc : the location of the referencing cell"""
-        if child_sheet_name not in self.children_to_parents:
-            self.children_to_parents.update({child_sheet_name: {}})
-
-        sheet = self.children_to_parents[child_sheet_name]
-
-        if child_cell_loc in sheet:
-            sheet[child_cell_loc].append((parent_sheet_name, parent_cell_loc))
-        else:
-            sheet.update({child_cell_loc: [(parent_sheet_name, parent_cell_loc)]})
-
-        # Uncommented to add to parents
-        # if parent_sheet_name not in self.parents_to_children:
-        #     self.parents_to_children.update({parent_sheet_name : {}})
-
-        # sheet = self.parents_to_children[child_sheet_name]
-        # if parent_cell_loc in sheet:
-        #     sheet[parent_cell_loc].append((parent_sheet_name , child_cell_loc))
-        # else:
-        #     sheet.update({parent_cell_loc : [(child_sheet_name , child_cell_loc)]})
+        self._add_edge(
+            self.intern(parent_sheet_name, parent_cell_loc),
+            self.intern(child_sheet_name, child_cell_loc),
+        )
 
     def update_child(self, hidden_name, location, child_hidden_name, child_location):
         """Updates the references to a cell."""
-
-        # if hidden_name not in self.children_to_parents:
-        #     return
-        if (hidden_name, location) in self.children_to_parents[child_hidden_name][
-            child_location
-        ]:
-            self.children_to_parents[child_hidden_name][child_location].remove(
-                (hidden_name, location)
-            )
+        parent = self.get_node_id(hidden_name, location)
+        child = self.get_node_id(child_hidden_name, child_location)
+        if parent is not None and child is not None:
+            self._remove_edge(parent, child)
+
+    def set_children(self, sheet_name: str, cell_loc: str, children: set):
+        """Makes the given (sheet name, location) cells the children of a
+        cell.  Only the edges that differ from the current ones are touched."""
+        node_id = self.intern(sheet_name, cell_loc)
+        child_ids = {self.intern(child_sheet, child_loc) for child_sheet, child_loc in children}
+        old_child_ids = self.child_ids[node_id]
+        for child in old_child_ids - child_ids:
+            self._remove_edge(node_id, child)
+        for child in child_ids - old_child_ids:
+            self._add_edge(node_id, child)
+
+    def _add_edge(self, parent: int, child: int):
+        parents = self.parent_ids[child]
+        if parent in parents:
+            return
+        parents[parent] = None
+        self.child_ids[parent].add(child)
+        if not self._add_to_order(parent, child):
+            self._add_back_edge(parent, child)
+
+    def _remove_edge(self, parent: int, child: int):
+        parents = self.parent_ids[child]
+        if parent not in parents:
+            return
+        del parents[parent]
+        self.child_ids[parent].discard(child)
+        self.unused_ids.add(parent)
+        self.unused_ids.add(child)
+        self._remove_from_order(parent, child)
+
+    def add_range_connection(
+        self, parent_sheet_name, parent_cell_loc, range_sheet_name, bounds: tuple
+    ):
+        """Adds an edge from a formula to a cell range it references, given by
+        its (top, left, bottom, right) bounds."""
+        self._add_range_edge(
+            self.intern(parent_sheet_name, parent_cell_loc), self._intern_sheet(range_sheet_name), bounds
+        )
+
+    def update_range_child(self, hidden_name, location, range_hidden_name, bounds: tuple):
+        """Removes the edge from a formula to a cell range."""
+        node_id = self.get_node_id(hidden_name, location)
+        range_sheet_id = self.sheet_ids.get(range_hidden_name)
+        if node_id is not None and range_sheet_id is not None:
+            self._remove_range_edge(node_id, range_sheet_id, bounds)
+
+    def set_range_children(self, sheet_name: str, cell_loc: str, ranges: set):
+        """Makes the given (sheet name, bounds) cell ranges the range children
+        of a cell.  Only the edges that differ from the current ones are
+        touched."""
+        node_id = self.intern(sheet_name, cell_loc)
+        ranges = {(self._intern_sheet(range_sheet), bounds) for range_sheet, bounds in ranges}
+        old_ranges = self.node_ranges.get(node_id, set())
+        for range_sheet_id, bounds in old_ranges - ranges:
+            self._remove_range_edge(node_id, range_sheet_id, bounds)
+        for range_sheet_id, bounds in ranges - old_ranges:
+            self._add_range_edge(node_id, range_sheet_id, bounds)
+
+    def _add_range_edge(self, parent: int, range_sheet_id: int, bounds: tuple):
+        index = self.range_parents.setdefault(range_sheet_id, RangeIndex())
+        index.add(bounds, parent)
+        self.node_ranges.setdefault(parent, set()).add((range_sheet_id, bounds))
+
+    def _remove_range_edge(self, parent: int, range_sheet_id: int, bounds: tuple):
+        index = self.range_parents.get(range_sheet_id)
+        if index is not None:
+            index.remove(bounds, parent)
+        ranges = self.node_ranges.get(parent)
+        if ranges is not None:
+            ranges.discard((range_sheet_id, bounds))
+            if not ranges:
+                del self.node_ranges[parent]
+        self.unused_ids.add(parent)
+
+    def remove_children(self, sheet_name: str, cell_loc: str):
+        """Removes every edge from a cell to the cells and ranges it
+        references."""
+        node_id = self.get_node_id(sheet_name, cell_loc)
+        if node_id is None:
+            return
+        for child in list(self.child_ids[node_id]):
+            self._remove_edge(node_id, child)
+        for range_sheet_id, bounds in list(self.node_ranges.get(node_id, ())):
+            self._remove_range_edge(node_id, range_sheet_id, bounds)
 
     # def update_children(self, sheet_name, location):
     #     """Deletes all the references to a cell."""
@@ -118,37 +326,330 @@ class Graph:
     #     #     return
     #     # self.children_to_parents[sheet_name][location] = []
 
+    @staticmethod
+    def strongly_connected_components(children: dict) -> list:
+        """Returns the strongly connected components of the graph given as
+        {node: set of the nodes it references}, ordered so that every
+        component comes after all the components it references.  Used to
+        evaluate cells before evaluating anything that depends on them."""
+        result = []
+        stack = []
+        on_stack = set()
+        index = {}
+        lowlink = {}
+
+        for root in children:
+            if root in index:
+                continue
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            call_stack = [(root, iter(children[root]))]
+            while call_stack:
+                node, child_iter = call_stack[-1]
+                for child in child_iter:
+                    if child not in index:
+                        index[child] = lowlink[child] = len(index)
+                        stack.append(child)
+                        on_stack.add(child)
+                        call_stack.append((child, iter(children[child])))
+                        break
+                    elif child in on_stack:
+                        lowlink[node] = min(lowlink[node], index[child])
+                else:
+                    call_stack.pop()
+                    if call_stack:
+                        parent = call_stack[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[node])
+                    if lowlink[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.remove(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        result.append(component)
+        return result
+
     def has_sheet(self, sheet_name):
-        return sheet_name in self.children_to_parents.keys()
+        return sheet_name in self.sheet_ids.keys()
 
     def add_sheet(self, sheet_name):
         """Adds a sheet to the graph."""
-        self.children_to_parents[sheet_name] = {}
+        self._intern_sheet(sheet_name)
+
+    def get_sheet_names(self) -> set:
+        """Returns the names of the sheets the graph has cells or ranges of."""
+        return set(self.sheet_ids)
 
     def get_sheet_parents(self, sheet_name):
         """Returns the parents for every cell in a given sheet."""
-        set_of_parents = set()
-        if sheet_name in self.children_to_parents:
-            for cell in self.children_to_parents[sheet_name]:
-                set_of_parents.update(set(self.children_to_parents[sheet_name][cell]))
-
-        return set_of_parents
+        sheet_id = self.sheet_ids.get(sheet_name)
+        if sheet_id is None:
+            return set()
+        parent_ids = set()
+        for node_id in self.node_ids[sheet_id].values():
+            parent_ids.update(self.parent_ids[node_id])
+        if sheet_id in self.range_parents:
+            for _, parents in self.range_parents[sheet_id].get_ranges():
+                parent_ids.update(parents)
+
+        return {self.get_node(parent) for parent in parent_ids}
+
+    def get_range_index(self, sheet_name: str):
+        """Returns the RangeIndex of the ranges referenced on a sheet, or None
+        if there are none."""
+        sheet_id = self.sheet_ids.get(sheet_name)
+        return self.range_parents.get(sheet_id) if sheet_id is not None else None
 
     def get_parents_from_cell(self, sheet_name: str, cell_loc: str):
-        """Returns the parents of a cell."""
-        if sheet_name not in self.children_to_parents:
-            return []
-        if cell_loc not in self.children_to_parents[sheet_name]:
-            return []
-        return self.children_to_parents[sheet_name][cell_loc]
-
-    # def get_children_from_cell(self, sheet_name: str, cell_loc: str):
-    #     """Returns the children of a cell."""
-    #     if sheet_name not in self.parents_to_children:
-    #         return []
-    #     if cell_loc not in self.parents_to_children[sheet_name]:
-    #         return []
-    #     return self.parents_to_children[sheet_name][cell_loc]
+        """Returns the parents of a cell, as the keys of a dict: the formulas
+        referencing the cell itself or a range holding it."""
+        node_id = self.get_node_id(sheet_name, cell_loc)
+        if node_id is not None:
+            parent_ids = self.get_parent_ids(node_id)
+        else:
+            parent_ids = self._find_range_parents(self.sheet_ids.get(sheet_name), cell_loc)
+        return {self.get_node(parent): None for parent in parent_ids}
+
+    def get_parent_ids(self, node_id: int) -> dict:
+        """Returns the IDs of the parents of a node, as the keys of a dict:
+        the formulas referencing the cell itself or a range holding it."""
+        parents = self.parent_ids[node_id]
+        if not self.range_parents:
+            return parents
+        range_parents = self._find_range_parents(*self.nodes[node_id])
+        if not range_parents:
+            return parents
+        return {**parents, **range_parents}
+
+    def _find_range_parents(self, sheet_id: int, cell_loc: str) -> dict:
+        # The IDs of the formulas referencing a range holding the cell
+        index = self.range_parents.get(sheet_id)
+        if not index:
+            return {}
+        try:
+            row, col = convert_location_to_idx(cell_loc)
+        except ValueError:
+            return {}
+        return index.find(row, col)
+
+    def get_children_from_cell(self, sheet_name: str, cell_loc: str) -> set:
+        """Returns the children of a cell."""
+        node_id = self.get_node_id(sheet_name, cell_loc)
+        if node_id is None:
+            return set()
+        return {self.get_node(child) for child in self.child_ids[node_id]}
+
+    def get_child_ids(self, node_id: int) -> set:
+        """Returns the IDs of the children of a node."""
+        return self.child_ids[node_id]
+
+    def get_ranges_from_cell(self, sheet_name: str, cell_loc: str) -> set:
+        """Returns the (sheet name, bounds) of the ranges a cell references."""
+        node_id = self.get_node_id(sheet_name, cell_loc)
+        if node_id is None:
+            return set()
+        sheet_names = self.sheet_names
+        return {(sheet_names[range_sheet_id], bounds) for range_sheet_id, bounds in self.node_ranges.get(node_id, ())}
+
+    def references_any(self, node_id: int, node_ids: dict) -> bool:
+        """Returns True if any of the cells or ranges the given node has edges
+        to is or holds one of the given node IDs."""
+        if any(child in node_ids for child in self.child_ids[node_id]):
+            return True
+        for range_sheet_id, (top, left, bottom, right) in self.node_ranges.get(node_id, ()):
+            for other in node_ids:
+                sheet_id, cell_loc = self.nodes[other]
+                if sheet_id == range_sheet_id:
+                    row, col = convert_location_to_idx(cell_loc)
+                    if top <= row <= bottom and left <= col <= right:
+                        return True
+        return False
+
+    def get_order(self, sheet_name: str, cell_loc: str):
+        """Returns the position of a cell in the topological order, or None
+        if the cell has never had a cell edge."""
+        node_id = self.get_node_id(sheet_name, cell_loc)
+        return self.order[node_id] if node_id is not None else None
+
+    def is_ordered(self, sheet_name: str, cell_loc: str) -> bool:
+        """Returns True if every formula referencing the cell comes after it
+        in the topological order: no range holding the cell is referenced,
+        and no back edge leads to the cell."""
+        node_id = self.get_node_id(sheet_name, cell_loc)
+        if node_id is not None:
+            return self.is_node_ordered(node_id)
+        return not self._find_range_parents(self.sheet_ids.get(sheet_name), cell_loc)
+
+    def is_node_ordered(self, node_id: int) -> bool:
+        """is_ordered for a node ID."""
+        if self.back_edge_children and node_id in self.back_edge_children:
+            return False
+        return not self.range_parents or not self._find_range_parents(*self.nodes[node_id])
+
+    def get_back_edges(self) -> list:
+        """Returns the ((parent sheet, location), (child sheet, location))
+        back edges."""
+        return [(self.get_node(parent), self.get_node(child)) for parent, child in self.back_edges]
+
+    def check_order(self) -> list:
+        """Returns every ((parent sheet, parent location), (child sheet,
+        child location)) edge that is neither a back edge nor in order.  The
+        list is empty when the order is up to date."""
+        order = self.order
+        return sorted(
+            (self.get_node(parent), self.get_node(child))
+            for child, parents in enumerate(self.parent_ids)
+            for parent in parents
+            if (parent, child) not in self.back_edges
+            and not order[child] < order[parent]
+        )
+
+    def _add_to_order(self, parent: int, child: int) -> bool:
+        """Moves cells in the topological order so that the child comes
+        before the parent.  Only the cells whose positions lie between the
+        two are searched, and nothing is searched when the child already
+        comes first.  Returns False, leaving the order alone, if the edge
+        closes a cycle."""
+        order = self.order
+        if order[child] is None:
+            self.lowest -= 1
+            order[child] = self.lowest
+        if order[parent] is None:
+            self.highest += 1
+            order[parent] = self.highest
+        lower = order[parent]
+        upper = order[child]
+        if upper < lower:
+            return True
+        if parent == child:
+            return False
+
+        # The cells after the parent that come before the child, and the cells
+        # before the child that come after the parent
+        forward = self._search_order(parent, child, upper, self._get_ordered_parents)
+        if forward is None:
+            return False
+        backward = self._search_order(child, parent, lower, self._get_ordered_children)
+        if backward is None:
+            return False
+
+        # They swap places, keeping their own order, in the positions they had
+        moved = sorted(backward, key=order.__getitem__) + sorted(forward, key=order.__getitem__)
+        positions = sorted(order[node] for node in moved)
+        for node, position in zip(moved, positions):
+            order[node] = position
+        return True
+
+    def _search_order(self, start: int, target: int, bound: int, get_next):
+        # The cells reached from start through get_next without passing the
+        # bound, or None if the target is one of them
+        order = self.order
+        is_forward = get_next == self._get_ordered_parents
+        seen = {start}
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            for following in get_next(node):
+                if following == target:
+                    return None
+                if following in seen:
+                    continue
+                position = order[following]
+                if position < bound if is_forward else position > bound:
+                    seen.add(following)
+                    stack.append(following)
+        return seen
+
+    def _get_ordered_parents(self, node: int):
+        # The parents of a cell along the edges kept in order
+        for parent in self.parent_ids[node]:
+            if (parent, node) not in self.back_edges:
+                yield parent
+
+    def _get_ordered_children(self, node: int):
+        for child in self.child_ids[node]:
+            if (node, child) not in self.back_edges:
+                yield child
+
+    def _add_back_edge(self, parent: int, child: int):
+        if (parent, child) in self.back_edges:
+            return
+        self.back_edges.add((parent, child))
+        self.back_edge_children[child] += 1
+
+    def _remove_from_order(self, parent: int, child: int):
+        """Forgets a removed edge.  Removing an edge never breaks the order,
+        but it may break the cycles through it, so the back edges closing
+        them are tried again.  A back edge is held back by a path of
+        references from its child down to its parent.  That path can only run
+        through the removed edge if the edge lies between the two in the
+        order, the back edge's child reaches the removed edge's parent, and
+        the removed edge's child reaches the back edge's parent.  The other
+        back edges are left alone without a search."""
+        if (parent, child) in self.back_edges:
+            self.back_edges.remove((parent, child))
+            self.back_edge_children[child] -= 1
+            if not self.back_edge_children[child]:
+                del self.back_edge_children[child]
+            return
+
+        order = self.order
+        candidates = [
+            (back_parent, back_child)
+            for back_parent, back_child in self.back_edges
+            if order[back_parent] <= order[child] and order[parent] <= order[back_child]
+        ]
+        if not candidates:
+            return
+        below = self._search_order(
+            child, None, min(order[back_parent] for back_parent, _ in candidates) - 1,
+            self._get_ordered_children,
+        )
+        above = self._search_order(
+            parent, None, max(order[back_child] for _, back_child in candidates) + 1,
+            self._get_ordered_parents,
+        )
+        for back_parent, back_child in candidates:
+            if back_parent in below and back_child in above:
+                if self._add_to_order(back_parent, back_child):
+                    self._remove_from_order(back_parent, back_child)
+
+    def check_consistency(self) -> list:
+        """Returns every ((parent sheet, parent location), (child sheet, child
+        location)) edge found in only one of parent_ids and child_ids,
+        followed by every ((parent sheet, parent location), (range sheet,
+        bounds)) edge found in only one of range_parents and node_ranges.
+        The list is empty when the graph is consistent."""
+        forward = {
+            (parent, child)
+            for child, parents in enumerate(self.parent_ids)
+            for parent in parents
+        }
+        reverse = {
+            (parent, child)
+            for parent, children in enumerate(self.child_ids)
+            for child in children
+        }
+        range_forward = {
+            (parent, (sheet_id, bounds))
+            for sheet_id, index in self.range_parents.items()
+            for bounds, parents in index.get_ranges()
+            for parent in parents
+        }
+        range_reverse = {
+            (parent, child)
+            for parent, ranges in self.node_ranges.items()
+            for child in ranges
+        }
+        return sorted(
+            (self.get_node(parent), self.get_node(child)) for parent, child in forward ^ reverse
+        ) + sorted(
+            (self.get_node(parent), (self.sheet_names[sheet_id], bounds))
+            for parent, (sheet_id, bounds) in range_forward ^ range_reverse
+        )
 
     def get_circ_refs(self, cycle_check: list):
         """Performs a BFS to find all cells in a cycle."""
@@ -328,9 +829,7 @@ class Graph:
         return result[::-1], cycle_detected
 
     def tarjans(self, start_sheet_name: str, start_cell_location: str):
-        if start_sheet_name not in self.children_to_parents:
-            return [[]], False
-        if start_cell_location not in self.children_to_parents[start_sheet_name]:
+        if not self.get_parents_from_cell(start_sheet_name, start_cell_location):
             return [[]], False
 
         result = []
@@ -0,0 +1,115 @@
+import collections
+from sheets.utils import get_highest_precedence_error
+
+
+class LookupIndex:
+    """Maps each value in the key row or key column of a cell range to the
+    first position it appears at, as VLOOKUP and HLOOKUP search for it."""
+
+    def __init__(self, sheet, epoch: int, keys: list, refs: list):
+        """
+        args:
+            sheet: the Sheet the keys were read from
+            epoch: the sheet's epoch for the key row or column when the keys
+                   were read
+            keys: the values of the key row or column, in order
+            refs: the references to the cells the keys were read from
+        """
+        self.sheet = sheet
+        self.epoch = epoch
+        self.refs = refs
+        self.error = get_highest_precedence_error(keys)
+        self.positions = {}
+        for position, key in enumerate(keys):
+            self.positions.setdefault(key, position)
+
+    def find(self, key):
+        """Returns the first position of key, None if it is not a key, or the
+        highest precedence error among the keys."""
+        if self.error is not None:
+            return self.error
+        return self.positions.get(key)
+
+
+class LookupIndexCache:
+    """A bounded LRU cache of LookupIndexes, shared by every lookup in a
+    workbook.
+
+    Thousands of VLOOKUPs into the same table all search its first column, so
+    the column is read and indexed once rather than scanned by every lookup.
+    An index is rebuilt once its key row or column changes, which the sheet
+    tracks with a per-row and per-column epoch (see Sheet.get_row_epoch).
+    Changes elsewhere in the table, or elsewhere on the sheet, leave it alone.
+
+    Dict lookups match keys the way list.index does: values that compare
+    equal, such as TRUE and 1, hash equally too."""
+
+    DEFAULT_CAPACITY = 1000
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        """
+        args:
+            capacity: the maximum number of indexes held in the cache
+        """
+        if capacity < 1:
+            raise ValueError("Lookup index capacity must be at least 1")
+        self.capacity = capacity
+        self.entries = collections.OrderedDict()  # {key row or column: LookupIndex}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def find(self, cell_range, key, by_row: bool):
+        """Returns the position of key in the top row (if by_row) or left
+        column of the range, as described by LookupIndex.find.  The cells of
+        the row or column are recorded as references of the formula being
+        evaluated, just as if they had been read."""
+        sheet = cell_range.get_sheet()
+        if sheet is None:
+            # Not cached, every cell is a #REF! until the sheet exists
+            if by_row:
+                return get_highest_precedence_error(cell_range.get_row(0))
+            return get_highest_precedence_error(cell_range.get_column(0))
+
+        if by_row:
+            entry_key = (cell_range.sheet_name, True, cell_range.top, cell_range.left, cell_range.right)
+            epoch = sheet.get_row_epoch(cell_range.top)
+        else:
+            entry_key = (cell_range.sheet_name, False, cell_range.left, cell_range.top, cell_range.bottom)
+            epoch = sheet.get_col_epoch(cell_range.left)
+
+        index = self.entries.get(entry_key)
+        if index is not None and index.sheet is sheet and index.epoch == epoch:
+            self.hits += 1
+            self.entries.move_to_end(entry_key)
+            cell_range.evaluator.refs.update(index.refs)
+        else:
+            self.misses += 1
+            if by_row:
+                index = LookupIndex(sheet, epoch, cell_range.get_row(0), cell_range.get_row_refs(0))
+            else:
+                index = LookupIndex(sheet, epoch, cell_range.get_column(0), cell_range.get_column_refs(0))
+            self.entries[entry_key] = index
+            self.entries.move_to_end(entry_key)
+            self._evict(self.capacity)
+        return index.find(key)
+
+    def clear(self):
+        """Empties the cache.  The counters are left untouched."""
+        self.entries.clear()
+
+    def get_stats(self) -> dict:
+        """Returns the hit/miss/eviction counters along with the current size
+        and capacity of the cache."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.entries),
+            "capacity": self.capacity,
+        }
+
+    def _evict(self, capacity: int):
+        while len(self.entries) > capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
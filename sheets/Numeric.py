@@ -0,0 +1,161 @@
+import decimal
+import math
+from decimal import Decimal
+from sheets.utils import remove_exponent
+
+# Every type a number may have in a cell, whatever the numeric mode.  bool is
+# a subclass of int but is never a number here, so check with is_number.
+NUMBER_TYPES = frozenset([Decimal, float, int])
+
+
+def is_number(value) -> bool:
+    return type(value) in NUMBER_TYPES
+
+
+class DecimalBackend:
+    """Exact decimal arithmetic, and the default.  Cell values are Decimals
+    with their trailing zeros removed (see remove_exponent)."""
+
+    name = "decimal"
+    number_types = frozenset([Decimal])
+    # Whether SUM, MIN, MAX and AVERAGE may use the workbook's
+    # RangeAggregates, which keep exact Decimal totals
+    supports_range_aggregates = True
+
+    def to_number(self, value):
+        """Converts an operand of arithmetic to a number, treating empty
+        cells as 0 and booleans as 0 or 1.  Raises a ValueError or a
+        decimal.InvalidOperation if it isn't a number."""
+        if value is None:
+            return Decimal(0)
+        return Decimal(value)
+
+    def literal(self, text: str):
+        """Returns the number a formula's numeric literal stands for."""
+        return Decimal(text)
+
+    def parse(self, text: str):
+        """Returns the number the contents of a cell stand for, or None if
+        they aren't a finite number."""
+        try:
+            number = Decimal(text)
+            return remove_exponent(number) if number.is_finite() else None
+        except decimal.InvalidOperation:
+            # Including numbers too long to requantize
+            return None
+
+    def store(self, value):
+        """Returns the value a cell holds when its formula evaluates to the
+        given number."""
+        number = Decimal(value)
+        if not number.is_finite():
+            return value
+        number = remove_exponent(number)
+        if number == 0:
+            return Decimal(0)
+        return number
+
+    def divide(self, left, right):
+        return left / right
+
+
+class FloatBackend:
+    """Binary floating point arithmetic, much faster than Decimal when its
+    precision is good enough.  Cell values are floats."""
+
+    name = "float"
+    number_types = frozenset([float])
+    supports_range_aggregates = False
+
+    def to_number(self, value):
+        if value is None:
+            return 0.0
+        return float(value)
+
+    def literal(self, text: str):
+        return float(text)
+
+    def parse(self, text: str):
+        try:
+            number = float(text)
+        except ValueError:
+            return None
+        return number + 0.0 if math.isfinite(number) else None
+
+    def store(self, value):
+        number = float(value)
+        if not math.isfinite(number):
+            return value
+        # -0.0 is stored as 0.0
+        return number + 0.0
+
+    def divide(self, left, right):
+        return left / right
+
+
+class HybridBackend:
+    """Whole numbers are Python ints, and everything else is a Decimal, so
+    the integer arithmetic most workbooks are made of skips Decimal
+    entirely.  Ints are exact at any size, where Decimals round to the
+    context's precision.  Cell values are ints or Decimals."""
+
+    name = "hybrid"
+    number_types = frozenset([int, Decimal])
+    supports_range_aggregates = False
+
+    def to_number(self, value):
+        if value is None:
+            return 0
+        if type(value) is int or type(value) is bool:
+            return int(value)
+        if type(value) is Decimal:
+            return value
+        return self._narrow(Decimal(value))
+
+    def literal(self, text: str):
+        return self._narrow(Decimal(text))
+
+    def parse(self, text: str):
+        try:
+            number = Decimal(text)
+            return self._narrow(number) if number.is_finite() else None
+        except decimal.InvalidOperation:
+            return None
+
+    def store(self, value):
+        if type(value) is int:
+            return value
+        number = Decimal(value)
+        if not number.is_finite():
+            return value
+        return self._narrow(number)
+
+    def divide(self, left, right):
+        if type(left) is int and type(right) is int and left % right == 0:
+            return left // right
+        return Decimal(left) / Decimal(right)
+
+    def _narrow(self, number: Decimal):
+        if number == number.to_integral_value():
+            return int(number)
+        return remove_exponent(number)
+
+
+DECIMAL_BACKEND = DecimalBackend()
+
+# The numeric modes a Workbook may be created with
+NUMERIC_BACKENDS = {
+    backend.name: backend
+    for backend in [DECIMAL_BACKEND, FloatBackend(), HybridBackend()]
+}
+
+
+def get_numeric_backend(mode: str):
+    """Returns the backend for a numeric mode: "decimal", "float" or
+    "hybrid".  Raises a ValueError for any other mode."""
+    try:
+        return NUMERIC_BACKENDS[mode]
+    except KeyError:
+        raise ValueError(
+            f"{mode} is not a numeric mode, expected one of {', '.join(NUMERIC_BACKENDS)}"
+        ) from None
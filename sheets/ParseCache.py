@@ -0,0 +1,148 @@
+import collections
+import weakref
+import lark
+from sheets.Compiler import FormulaCompiler
+from sheets.FormulaTemplate import FormulaTemplate
+from sheets.Parser import FormulaToTemplate
+from sheets.TreeInterner import TreeInterner
+
+
+def get_relative_axes(tree: lark.Tree) -> tuple:
+    """Returns whether any cell reference in the tree has a relative row, and
+    whether any has a relative column."""
+    rows_relative = cols_relative = False
+    for token in tree.scan_values(lambda value: isinstance(value, lark.Token)):
+        if token.type in ("CELLREF_NO_ABS", "CELLREF_COL_ABS"):
+            rows_relative = True
+        if token.type in ("CELLREF_NO_ABS", "CELLREF_ROW_ABS"):
+            cols_relative = True
+    return (rows_relative, cols_relative)
+
+
+class ParseCache:
+    """A bounded LRU cache of parsed and compiled formulas, shared by every cell
+    in a workbook.
+
+    Formulas are keyed by their text with surrounding whitespace removed, so
+    thousands of cells holding the same formula (after copy_cells, copy_sheet,
+    or loading a generated workbook) are only parsed once.  Formulas that fail
+    to parse are cached too, and raise the same error on every lookup.
+
+    Cached trees are shared between cells and must never be mutated; lark's
+    Transformers already build new trees rather than modifying their input.
+
+    Parsed formulas are turned into FormulaTemplates for the cell they are in.
+    Templates are interned, so every cell holding the same template (such as
+    =A1+1 in B2 and =A2+1 in B3) shares one template and one compiled formula
+    for as long as any cell still uses it.  The subtrees different templates
+    have in common are shared as well (see TreeInterner).  A template only
+    depends on the rows of the cell it is in if the formula has references
+    with relative rows, and likewise for columns, so each formula remembers
+    its templates by those, and a formula in a cell with a cached template
+    is neither transformed nor hashed again."""
+
+    DEFAULT_CAPACITY = 10000
+
+    def __init__(self, parser, capacity: int = DEFAULT_CAPACITY, compiler=None):
+        """
+        args:
+            parser: the parser used on a cache miss
+            capacity: the maximum number of formulas held in the cache
+            compiler: compiles template trees, a FormulaCompiler by default
+        """
+        if capacity < 1:
+            raise ValueError("Parse cache capacity must be at least 1")
+        self.parser = parser
+        self.compiler = FormulaCompiler() if compiler is None else compiler
+        self.capacity = capacity
+        # {formula text: (Tree, rows relative, columns relative) or LarkError}
+        self.entries = collections.OrderedDict()
+        self.templates = weakref.WeakValueDictionary()  # {template tree: FormulaTemplate}
+        # {(formula text, row or None, column or None): FormulaTemplate}, with
+        # the row or column None if the formula's references don't depend on it
+        self.formula_templates = weakref.WeakValueDictionary()
+        self.interner = TreeInterner()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def parse(self, formula: str) -> lark.Tree:
+        """Returns the parse tree of the formula, parsing it only on a miss.
+        Raises a lark.exceptions.LarkError if the formula is invalid."""
+        return self._get_entry(formula.strip())[0]
+
+    def get_template(self, formula: str, row: int, col: int) -> FormulaTemplate:
+        """Returns the template of the formula for the cell at (row, col),
+        compiling it only if no cell holds the same template yet.  Raises a
+        lark.exceptions.LarkError if the formula is invalid."""
+        key = formula.strip()
+        (tree, rows_relative, cols_relative) = self._get_entry(key)
+        anchor = (key, row if rows_relative else None, col if cols_relative else None)
+        template = self.formula_templates.get(anchor)
+        if template is not None:
+            return template
+
+        tree = FormulaToTemplate(row, col).transform(tree)
+        template = self.templates.get(tree)
+        if template is None:
+            tree = self.interner.intern(tree)
+            template = FormulaTemplate(tree, self.compiler.compile(tree))
+            self.templates[tree] = template
+        self.formula_templates[anchor] = template
+        return template
+
+    def set_capacity(self, capacity: int):
+        """Changes the maximum number of formulas in the cache, evicting the
+        least recently used formulas if it is now over capacity."""
+        if capacity < 1:
+            raise ValueError("Parse cache capacity must be at least 1")
+        self.capacity = capacity
+        self._evict(capacity)
+
+    def clear(self):
+        """Empties the cache.  The counters are left untouched."""
+        self.entries.clear()
+
+    def get_stats(self) -> dict:
+        """Returns the hit/miss/eviction counters along with the current size
+        and capacity of the cache."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.entries),
+            "capacity": self.capacity,
+        }
+
+    def get_memory_report(self) -> dict:
+        """Reports the memory held by the trees of every template still in
+        use, and how much sharing their common subtrees saves.  See
+        TreeInterner.get_memory_report."""
+        return self.interner.get_memory_report(list(self.templates.keys()))
+
+    def _get_entry(self, key: str) -> tuple:
+        """Returns the parse tree of the stripped formula text, and whether
+        the rows and the columns of its references are relative, parsing it
+        only on a miss."""
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        else:
+            self.misses += 1
+            try:
+                tree = self.parser.parse(key)
+                entry = (tree, *get_relative_axes(tree))
+            except lark.exceptions.LarkError as E:
+                entry = E
+            self.entries[key] = entry
+            self._evict(self.capacity)
+
+        if isinstance(entry, lark.exceptions.LarkError):
+            raise entry.with_traceback(None)
+        return entry
+
+    def _evict(self, capacity: int):
+        while len(self.entries) > capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
@@ -1,8 +1,16 @@
 import lark
 import decimal
+import hashlib
+import logging
+import os
+import pickle
+import sys
+from lark.reconstruct import Reconstructor
 from lark.visitors import visit_children_decor
 from sheets.CellError import CellError
 from sheets.CellErrorType import CellErrorType
+from sheets.Numeric import DECIMAL_BACKEND, is_number
+from sheets.RangeRef import RangeRef
 from sheets.utils import (
     requires_single_quotes,
     convert_location_to_idx,
@@ -52,12 +60,13 @@ def formula_decor(function):
 
 def strip_trailing_zeros(value):
     """
-    Strips trailing zeros from a Decimal value and returns it as a string.
-    If the input is not a Decimal, it returns the input as is.
+    Strips trailing zeros from a number and returns it as a string.
+    If the input is not a number, it returns the input as is.
     """
-    if isinstance(value, decimal.Decimal):
+    if is_number(value):
         # Convert to string and strip trailing zeros
-        return str(value).rstrip("0").rstrip(".") if "." in str(value) else str(value)
+        text = str(value)
+        return text.rstrip("0").rstrip(".") if "." in text and "e" not in text else text
     else:
         # Return non-Decimal values as is
         return value
@@ -67,15 +76,15 @@ def convert_nones(l, r):
     if l is None and r is None:
         return (l, r)
     elif l is None:
-        if isinstance(r, decimal.Decimal):
-            return (decimal.Decimal(0), r)
+        if is_number(r):
+            return (type(r)(0), r)
         if type(r) == str:
             return ("", r)
         if type(r) == bool:
             return (False, r)
     elif r is None:
-        if isinstance(l, decimal.Decimal):
-            return (l, decimal.Decimal(0))
+        if is_number(l):
+            return (l, type(l)(0))
         if type(l) == str:
             return (l, "")
         if type(l) == bool:
@@ -89,25 +98,168 @@ def convert_types(l):
         return 3
     if type(l) == str:
         return 2
-    if type(l) == decimal.Decimal:
+    if is_number(l):
         return 1
 
 
+def compare_values(l, op, r):
+    """Applies the comparison operator op to two non-error values."""
+    l, r = convert_nones(l, r)
+    # Numbers of different types (ints and Decimals in the hybrid numeric
+    # mode) compare as numbers
+    if type(l) != type(r) and not (is_number(l) and is_number(r)):
+        l = convert_types(l)
+        r = convert_types(r)
+    if type(l) is str:
+        l = l.lower()
+        r = r.lower()
+    if op in ["<>", "!="]:
+        return l != r
+    if op == ">":
+        return l > r
+    if op == "<":
+        return l < r
+    if op == ">=":
+        return l >= r
+    if op == "<=":
+        return l <= r
+    if op in ["==", "="]:
+        return l == r
+
+
+def concatenate_values(l, r):
+    """Concatenates two non-error values as strings."""
+    values = [l, r]
+    if values[0] is None:
+        values[0] = ""
+    if values[1] is None:
+        values[1] = ""
+    if isinstance(values[0], bool):
+        values[0] = "TRUE" if values[0] else "FALSE"
+    if isinstance(values[1], bool):
+        values[1] = "TRUE" if values[1] else "FALSE"
+
+    if not isinstance(values[0], str) and not is_number(values[0]):
+        return CellError(
+            CellErrorType.TYPE_ERROR,
+            f"Concatenation only functions with strings. {values[0]} is not a string.",
+        )
+    elif not isinstance(values[1], str) and not is_number(values[1]):
+        return CellError(
+            CellErrorType.TYPE_ERROR,
+            f"Concatenation only functions with strings. {values[1]} is not a string.",
+        )
+
+    # Must handle implicit cell types
+    return "".join([str(strip_trailing_zeros(val)) for val in values])
+
+
+def add_values(left, op, r, numeric=DECIMAL_BACKEND):
+    """Adds or subtracts two non-error values in the given numeric mode."""
+    try:
+        left = numeric.to_number(left)
+    except (decimal.InvalidOperation, ValueError):
+        return CellError(
+            CellErrorType.TYPE_ERROR,
+            f"Addition/Subtraction only works with decimals. {left} in {left} {op} {r} is not a decimal.",
+        )
+
+    try:
+        r = numeric.to_number(r)
+    except (decimal.InvalidOperation, ValueError):
+        return CellError(
+            CellErrorType.TYPE_ERROR,
+            f"Addition/Subtraction only works with decimals. {r} in  {left} {op} {r} is not a decimal.",
+        )
+
+    if op == "+":
+        return left + r
+    else:
+        # Handle case of negative numbers?
+        return left - r
+
+
+def apply_unary_op(op, r, numeric=DECIMAL_BACKEND):
+    """Applies a unary +/- to a non-error value in the given numeric mode."""
+    try:
+        r = numeric.to_number(r)
+    except (decimal.InvalidOperation, ValueError):
+        return CellError(
+            CellErrorType.TYPE_ERROR,
+            f"Unary operators only work with decimals. {r} in {op} {r} is not a decimal.",
+        )
+    if op == "+":
+        return r
+    elif op == "-":
+        return -r
+
+
+def multiply_values(left, op, r, numeric=DECIMAL_BACKEND):
+    """Multiplies or divides two non-error values in the given numeric mode."""
+    try:
+        left = numeric.to_number(left)
+    except (decimal.InvalidOperation, ValueError):
+        return CellError(
+            CellErrorType.TYPE_ERROR,
+            f"Multiplication/Addition only works with decimals. {left} in {left} {op} {r} is not a decimal.",
+        )
+
+    try:
+        r = numeric.to_number(r)
+    except (decimal.InvalidOperation, ValueError):
+        return CellError(
+            CellErrorType.TYPE_ERROR,
+            f"Multiplication/Addition only works with decimals. {r} in  {left} {op} {r} is not a decimal.",
+        )
+
+    if op == "*":
+        return left * r
+    else:
+        if r == 0:
+            return CellError(
+                CellErrorType.DIVIDE_BY_ZERO,
+                f"In this expression you try to divide {left} by 0",
+            )
+        else:
+            return numeric.divide(left, r)
+
+
 class FormulaEvaluator(lark.visitors.Interpreter):
-    def __init__(self, workbook, sheet_name, formula_functions: dict):
+    def __init__(self, workbook, sheet_name, formula_functions, location=None, numeric=None):
         """Evaluates formulas that have already been parsed by lark.
         args:
             workbook -- the workbook so that the Evaluator can access cell values
-            sheet_name -- the name of the sheet in which the formula is located"""
+            sheet_name -- the name of the sheet in which the formula is located
+            formula_functions -- the FunctionRegistry of functions formulas may call
+            location -- the cell the formula is in, which relative references
+                        in compiled formula templates are resolved against
+            numeric -- the numeric backend arithmetic is done in, the
+                       workbook's by default (see sheets.Numeric)"""
         super(FormulaEvaluator, self).__init__()
         self.workbook = workbook
         self.sheet_name = sheet_name
+        self.row, self.col = (
+            convert_location_to_idx(location) if location else (None, None)
+        )
         self.formula_functions = formula_functions
+        if numeric is None:
+            numeric = workbook.numeric if workbook is not None else DECIMAL_BACKEND
+        self.numeric = numeric
+        # "sheet!location" for each cell read, and (sheet, top, left, bottom,
+        # right) for each range read (see RangeRef)
         self.refs = set({})
 
     def get_cell_refs(self):
         return self.refs
 
+    def visit(self, tree):
+        """Evaluates either a lark tree or a node of a compiled formula. Sheet
+        functions call this on their arguments, which are compiled nodes when
+        the formula was compiled."""
+        if isinstance(tree, lark.Tree):
+            return super().visit(tree)
+        return tree(self)
+
     @formula_decor
     def parens(self, values):
         """Handles the parentheses nonterminal."""
@@ -116,134 +268,34 @@ class FormulaEvaluator(lark.visitors.Interpreter):
     @formula_decor
     def comp_expr(self, values):
         l, op, r = values
-        l, r = convert_nones(l, r)
-        if type(l) != type(r):
-            l = convert_types(l)
-            r = convert_types(r)
-        if type(l) is str:
-            l = l.lower()
-            r = r.lower()
-        if op in ["<>", "!="]:
-            return l != r
-        if op == ">":
-            return l > r
-        if op == "<":
-            return l < r
-        if op == ">=":
-            return l >= r
-        if op == "<=":
-            return l <= r
-        if op in ["==", "="]:
-            return l == r
+        return compare_values(l, op, r)
 
     @formula_decor
     def concat_expr(self, values):
         """Handles the concatenation nonterminal."""
-        if values[0] is None:
-            values[0] = ""
-        if values[1] is None:
-            values[1] = ""
-        if isinstance(values[0], bool):
-            values[0] = "TRUE" if values[0] else "FALSE"
-        if isinstance(values[1], bool):
-            values[1] = "TRUE" if values[1] else "FALSE"
-
-        if not isinstance(values[0], str) and not isinstance(
-            values[0], decimal.Decimal
-        ):
-            return CellError(
-                CellErrorType.TYPE_ERROR,
-                f"Concatenation only functions with strings. {values[0]} is not a string.",
-            )
-        elif not isinstance(values[1], str) and not isinstance(
-            values[1], decimal.Decimal
-        ):
-            return CellError(
-                CellErrorType.TYPE_ERROR,
-                f"Concatenation only functions with strings. {values[1]} is not a string.",
-            )
-
-        # Must handle implicit cell types
-        return "".join([str(strip_trailing_zeros(val)) for val in values])
+        return concatenate_values(values[0], values[1])
 
     @formula_decor
     def add_expr(self, values):
         """Handles the addition/subtraction nonterminal."""
         (left, op, r) = values
-
-        try:
-            left = decimal.Decimal(0) if left is None else decimal.Decimal(left)
-        except decimal.InvalidOperation:
-            return CellError(
-                CellErrorType.TYPE_ERROR,
-                f"Addition/Subtraction only works with decimals. {left} in {left} {op} {r} is not a decimal.",
-            )
-
-        try:
-            r = decimal.Decimal(0) if r is None else decimal.Decimal(r)
-        except decimal.InvalidOperation:
-            return CellError(
-                CellErrorType.TYPE_ERROR,
-                f"Addition/Subtraction only works with decimals. {r} in  {left} {op} {r} is not a decimal.",
-            )
-
-        if op == "+":
-            return left + r
-        else:
-            # Handle case of negative numbers?
-            return left - r
+        return add_values(left, op, r, self.numeric)
 
     @formula_decor
     def unary_op(self, values):
         (op, r) = values
-        try:
-            r = decimal.Decimal(0) if r is None else decimal.Decimal(r)
-        except decimal.InvalidOperation:
-            return CellError(
-                CellErrorType.TYPE_ERROR,
-                f"Unary operators only work with decimals. {r} in {op} {r} is not a decimal.",
-            )
-        if op == "+":
-            return r
-        elif op == "-":
-            return -r
+        return apply_unary_op(op, r, self.numeric)
 
     @formula_decor
     def mul_expr(self, values):
         """Handles the multiplication/division nonterminal."""
         (left, op, r) = values
-
-        try:
-            left = decimal.Decimal(0) if left is None else decimal.Decimal(left)
-        except decimal.InvalidOperation:
-            return CellError(
-                CellErrorType.TYPE_ERROR,
-                f"Multiplication/Addition only works with decimals. {left} in {left} {op} {r} is not a decimal.",
-            )
-
-        try:
-            r = decimal.Decimal(0) if r is None else decimal.Decimal(r)
-        except decimal.InvalidOperation:
-            return CellError(
-                CellErrorType.TYPE_ERROR,
-                f"Multiplication/Addition only works with decimals. {r} in  {left} {op} {r} is not a decimal.",
-            )
-
-        if op == "*":
-            return left * r
-        else:
-            if r == decimal.Decimal(0):
-                return CellError(
-                    CellErrorType.DIVIDE_BY_ZERO,
-                    f"In this expression you try to divide {left} by 0",
-                )
-            else:
-                return left / r
+        return multiply_values(left, op, r, self.numeric)
 
     @formula_decor
     def number(self, values):
         """Handles the number nonterminal."""
-        return decimal.Decimal(values[0])
+        return self.numeric.literal(values[0])
 
     @formula_decor
     def string(self, values):
@@ -260,9 +312,12 @@ class FormulaEvaluator(lark.visitors.Interpreter):
             cell_sheet = self.sheet_name
             cell_loc = values[0].value.lower()
         cell_loc = re.sub("\$", "", cell_loc)
+        return self.read_cell(cell_sheet, cell_loc)
 
+    def read_cell(self, cell_sheet: str, cell_loc: str):
+        """Reads the value of a cell referenced by the formula, recording the
+        reference.  cell_loc must be lowercase and without any $."""
         self.refs.add(str(cell_sheet) + "!" + cell_loc)
-        #TODO:
         try:
             return self.workbook.get_cell_value(cell_sheet, cell_loc)
         except ValueError as E:
@@ -299,79 +354,71 @@ class FormulaEvaluator(lark.visitors.Interpreter):
     def range_expr(self, tree):
         children = tree.children
         if len(children) == 3:
-            sheet_name = children[0]
+            sheet_name = children[0].value
             loc_1 = children[1].value
             loc_2 = children[2].value
         else:
-            if requires_single_quotes(self.sheet_name):
-                sheet_name = lark.Token('QUOTED_SHEET_NAME', self.sheet_name)
-            else:
-                sheet_name = lark.Token('SHEET_NAME', self.sheet_name)
+            sheet_name = self.sheet_name
             loc_1 = children[0].value
             loc_2 = children[1].value
 
         row_1 , col_1 = convert_location_to_idx(loc_1)
         row_2 , col_2 = convert_location_to_idx(loc_2)
-        start_row = min(row_1,row_2)
-        end_row = max(row_1,row_2)
-        start_col = min(col_1,col_2)
-        end_col = max(col_1, col_2)
-
-        cell_arr = []
-
-        for row in range(start_row, end_row + 1):
-            cell_row = []
-            for col in range(start_col, end_col + 1):
-                cell_row.append(lark.Tree(lark.Token('RULE', 'cell'), [sheet_name, lark.Token("CELLREF_NO_ABS", convert_idx_to_location(row,col))]))
-            cell_arr.append(cell_row)
-
-        return cell_arr
+        return RangeRef(
+            self,
+            sheet_name,
+            min(row_1, row_2),
+            min(col_1, col_2),
+            max(row_1, row_2),
+            max(col_1, col_2),
+        )
 
     def function(self, tree):
         children = tree.children
         func_token = children[0]
         func_name = func_token.value
-        try:
-            function = self.formula_functions[func_name.upper()]
-        except KeyError:
+        info = self.formula_functions.get(func_name)
+        if info is None:
             return CellError(
                 CellErrorType.BAD_NAME, f"{func_name} is not a valid function name"
             )
-        # I know this is disgusting but bear with me
-        # TODO: Fix this whole gross thing
-        func = function(self)
-        value = func(children[1:])
-        return value
+        error = info.check_args(len(children) - 1)
+        if error is not None:
+            return error
+        return info.bind(self)(children[1:])
+
+
+class CellRefFinder(lark.Visitor):
+    """Finds everything a formula template references without evaluating it:
+    the cells, the cell ranges, the sheet names, and the functions it calls.
+
+    The references are a superset of the ones evaluation records, since the
+    untaken branches of IF, IFERROR and CHOOSE are included too.  Only
+    INDIRECT references cells that can't be found this way."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.cells = []  # [(sheet name or None, template cell ref token)]
+        self.ranges = []  # [(sheet name or None, corner token, corner token)]
+        self.sheet_names = set()
+        self.functions = set()
+
+    def cell(self, tree: lark.Tree):
+        if len(tree.children) == 2:
+            self.sheet_names.add(str(tree.children[0]))
+            self.cells.append((str(tree.children[0]), tree.children[1]))
+        else:
+            self.cells.append((None, tree.children[0]))
 
+    def range_expr(self, tree: lark.Tree):
+        if len(tree.children) == 3:
+            self.sheet_names.add(str(tree.children[0]))
+            self.ranges.append((str(tree.children[0]), *tree.children[1:]))
+        else:
+            self.ranges.append((None, *tree.children))
 
-#
-# # This is stolen from lecture code.
-# class CellRefFinder(lark.Visitor):
-#     """Finds all cells referenced in the formula."""
-#
-#     def __init__(self) -> None:
-#         super().__init__()
-#         self.refs = []
-#
-#     def cell(self, tree: lark.Tree):
-#         """Handles the cell token."""
-#         if len(tree.children) == 1:
-#             ref = str(tree.children[0])
-#             ref = re.sub("\$", "", ref)
-#             self.refs.append(ref)
-#         else:
-#             assert len(tree.children)
-#             ref = str(tree.children[-1])
-#             ref = re.sub("\$", "", ref)
-#             self.refs.append(str(tree.children[0]) + "!" + ref)
-#
-#     def get_refs(self):
-#         """Returns the list of cell references after they've been collected."""
-#         return self.refs
-#
-#     def clear_refs(self):
-#         """Resets the list of cell references."""
-#         self.refs = []
+    def function(self, tree: lark.Tree):
+        self.functions.add(str(tree.children[0]).upper())
 
 
 class FormulaFixer(lark.Transformer):
@@ -386,7 +433,6 @@ class FormulaFixer(lark.Transformer):
         sheet_name = sheet_name_tok.value
         if not requires_single_quotes(sheet_name_tok):
             sheet_name = sheet_name[1:-1]
-            sheet_name_tok.type = "SHEET_NAME"
 
         if sheet_name.lower().strip("'") == self.old_sheet_name.lower().strip("'"):
             sheet_name = self.new_sheet_name
@@ -455,6 +501,236 @@ class MoveFormula(lark.Transformer):
         return cell_ref_tok
 
 
-parser = lark.Lark.open(
-    "formulas.lark", rel_to=__file__, start="formula", maybe_placeholders=False
-)
+TEMPLATE_REF_PATTERN = re.compile(r"^R(\[-?[0-9]+\]|[0-9]+)C(\[-?[0-9]+\]|[0-9]+)$")
+
+
+def parse_template_ref(template_ref: str):
+    """Splits a template cell reference such as R[-1]C3 into
+    (row, row_is_relative, col, col_is_relative).  Relative parts are offsets
+    from the cell holding the formula."""
+    row, col = TEMPLATE_REF_PATTERN.match(template_ref).groups()
+    row_is_relative = row[0] == "["
+    col_is_relative = col[0] == "["
+    row = int(row[1:-1]) if row_is_relative else int(row)
+    col = int(col[1:-1]) if col_is_relative else int(col)
+    return row, row_is_relative, col, col_is_relative
+
+
+class FormulaToTemplate(lark.Transformer):
+    """Rewrites the relative and mixed cell references of a parse tree in R1C1
+    style, relative to the cell at (row, col).  Formulas copied down a column
+    all become the same template tree.  Absolute references are left as is."""
+
+    def __init__(self, row, col) -> None:
+        self.row = row
+        self.col = col
+
+    def CELLREF_NO_ABS(self, cell_ref_tok):
+        (row, col) = convert_location_to_idx(cell_ref_tok.value)
+        return lark.Token(
+            "CELLREF_NO_ABS", f"R[{row - self.row}]C[{col - self.col}]"
+        )
+
+    def CELLREF_ROW_ABS(self, cell_ref_tok):
+        (row, col) = convert_location_to_idx(cell_ref_tok.value)
+        return lark.Token("CELLREF_ROW_ABS", f"R{row}C[{col - self.col}]")
+
+    def CELLREF_COL_ABS(self, cell_ref_tok):
+        (row, col) = convert_location_to_idx(cell_ref_tok.value)
+        return lark.Token("CELLREF_COL_ABS", f"R[{row - self.row}]C{col}")
+
+    def CELLREF_BOTH_ABS(self, cell_ref_tok):
+        return cell_ref_tok
+
+
+class TemplateToFormula(MoveFormula):
+    """Turns a template tree back into an ordinary parse tree for the cell at
+    (row, col).  References that fall off the sheet become #REF! exactly as
+    they do in MoveFormula."""
+
+    def __init__(self, row, col) -> None:
+        self.row = row
+        self.col = col
+
+    def _locate(self, cell_ref_tok):
+        (row, row_is_relative, col, col_is_relative) = parse_template_ref(
+            cell_ref_tok.value
+        )
+        if row_is_relative:
+            row += self.row
+        if col_is_relative:
+            col += self.col
+        new_loc = convert_idx_to_location(row, col)
+        if not check_valid_cell_location(new_loc):
+            return None
+        return new_loc.upper()
+
+    def CELLREF_NO_ABS(self, cell_ref_tok):
+        new_loc = self._locate(cell_ref_tok)
+        if new_loc is None:
+            return lark.Token("ERROR_VALUE", "#REF!")
+        return lark.Token("CELLREF_NO_ABS", new_loc)
+
+    def CELLREF_ROW_ABS(self, cell_ref_tok):
+        new_loc = self._locate(cell_ref_tok)
+        if new_loc is None:
+            return lark.Token("ERROR_VALUE", "#REF!")
+        new_loc = re.sub(r"(?<=[A-Z])[0-9]+$", r"$\g<0>", new_loc)
+        return lark.Token("CELLREF_ROW_ABS", new_loc)
+
+    def CELLREF_COL_ABS(self, cell_ref_tok):
+        new_loc = self._locate(cell_ref_tok)
+        if new_loc is None:
+            return lark.Token("ERROR_VALUE", "#REF!")
+        return lark.Token("CELLREF_COL_ABS", "$" + new_loc)
+
+
+class LarkTreeBuilder:
+    """Builds the LALR parse tree out of lark's own Tree and Token classes.
+
+    The standalone parser carries its own copies of lark's classes, so without
+    this its trees would not work with lark.Transformer or the Reconstructor,
+    and would not compare equal to trees from the Earley parser."""
+
+    def __default__(self, data, children, meta):
+        return lark.Tree(
+            data,
+            [
+                child
+                if isinstance(child, lark.Tree)
+                else lark.Token(child.type, child.value)
+                for child in children
+            ],
+        )
+
+
+GRAMMAR_PATH = os.path.join(os.path.dirname(__file__), "formulas.lark")
+EARLEY_OPTIONS = {"start": "formula", "maybe_placeholders": False}
+
+
+def grammar_cache_dir() -> str:
+    """Returns the per-user directory the loaded Earley grammar is cached in:
+    sheets under $XDG_CACHE_HOME, or under ~/.cache without it.  The cache is
+    a pickle, so it is never kept anywhere other users can write to."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "sheets")
+
+
+def grammar_cache_path() -> str:
+    """Returns the file the loaded Earley grammar is cached in.  The name holds
+    a hash of formulas.lark and the lark and Python versions, so a changed
+    grammar or upgraded lark never picks up a stale cache."""
+    with open(GRAMMAR_PATH, "rb") as fp:
+        key = fp.read()
+    key += f"{lark.__version__} {sys.version_info[:2]}".encode()
+    digest = hashlib.sha256(key).hexdigest()[:16]
+    return os.path.join(grammar_cache_dir(), f"formulas_{digest}.pickle")
+
+
+def is_private(path: str) -> bool:
+    """Returns True if the file or directory is owned by the current user and
+    nobody else can write to it.  Raises an OSError if it can't be read."""
+    if not hasattr(os, "getuid"):
+        # Windows keeps the files under the user's profile to the user
+        return True
+    stat = os.stat(path)
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
+
+
+def load_earley_parser() -> lark.Lark:
+    """Builds the Earley parser, reusing the grammar cached by an earlier
+    process when there is one.  Reading formulas.lark is the slow half of
+    building the parser; the cache is only an optimization, so any problem
+    reading or writing it falls back to loading the grammar from scratch.
+
+    Unpickling runs code, so the cache is only read from and written to a
+    directory and file owned by the current user that nobody else can
+    write to."""
+    cache_path = grammar_cache_path()
+    cache_dir = os.path.dirname(cache_path)
+    try:
+        if is_private(cache_dir) and is_private(cache_path):
+            with open(cache_path, "rb") as fp:
+                return lark.Lark(pickle.load(fp), **EARLEY_OPTIONS)
+        logging.warning(
+            "Ignoring the grammar cache %s, which others can write to", cache_path
+        )
+    except FileNotFoundError:
+        pass
+    except (
+        OSError,
+        pickle.UnpicklingError,
+        EOFError,
+        AttributeError,
+        ImportError,
+        TypeError,
+        ValueError,
+    ) as e:
+        logging.warning("Ignoring the unreadable grammar cache %s: %r", cache_path, e)
+
+    earley_parser = lark.Lark.open(GRAMMAR_PATH, **EARLEY_OPTIONS)
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        if not is_private(cache_dir):
+            return earley_parser
+        # Written under a temporary name so other processes never read half
+        # a file
+        temp_path = f"{cache_path}.{os.getpid()}"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as fp:
+            pickle.dump(earley_parser.grammar, fp)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        pass
+    return earley_parser
+
+
+class FormulaParser:
+    """Parses formulas with the generated LALR(1) parser in formulas_lalr.py.
+    lark's Earley parser is only used as a fallback for any input the LALR
+    parser rejects, so parse errors are still reported as lark exceptions.
+
+    Neither parser is built until it is first needed, so importing sheets
+    stays cheap.  Most workbooks never need the Earley parser at all."""
+
+    def __init__(self):
+        self._lalr_parser = None
+        self._lalr_error = None
+        self._earley_parser = None
+        self._reconstructor = None
+
+    @property
+    def lalr_parser(self):
+        if self._lalr_parser is None:
+            from sheets import formulas_lalr
+
+            self._lalr_error = formulas_lalr.LarkError
+            self._lalr_parser = formulas_lalr.Lark_StandAlone(
+                transformer=LarkTreeBuilder()
+            )
+        return self._lalr_parser
+
+    @property
+    def earley_parser(self) -> lark.Lark:
+        if self._earley_parser is None:
+            self._earley_parser = load_earley_parser()
+        return self._earley_parser
+
+    @property
+    def reconstructor(self):
+        """The Reconstructor that turns parse trees back into formula text."""
+        if self._reconstructor is None:
+            self._reconstructor = Reconstructor(self.earley_parser)
+        return self._reconstructor
+
+    def parse(self, formula: str) -> lark.Tree:
+        lalr_parser = self.lalr_parser
+        try:
+            return lalr_parser.parse(formula)
+        except self._lalr_error:
+            return self.earley_parser.parse(formula)
+
+
+parser = FormulaParser()
@@ -0,0 +1,230 @@
+import collections
+import decimal
+import heapq
+from decimal import Decimal
+
+# Context the running totals are kept in.  Adding and subtracting is exact
+# until a total needs more digits than this, and then the aggregate is
+# dropped and rebuilt the next time it is needed.
+EXACT_CONTEXT = decimal.Context(prec=1000, traps=[decimal.Inexact, decimal.Overflow])
+
+
+class RangeAggregate:
+    """The sum, count, minimum and maximum of the numbers in a cell range,
+    kept up to date by applying the changes made to the range's cells rather
+    than by reading all of them again.
+
+    SUM, AVERAGE, MIN and MAX may only use an aggregate whose range holds
+    nothing but numbers and empty cells; anything else needs the conversions
+    and error handling of their regular path.  The number of other values is
+    kept too, so an aggregate stays usable once a range has held text.
+
+    The minimum and maximum are kept in heaps with lazy deletion.  They cost
+    memory proportional to the range, so they are only tracked once MIN or
+    MAX has asked for them."""
+
+    def __init__(self, sheet, seq: int, bounds: tuple, refs: list, values: list, track_extremes: bool):
+        """
+        args:
+            sheet: the Sheet the values were read from
+            seq: the sheet's change sequence number when they were read
+            bounds: the (top, left, bottom, right) of the range
+            refs: the references recorded for the range (see RangeRef.get_refs)
+            values: the values of the non-empty cells of the range
+            track_extremes: whether to keep the minimum and maximum
+        """
+        self.sheet = sheet
+        self.seq = seq
+        self.bounds = bounds
+        self.refs = refs
+        self.total = Decimal(0)
+        self.count = 0  # the number of Decimal values
+        self.others = 0  # the number of other non-empty values
+        self.exponents = collections.Counter()  # {exponent: number of values}
+        self.magnitudes = collections.Counter()  # {adjusted exponent: number of values}
+        self.counts = collections.Counter() if track_extremes else None  # {value: number of cells}
+        self.min_heap = []
+        self.max_heap = []
+        for value in values:
+            self.add(value)
+
+    def is_numeric(self) -> bool:
+        """Whether every non-empty cell of the range holds a number."""
+        return self.others == 0
+
+    def tracks_extremes(self) -> bool:
+        return self.counts is not None
+
+    def catch_up(self) -> bool:
+        """Applies the changes made to the sheet since the aggregate was last
+        brought up to date.  Returns False if that isn't possible, and the
+        aggregate has to be rebuilt."""
+        changes = self.sheet.get_changes_since(self.seq)
+        if changes is None:
+            return False
+        top, left, bottom, right = self.bounds
+        for _, row, col, old_value, new_value in changes:
+            if top <= row <= bottom and left <= col <= right:
+                self.remove(old_value)
+                self.add(new_value)
+        self.seq = self.sheet.get_change_seq()
+        return True
+
+    def add(self, value):
+        if value is None:
+            return
+        if type(value) is not Decimal:
+            self.others += 1
+            return
+        self.total = EXACT_CONTEXT.add(self.total, value)
+        self.count += 1
+        self.exponents[value.as_tuple().exponent] += 1
+        self.magnitudes[value.adjusted()] += 1
+        if self.counts is not None:
+            self.counts[value] += 1
+            heapq.heappush(self.min_heap, value)
+            heapq.heappush(self.max_heap, value.copy_negate())
+
+    def remove(self, value):
+        if value is None:
+            return
+        if type(value) is not Decimal:
+            self.others -= 1
+            return
+        self.total = EXACT_CONTEXT.subtract(self.total, value)
+        self.count -= 1
+        decrement(self.exponents, value.as_tuple().exponent)
+        decrement(self.magnitudes, value.adjusted())
+        if self.counts is not None:
+            decrement(self.counts, value)
+            # The heaps only drop removed values when they reach the top
+            if len(self.min_heap) > 2 * len(self.counts) + 64:
+                self.min_heap = list(self.counts)
+                self.max_heap = [value.copy_negate() for value in self.counts]
+                heapq.heapify(self.min_heap)
+                heapq.heapify(self.max_heap)
+
+    def get_min(self) -> Decimal:
+        while self.min_heap[0] not in self.counts:
+            heapq.heappop(self.min_heap)
+        return self.min_heap[0]
+
+    def get_max(self) -> Decimal:
+        while self.max_heap[0].copy_negate() not in self.counts:
+            heapq.heappop(self.max_heap)
+        return self.max_heap[0].copy_negate()
+
+    def get_min_exponent(self) -> int:
+        return min(self.exponents)
+
+    def get_max_magnitude(self) -> int:
+        return max(self.magnitudes)
+
+
+def sum_aggregates(aggregates: list):
+    """Returns the sum of the numbers in the aggregates, exactly as summing
+    them one at a time with sum() would, or None if that sum may have been
+    rounded along the way.
+
+    sum() starts from 0, so its result has the smallest exponent among 0 and
+    the numbers summed.  As long as no partial sum needs more digits than the
+    context's precision, no partial sum is rounded, whatever the order the
+    numbers are added in."""
+    exponent = min(0, min(aggregate.get_min_exponent() for aggregate in aggregates))
+    count = sum(aggregate.count for aggregate in aggregates)
+    magnitude = max(aggregate.get_max_magnitude() for aggregate in aggregates)
+    if magnitude + 1 + len(str(count)) - exponent > decimal.getcontext().prec:
+        return None
+    total = Decimal(0)
+    for aggregate in aggregates:
+        total = EXACT_CONTEXT.add(total, aggregate.total)
+    return total.quantize(Decimal(1).scaleb(exponent))
+
+
+def decrement(counter: collections.Counter, key):
+    counter[key] -= 1
+    if counter[key] == 0:
+        del counter[key]
+
+
+class RangeAggregateCache:
+    """A bounded LRU cache of RangeAggregates, shared by every formula in a
+    workbook.  Aggregates are keyed by their sheet and bounds, and catch up
+    with the changes to their sheet each time they are used (see
+    Sheet.get_changes_since)."""
+
+    DEFAULT_CAPACITY = 1000
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        """
+        args:
+            capacity: the maximum number of aggregates held in the cache
+        """
+        if capacity < 1:
+            raise ValueError("Range aggregate capacity must be at least 1")
+        self.capacity = capacity
+        self.entries = collections.OrderedDict()  # {(sheet name, bounds): RangeAggregate}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, cell_range, track_extremes: bool = False):
+        """Returns the up to date RangeAggregate of the range, or None if the
+        range isn't on a sheet or its total can't be kept exactly.  The cells
+        of the range are recorded as references of the formula being
+        evaluated, just as if they had been read."""
+        sheet = cell_range.get_sheet()
+        if sheet is None:
+            return None
+        bounds = (cell_range.top, cell_range.left, cell_range.bottom, cell_range.right)
+        key = (cell_range.sheet_name, bounds)
+
+        aggregate = self.entries.get(key)
+        try:
+            if (
+                aggregate is not None
+                and aggregate.sheet is sheet
+                and (aggregate.tracks_extremes() or not track_extremes)
+                and aggregate.catch_up()
+            ):
+                self.hits += 1
+                self.entries.move_to_end(key)
+                cell_range.evaluator.refs.update(aggregate.refs)
+                return aggregate
+
+            self.misses += 1
+            aggregate = RangeAggregate(
+                sheet,
+                sheet.get_change_seq(),
+                bounds,
+                cell_range.get_refs(),
+                cell_range.get_values(skip_empty=True),
+                track_extremes,
+            )
+        except (decimal.Inexact, decimal.Overflow):
+            self.entries.pop(key, None)
+            return None
+        self.entries[key] = aggregate
+        self.entries.move_to_end(key)
+        self._evict(self.capacity)
+        return aggregate
+
+    def clear(self):
+        """Empties the cache.  The counters are left untouched."""
+        self.entries.clear()
+
+    def get_stats(self) -> dict:
+        """Returns the hit/miss/eviction counters along with the current size
+        and capacity of the cache."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.entries),
+            "capacity": self.capacity,
+        }
+
+    def _evict(self, capacity: int):
+        while len(self.entries) > capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
@@ -0,0 +1,82 @@
+import collections
+
+
+def get_bucket(bounds: tuple) -> tuple:
+    """Returns the bucket a range is kept in.
+
+    A range is kept in the smallest aligned block of 2**k rows by 2**j
+    columns that holds all of it, so the block is found from its corners
+    alone, and every cell of the range is in that same block."""
+    top, left, bottom, right = bounds
+    row_level = (top ^ bottom).bit_length()
+    col_level = (left ^ right).bit_length()
+    return (row_level, col_level, top >> row_level, left >> col_level)
+
+
+class RangeIndex:
+    """The cell ranges referenced by formulas on one sheet, and the formulas
+    referencing each of them.
+
+    A range is one entry however many cells it covers, so =SUM(A1:A100000)
+    costs a single edge in the dependency graph rather than one per cell.
+    Which formulas depend on a cell is a stabbing query: the ranges holding
+    the cell can only be in the one block of each size holding the cell, so
+    only those blocks are searched."""
+
+    def __init__(self):
+        self.parents = {}  # {(top, left, bottom, right): {(sheet_name, location): None}}
+        self.buckets = {}  # {bucket (see get_bucket): {bounds: None}}
+        # The block sizes in use, so a query skips the sizes no range has
+        self.levels = collections.Counter()  # {(row level, col level): number of ranges}
+
+    def __len__(self) -> int:
+        return len(self.parents)
+
+    def add(self, bounds: tuple, parent: tuple):
+        """Records that the parent formula references the range with the
+        given (top, left, bottom, right) bounds."""
+        parents = self.parents.get(bounds)
+        if parents is None:
+            parents = self.parents[bounds] = {}
+            bucket = get_bucket(bounds)
+            self.buckets.setdefault(bucket, {})[bounds] = None
+            self.levels[bucket[:2]] += 1
+        parents[parent] = None
+
+    def remove(self, bounds: tuple, parent: tuple):
+        """Forgets that the parent formula references the range.  Does nothing
+        if it doesn't."""
+        parents = self.parents.get(bounds)
+        if parents is None:
+            return
+        parents.pop(parent, None)
+        if parents:
+            return
+        del self.parents[bounds]
+        bucket = get_bucket(bounds)
+        del self.buckets[bucket][bounds]
+        if not self.buckets[bucket]:
+            del self.buckets[bucket]
+        self.levels[bucket[:2]] -= 1
+        if not self.levels[bucket[:2]]:
+            del self.levels[bucket[:2]]
+
+    def find(self, row: int, col: int) -> dict:
+        """Returns the formulas referencing a range holding the cell at (row,
+        col), as the keys of a dict."""
+        found = {}
+        for row_level, col_level in self.levels:
+            bounds_in_block = self.buckets.get(
+                (row_level, col_level, row >> row_level, col >> col_level)
+            )
+            if bounds_in_block is None:
+                continue
+            for bounds in bounds_in_block:
+                top, left, bottom, right = bounds
+                if top <= row <= bottom and left <= col <= right:
+                    found.update(self.parents[bounds])
+        return found
+
+    def get_ranges(self):
+        """Returns the (bounds, {parent: None}) of every range in the index."""
+        return self.parents.items()
@@ -0,0 +1,236 @@
+from sheets.CellError import CellError
+from sheets.CellErrorType import CellErrorType
+from sheets.utils import (
+    check_valid_cell_location,
+    convert_idx_to_location,
+    get_hidden_name,
+)
+
+
+class RangeRef:
+    """A rectangular range of cells used as a value in a formula, such as the
+    A1:B10 in SUM(A1:B10).
+
+    A range only knows its sheet and bounds.  Nothing is read until a function
+    asks for the values it needs, and they are then read straight out of the
+    sheet's storage.  The cells read are recorded as a reference of the
+    formula being evaluated, as a single (sheet name, top, left, bottom,
+    right) range reference however many cells they are, which the workbook
+    turns into a single edge of its dependency graph (see RangeIndex).
+
+    Rows and columns are indexed from 0 relative to the top left corner."""
+
+    def __init__(self, evaluator, sheet_name: str, top: int, left: int, bottom: int, right: int):
+        """
+        args:
+            evaluator: the FormulaEvaluator evaluating the formula
+            sheet_name: the sheet of the range as written in the formula, or
+                        the sheet of the formula if the range has none
+            top, left, bottom, right: the (inclusive) bounds of the range,
+                        as 1-based row and column indexes
+        """
+        self.evaluator = evaluator
+        self.sheet_name = sheet_name
+        self.top = top
+        self.left = left
+        self.bottom = bottom
+        self.right = right
+
+    def get_num_rows(self) -> int:
+        return self.bottom - self.top + 1
+
+    def get_num_cols(self) -> int:
+        return self.right - self.left + 1
+
+    def get_resized(self, num_rows: int, num_cols: int):
+        """Returns the range of the given size with the same top left corner."""
+        return RangeRef(
+            self.evaluator,
+            self.sheet_name,
+            self.top,
+            self.left,
+            self.top + num_rows - 1,
+            self.left + num_cols - 1,
+        )
+
+    def get_sheet(self):
+        """Returns the Sheet the range is on, or None if there is no such
+        sheet."""
+        return self.evaluator.workbook.sheets.get(get_hidden_name(self.sheet_name))
+
+    def get_row(self, idx: int) -> list:
+        """Returns the values of a row of the range."""
+        return self._read(*self._get_row_bounds(idx))
+
+    def get_column(self, idx: int) -> list:
+        """Returns the values of a column of the range."""
+        return self._read(*self._get_column_bounds(idx))
+
+    def get_values(self, skip_empty: bool = False) -> list:
+        """Returns the values of the range row by row.  Empty cells are left
+        out if skip_empty is True, and are None otherwise."""
+        return self._read(range(self.top, self.bottom + 1), range(self.left, self.right + 1), skip_empty)
+
+    def iter_values(self, skip_empty: bool = False):
+        """Yields the values of the range row by row.  Each row is read, and
+        recorded as a reference, only once it is reached, so a function that
+        stops early never touches the rest of the range.
+
+        The one exception is a range holding the cell of the formula itself,
+        which is recorded whole before anything is read.  The formula is then
+        a circular reference however far it reads, just as it is when the
+        whole range is read, rather than depending on the values it meets
+        first and so on the order the cells were evaluated in."""
+        columns = [convert_idx_to_location(0, col)[:-1] for col in range(self.left, self.right + 1)]
+        sheet = self.get_sheet()
+        cells = sheet.get_sheet_cells() if sheet is not None else None
+        # Ranges may run past ZZZZ9999, but the cells out there don't exist
+        checked = not check_valid_cell_location(columns[-1] + str(self.bottom))
+
+        refs = self.evaluator.refs
+        ref = None
+        whole = self._holds_formula_cell()
+        if whole:
+            refs.update(self.get_refs())
+        for row in range(self.top, self.bottom + 1):
+            if not whole:
+                # The reference grows to cover the rows read so far
+                refs.discard(ref)
+                ref = self._get_range_ref(range(self.top, row + 1), range(self.left, self.right + 1))
+                refs.add(ref)
+            for column in columns:
+                location = column + str(row)
+                if sheet is None:
+                    value = self._get_missing_sheet_error()
+                elif checked:
+                    value = self._read_checked(sheet, [location], False)[0]
+                else:
+                    cell = cells.get(location)
+                    value = None if cell is None else cell.get_value()
+                if value is not None or not skip_empty:
+                    yield value
+
+    def get_row_refs(self, idx: int) -> list:
+        """Returns the references to the cells of a row of the range, in the
+        form recorded by the evaluator, without reading them."""
+        return [self._get_range_ref(*self._get_row_bounds(idx))]
+
+    def get_column_refs(self, idx: int) -> list:
+        """Returns the references to the cells of a column of the range, in
+        the form recorded by the evaluator, without reading them."""
+        return [self._get_range_ref(*self._get_column_bounds(idx))]
+
+    def get_refs(self) -> list:
+        """Returns the references to every cell of the range, in the form
+        recorded by the evaluator, without reading them."""
+        return [self._get_range_ref(range(self.top, self.bottom + 1), range(self.left, self.right + 1))]
+
+    def get_aggregate(self, track_extremes: bool = False):
+        """Returns the workbook's up to date RangeAggregate of the range, or
+        None if there can't be one."""
+        return self.evaluator.workbook.range_aggregates.get(self, track_extremes)
+
+    def find_in_row(self, key):
+        """Returns the column index of the first cell in the top row of the
+        range equal to key, or None if there is none.  If the row holds an
+        error, the highest precedence one is returned instead."""
+        return self.evaluator.workbook.lookup_indexes.find(self, key, by_row=True)
+
+    def find_in_column(self, key):
+        """Returns the row index of the first cell in the left column of the
+        range equal to key, or None if there is none.  If the column holds an
+        error, the highest precedence one is returned instead."""
+        return self.evaluator.workbook.lookup_indexes.find(self, key, by_row=False)
+
+    def match_criterion(self, criterion):
+        """Returns the set of positions of the cells of the range meeting the
+        criterion of SUMIF, COUNTIF and the like (see parse_criterion), or the
+        criterion if it is an error."""
+        return self.evaluator.workbook.criteria_indexes.match(self, criterion)
+
+    def get_values_at(self, positions) -> list:
+        """Returns the values of the cells at the given positions, in order.
+        The cells are numbered from 0 row by row, so each position stands for
+        the same cell in ranges of the same size.  The whole range is recorded
+        as a reference, so that the reference stays a single edge however
+        many cells are read."""
+        num_cols = self.get_num_cols()
+        locations = [
+            convert_idx_to_location(self.top + position // num_cols, self.left + position % num_cols)
+            for position in sorted(positions)
+        ]
+        self.evaluator.refs.update(self.get_refs())
+
+        sheet = self.get_sheet()
+        if sheet is None:
+            return [self._get_missing_sheet_error()] * len(locations)
+        return self._read_checked(sheet, locations, False)
+
+    def _get_row_bounds(self, idx: int):
+        return range(self.top + idx, self.top + idx + 1), range(self.left, self.right + 1)
+
+    def _get_column_bounds(self, idx: int):
+        return range(self.top, self.bottom + 1), range(self.left + idx, self.left + idx + 1)
+
+    def _get_locations(self, rows: range, cols: range) -> list:
+        columns = [convert_idx_to_location(0, col)[:-1] for col in cols]
+        return [column + str(row) for row in rows for column in columns]
+
+    def _holds_formula_cell(self) -> bool:
+        evaluator = self.evaluator
+        if evaluator.row is None or evaluator.sheet_name is None:
+            return False
+        return (
+            get_hidden_name(self.sheet_name) == get_hidden_name(evaluator.sheet_name)
+            and self.top <= evaluator.row <= self.bottom
+            and self.left <= evaluator.col <= self.right
+        )
+
+    def _get_range_ref(self, rows: range, cols: range) -> tuple:
+        return (str(self.sheet_name), rows.start, cols.start, rows.stop - 1, cols.stop - 1)
+
+    def _read(self, rows: range, cols: range, skip_empty: bool = False) -> list:
+        locations = self._get_locations(rows, cols)
+        self.evaluator.refs.add(self._get_range_ref(rows, cols))
+
+        sheet = self.get_sheet()
+        if sheet is None:
+            return [self._get_missing_sheet_error()] * len(locations)
+
+        # Ranges may run past ZZZZ9999, but the cells out there don't exist
+        if not check_valid_cell_location(locations[-1]):
+            return self._read_checked(sheet, locations, skip_empty)
+
+        values = [
+            None if cell is None else cell.get_value()
+            for cell in map(sheet.get_sheet_cells().get, locations)
+        ]
+        if skip_empty:
+            return [value for value in values if value is not None]
+        return values
+
+    def _get_missing_sheet_error(self) -> CellError:
+        return CellError(
+            CellErrorType.BAD_REFERENCE,
+            "During parsing a sheet was given that was not found in the workbook.",
+            KeyError(f"{self.sheet_name} was not found in the Workbook."),
+        )
+
+    def _read_checked(self, sheet, locations: list, skip_empty: bool) -> list:
+        cells = sheet.get_sheet_cells()
+        values = []
+        for location in locations:
+            if not check_valid_cell_location(location):
+                values.append(
+                    CellError(
+                        CellErrorType.BAD_REFERENCE,
+                        "During parsing an invalid cell location was discovered.",
+                        ValueError(f"{location} is not a valid cell location."),
+                    )
+                )
+                continue
+            cell = cells.get(location)
+            value = cell.get_value() if cell is not None else None
+            if value is not None or not skip_empty:
+                values.append(value)
+        return values
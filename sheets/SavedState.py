@@ -0,0 +1,53 @@
+import hashlib
+import json
+from sheets.CellError import CellError
+from sheets.CellErrorType import CellErrorType
+from sheets.Numeric import is_number
+
+# Bumped whenever the saved state, or the way formulas evaluate, changes, so
+# that state saved by another version is recomputed rather than trusted
+STATE_VERSION = 1
+
+
+def get_content_hash(sheets: list) -> str:
+    """Returns the hash of the "sheets" of a saved workbook, which the saved
+    state is only trusted for."""
+    text = json.dumps(sheets, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def encode_value(value):
+    """Returns the JSON form of the value of a formula.  Strings, booleans and
+    None are kept as they are, and numbers and errors are tagged lists, so a
+    number is never mistaken for a string."""
+    if is_number(value):
+        return ["number", str(value)]
+    if isinstance(value, CellError):
+        return ["error", value.get_type().value, value.get_detail()]
+    return value
+
+
+def decode_value(encoded, numeric):
+    """Returns the value encode_value encoded, with numbers in the given
+    numeric backend's type.  Raises a ValueError if it isn't a value."""
+    if isinstance(encoded, list):
+        if len(encoded) == 2 and encoded[0] == "number":
+            return numeric.literal(encoded[1])
+        if len(encoded) == 3 and encoded[0] == "error":
+            return CellError(CellErrorType(encoded[1]), encoded[2])
+        raise ValueError(f"{encoded} is not a saved value")
+    if encoded is None or isinstance(encoded, (str, bool)):
+        return encoded
+    raise ValueError(f"{encoded} is not a saved value")
+
+
+def encode_refs(refs) -> list:
+    """Returns the JSON form of the references a formula recorded when it was
+    evaluated: "sheet!location" strings for cells, and lists for the
+    (sheet, top, left, bottom, right) tuples of ranges."""
+    return sorted((list(ref) if isinstance(ref, tuple) else ref for ref in refs), key=str)
+
+
+def decode_refs(encoded: list) -> set:
+    """Returns the references encode_refs encoded."""
+    return {tuple(ref) if isinstance(ref, list) else ref for ref in encoded}
@@ -1,7 +1,9 @@
 from typing import Tuple, Optional, Any
 from sheets.utils import convert_location_to_idx
 from sheets.Cell import Cell
+from sheets.Numeric import DECIMAL_BACKEND
 
+import collections
 import heapq
 
 
@@ -22,8 +24,12 @@ class cell_location_obj:
 
 
 class Sheet:
-    def __init__(self, sheet_name) -> None:
-        """Initialize a new Sheet object."""
+    # The number of changes kept in the change log
+    CHANGE_LOG_LENGTH = 10000
+
+    def __init__(self, sheet_name, numeric=DECIMAL_BACKEND) -> None:
+        """Initialize a new Sheet object.  Its cells hold numbers in the
+        given numeric backend (see sheets.Numeric)."""
         #
         # The sheet name must be unique within the workbook.  The sheet name
         # match is case-insensitive; the text must match but the case does not
@@ -38,9 +44,22 @@ class Sheet:
 
         self.extent = (0, 0)
         self.sheet_name = sheet_name
+        self.numeric = numeric
 
         self.data = {}  # String ("A1"): Cell
 
+        # Bumped whenever a cell in the row (or column) is added, removed or
+        # changes value, so caches built from a row or column can tell
+        # whether they are out of date.
+        self.row_epochs = collections.defaultdict(int)  # {row index: epoch}
+        self.col_epochs = collections.defaultdict(int)  # {col index: epoch}
+
+        # The most recent changes to cell values, oldest first, so caches
+        # built from a range of cells can be brought up to date by applying
+        # the changes made since they were built.
+        self.change_seq = 0  # the sequence number of the latest change
+        self.change_log = collections.deque(maxlen=self.CHANGE_LOG_LENGTH)  # (seq, row, col, old value, new value)
+
     def get_extent(self) -> Tuple[int, int]:
         """Return a tuple (num-cols, num-rows) indicating the current extent of
         the specified spreadsheet."""
@@ -54,6 +73,38 @@ class Sheet:
     def get_sheet_name(self):
         return self.sheet_name
 
+    def get_row_epoch(self, row: int) -> int:
+        return self.row_epochs[row]
+
+    def get_col_epoch(self, col: int) -> int:
+        return self.col_epochs[col]
+
+    def get_change_seq(self) -> int:
+        return self.change_seq
+
+    def get_changes_since(self, seq: int):
+        """Returns the (seq, row, col, old value, new value) of every change
+        made after the change numbered seq, oldest first, or None if some of
+        them have already dropped out of the change log."""
+        if seq == self.change_seq:
+            return []
+        if not self.change_log or self.change_log[0][0] > seq + 1:
+            return None
+        changes = []
+        for change in reversed(self.change_log):
+            if change[0] <= seq:
+                break
+            changes.append(change)
+        changes.reverse()
+        return changes
+
+    def _mark_changed(self, location: str, old_value: Any, new_value: Any) -> None:
+        row, col = convert_location_to_idx(location)
+        self.row_epochs[row] += 1
+        self.col_epochs[col] += 1
+        self.change_seq += 1
+        self.change_log.append((self.change_seq, row, col, old_value, new_value))
+
     def get_sheet_cells(self):
         return self.data
 
@@ -63,10 +114,11 @@ class Sheet:
         """Return a tuple (num-cols, num-rows) indicating the current extent of
         the specified spreadsheet."""
         row, col = convert_location_to_idx(location)
+        old_value = self.get_cell_value(location)
         if location not in self.data and (
             contents is not None and contents.strip() != ""
         ):
-            self.data[location] = Cell(sheet_name + "!" + location, contents)
+            self.data[location] = Cell(sheet_name + "!" + location, contents, self.numeric)
             heapq.heappush(self.row_heap, -row)
             heapq.heappush(self.col_heap, -col)
         elif location not in self.data and (contents is None or contents.strip() == ""):
@@ -78,6 +130,22 @@ class Sheet:
                 del self.data[location]
             else:
                 self.data[location].set_contents(contents.strip())
+        self._mark_changed(location, old_value, self.get_cell_value(location))
+        self.update_extent()
+
+    def set_cell_template(
+        self, sheet_name, location: str, template, contents: Optional[str] = None
+    ) -> None:
+        """Puts a formula template into the cell at the specified location,
+        creating the cell if it is empty."""
+        old_value = self.get_cell_value(location)
+        if location not in self.data:
+            row, col = convert_location_to_idx(location)
+            self.data[location] = Cell(sheet_name + "!" + location, None, self.numeric)
+            heapq.heappush(self.row_heap, -row)
+            heapq.heappush(self.col_heap, -col)
+        self.data[location].set_formula_template(template, contents)
+        self._mark_changed(location, old_value, self.get_cell_value(location))
         self.update_extent()
 
     def drop_in_cell(self, location: str, cell: Cell) -> None:
@@ -87,6 +155,7 @@ class Sheet:
             self.data[location] = cell
             heapq.heappush(self.row_heap, -row)
             heapq.heappush(self.col_heap, -col)
+            self._mark_changed(location, None, cell.get_value())
 
         self.extent = (-self.col_heap[0], -self.row_heap[0])
 
@@ -105,7 +174,11 @@ class Sheet:
         """Get the value of the cell at the specified location."""
         cell = self.data.get(location, None)
         if cell:
-            cell.set_cell_value(cell.get_contents(), formula_value=formula_value)
+            old_value = cell.get_value()
+            cell.update_value(formula_value)
+            new_value = cell.get_value()
+            if type(old_value) is not type(new_value) or old_value != new_value:
+                self._mark_changed(location, old_value, new_value)
 
     # min/ max heap for popping and popping off the heap for the new extent
     def _shrink_sheet(self, row, col):
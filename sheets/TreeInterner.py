@@ -0,0 +1,126 @@
+import sys
+import weakref
+import lark
+
+
+def node_size(node) -> int:
+    """Returns the bytes held by a single tree node or token, not counting
+    its children."""
+    if isinstance(node, lark.Tree):
+        return sys.getsizeof(node) + sys.getsizeof(node.children)
+    return sys.getsizeof(node) + sys.getsizeof(node.value)
+
+
+class TreeInterner:
+    """Hash-conses formula template trees, so that every structurally
+    identical subtree in a workbook is stored once.
+
+    Templates are already shared by every cell holding the same formula
+    (after relative references are turned into offsets), but different
+    formulas still repeat subexpressions such as R[-1]C, SUM($A$1:$A$10) or
+    the constant 1.05 thousands of times.  Interning a template rebuilds it
+    bottom up out of the shared copies of its subtrees and tokens.
+
+    Trees are only held weakly and disappear once no template uses them.
+    Tokens can't be weakly referenced, so the token table is swept of the
+    tokens no interned tree still holds whenever it has doubled in size.
+
+    Interned trees are shared and must never be mutated."""
+
+    SWEEP_THRESHOLD = 1024
+
+    def __init__(self):
+        # Children are already interned when a tree is, so a tree is keyed by
+        # the identity of its children rather than by hashing the whole
+        # subtree again.  The ids stay valid for as long as the entry exists,
+        # since the interned tree holds its children.
+        self.trees = weakref.WeakValueDictionary()  # {(data, child ids): Tree}
+        self.tokens = {}  # {(type, value): Token}
+        self.sweep_at = self.SWEEP_THRESHOLD
+
+    def intern(self, tree: lark.Tree) -> lark.Tree:
+        """Returns the shared copy of the tree."""
+        children = [
+            self.intern(child)
+            if isinstance(child, lark.Tree)
+            else self.intern_token(child)
+            for child in tree.children
+        ]
+        key = (tree.data, tuple(id(child) for child in children))
+        shared = self.trees.get(key)
+        if shared is None:
+            shared = lark.Tree(tree.data, children)
+            self.trees[key] = shared
+        return shared
+
+    def intern_token(self, token: lark.Token) -> lark.Token:
+        """Returns the shared copy of the token."""
+        key = (token.type, str(token))
+        shared = self.tokens.get(key)
+        if shared is None:
+            if len(self.tokens) >= self.sweep_at:
+                self._sweep_tokens()
+            shared = self.tokens[key] = token
+        return shared
+
+    def clear(self):
+        """Forgets every interned tree and token.  Trees already handed out
+        stay valid; they just won't be shared with trees interned later."""
+        self.trees = weakref.WeakValueDictionary()
+        self.tokens = {}
+        self.sweep_at = self.SWEEP_THRESHOLD
+
+    def get_memory_report(self, roots) -> dict:
+        """Compares the memory held by the given interned trees with what the
+        same trees would hold if none of their subtrees were shared.
+
+        args:
+            roots: the interned trees to report on
+        returns:
+            a dict with the number of trees, the number of distinct nodes and
+            tokens they are built from, the number they would hold unshared,
+            and the corresponding sizes in bytes along with the bytes saved."""
+        unique = {}  # {id(node): node}
+        expanded = {}  # {id(node): (nodes, bytes) of the unshared subtree}
+
+        def visit(node):
+            if id(node) in expanded:
+                return expanded[id(node)]
+            unique[id(node)] = node
+            nodes, size = 1, node_size(node)
+            if isinstance(node, lark.Tree):
+                for child in node.children:
+                    child_nodes, child_size = visit(child)
+                    nodes += child_nodes
+                    size += child_size
+            expanded[id(node)] = (nodes, size)
+            return nodes, size
+
+        unshared_nodes = unshared_bytes = 0
+        roots = list(roots)
+        for root in roots:
+            nodes, size = visit(root)
+            unshared_nodes += nodes
+            unshared_bytes += size
+        shared_bytes = sum(node_size(node) for node in unique.values())
+        return {
+            "trees": len(roots),
+            "nodes": len(unique),
+            "unshared_nodes": unshared_nodes,
+            "bytes": shared_bytes,
+            "unshared_bytes": unshared_bytes,
+            "bytes_saved": unshared_bytes - shared_bytes,
+        }
+
+    def _sweep_tokens(self):
+        live = set()
+        for tree in list(self.trees.values()):
+            live.update(
+                id(child)
+                for child in tree.children
+                if not isinstance(child, lark.Tree)
+            )
+        self.tokens = {
+            key: token for key, token in self.tokens.items() if id(token) in live
+        }
+        self.sweep_at = max(self.SWEEP_THRESHOLD, 2 * len(self.tokens))
@@ -3,7 +3,6 @@ from sheets.utils import (
     check_new_name,
     get_hidden_name,
     check_valid_cell_location,
-    is_formula,
     convert_location_to_idx,
     convert_idx_to_location,
 )
@@ -12,18 +11,38 @@ from sheets.Cell import Cell
 from sheets.Parser import FormulaEvaluator, parser
 from sheets.CellError import CellError
 from sheets.CellErrorType import CellErrorType
-from sheets.Parser import FormulaFixer, MoveFormula
+from sheets.Parser import FormulaFixer
 from sheets.Graph import Graph
+from sheets.RangeIndex import RangeIndex
+from sheets.ParseCache import ParseCache
+from sheets.LookupIndex import LookupIndexCache
+from sheets.CriteriaIndex import CriteriaIndexCache
+from sheets.RangeAggregate import RangeAggregateCache
+from sheets.Compiler import FormulaCompiler
 from sheets.Row import Row
+from sheets.RangeRef import RangeRef
 from sheets.Functions import function_directory
+from sheets.FunctionRegistry import FunctionResultCache
+from sheets.Numeric import get_numeric_backend
+from sheets.SavedState import (
+    STATE_VERSION,
+    get_content_hash,
+    encode_value,
+    decode_value,
+    encode_refs,
+    decode_refs,
+)
 import logging
 import copy
+import contextlib
 
 import collections
 import lark
-from lark.reconstruct import Reconstructor
 import json
-from decimal import Decimal
+
+
+def is_circular_reference(value) -> bool:
+    return isinstance(value, CellError) and value.get_type() == CellErrorType.CIRCULAR_REFERENCE
 
 
 def notify_cell_changes(function: object) -> object:
@@ -54,8 +73,14 @@ class Workbook:
     # Any and all operations on a workbook that may affect calculated cell
     # values should cause the workbook's contents to be updated properly.
 
-    def __init__(self):
-        """Initialize a new empty workbook."""
+    def __init__(self, numeric_mode: str = "decimal"):
+        """Initialize a new empty workbook.
+
+        numeric_mode selects how numbers are represented: "decimal" (exact
+        Decimals, the default), "float" (binary floats, faster but inexact)
+        or "hybrid" (ints for whole numbers, Decimals otherwise).  A
+        ValueError is raised for any other mode."""
+        self.numeric = get_numeric_backend(numeric_mode)
         # self.num_sheets = 0
         self.sheets = (
             collections.OrderedDict()
@@ -70,14 +95,31 @@ class Workbook:
         self.json = None
 
         self.graph = Graph()
+        # The cells to recompute once the current batch of changes is done,
+        # or None when changes are recomputed as they are made
+        self.deferred_cells = None
         self.formula_functions = function_directory
 
+        # Parse trees shared by every cell with the same formula text
+        self.parse_cache = ParseCache(
+            parser, compiler=FormulaCompiler(self.formula_functions, self.numeric)
+        )
+        # Key columns and rows indexed for VLOOKUP and HLOOKUP
+        self.lookup_indexes = LookupIndexCache()
+        # Sums, counts and extremes of the ranges SUM, MIN, MAX and AVERAGE use
+        self.range_aggregates = RangeAggregateCache()
+        # Columns indexed for SUMIF, COUNTIF and the like
+        self.criteria_indexes = CriteriaIndexCache()
+        # Results of the memoized function calls (see FunctionInfo)
+        self.function_results = FunctionResultCache()
+
     @staticmethod
-    def load_workbook(fp):
+    def load_workbook(fp, numeric_mode: str = "decimal"):
         """This is a static method (not an instance method) to load a workbook
         from a text file or file-like object in JSON format, and return the
         new Workbook instance.  Note that the _caller_ of this function is
         expected to have opened the file; this function merely reads the file.
+        The new workbook uses the given numeric mode (see __init__).
 
         If the contents of the input cannot be parsed by the Python json
         module then a json.JSONDecodeError should be raised by the method.
@@ -91,7 +133,12 @@ class Workbook:
 
         If any expected value in the input JSON is not of the proper type
         (e.g. an object instead of a list, or a number instead of a string),
-        raise a TypeError with a suitably descriptive message."""
+        raise a TypeError with a suitably descriptive message.
+
+        If the input also has the "state" save_workbook(fp, include_state=True)
+        writes, and it was saved for these exact contents in the same numeric
+        mode, the formulas take the values and references it holds instead of
+        being evaluated.  Otherwise the state is ignored."""
 
         ## CLEAN UP. No need to catch the exceptions just to reraise them
 
@@ -106,7 +153,8 @@ class Workbook:
         if not isinstance(sheets, list):
             raise TypeError("Sheets is not a list")
 
-        wb = Workbook()
+        wb = Workbook(numeric_mode)
+        loaded_cells = []
 
         # need for stuff to get updated
         for sheet in sheets:
@@ -131,14 +179,28 @@ class Workbook:
 
             # may be a problem?
             wb.new_sheet(sheet_name)
+            hidden_name = get_hidden_name(sheet_name)
             for loc in cell_contents:
                 if not isinstance(loc, str):
                     raise TypeError("Cell location is not a string")
                 if not isinstance(cell_contents[loc], str):
                     raise TypeError("Cell value is not a string")
-                wb.set_cell_contents(sheet_name, loc, cell_contents[loc])
+                location = loc.lower()
+                if not check_valid_cell_location(location):
+                    raise ValueError(f"{location} is not a valid cell location.")
+                # Formulas are evaluated once every cell has been loaded
+                wb.sheets[hidden_name].set_cell_contents(
+                    hidden_name, location, cell_contents[loc].strip()
+                )
+                loaded_cells.append((hidden_name, location))
+
+        if not wb._load_state(workbook.get("state"), sheets):
+            wb.recompute_cells(loaded_cells)
+        # Nobody can have registered for notifications on the new workbook yet
+        wb.cells_changed = {}
         return wb
 
+    @notify_cell_changes
     def sort_region(self, sheet_name: str, start_location: str, end_location: str, sort_cols: List[int]):
         # Sort the specified region of a spreadsheet with a stable sort, using
         # the specified columns for the comparison.
@@ -232,40 +294,25 @@ class Workbook:
             adapter_objs.append(adapter_obj)
         adapter_objs.sort()
 
+        # Formula templates are relative to the cell holding them, so moving a
+        # row's templates to the row's new position updates their references.
         cell_contents_to_copy = []
         for i in range(len(adapter_objs)):
             adapter_obj = adapter_objs[i]
-            new_row = top_row + i
             old_row = adapter_obj.get_og_row()
             col_cells = []
             for col in range(left_col, right_col + 1):
-                curr_loc = convert_idx_to_location(new_row, col)
                 old_loc = convert_idx_to_location(old_row, col)
-                col_cells.append(self.get_cell_contents(sheet_name, old_loc))
-            # the last value of the list will just contain the delta shift
-            col_cells.append(new_row-old_row)
+                col_cells.append(self._copy_cell_source(sheet_name, old_loc))
             cell_contents_to_copy.append(col_cells)
 
-        recon = Reconstructor(parser)
-        for row in range(len(cell_contents_to_copy)):
-            # minus one since have the delta row at the end
-            delta_row = cell_contents_to_copy[row][len(cell_contents_to_copy[0]) - 1]
-            for col in range(len(cell_contents_to_copy[0]) - 1):
-                new_loc = convert_idx_to_location(top_row + row, left_col + col)
-                contents = cell_contents_to_copy[row][col]
-                contents = contents.lstrip().rstrip() if contents else contents
-                if contents and contents[0] == "=":
-                    parsed_formula = parser.parse(contents)
-                    mf = MoveFormula(delta_row, 0)
-                    moved_formula = mf.transform(parsed_formula)
-                    fixed_formula = recon.reconstruct(
-                        moved_formula, insert_spaces=False
+        with self._batch_recompute():
+            for row in range(len(cell_contents_to_copy)):
+                for col in range(len(cell_contents_to_copy[0])):
+                    new_loc = convert_idx_to_location(top_row + row, left_col + col)
+                    self._paste_cell_source(
+                        sheet_name, new_loc, cell_contents_to_copy[row][col]
                     )
-                    self.set_cell_contents(sheet_name, new_loc, "=" + fixed_formula)
-                elif contents:
-                    self.set_cell_contents(sheet_name, new_loc, contents)
-                else:
-                    self.set_cell_contents(sheet_name, new_loc, None)
 
     
     def transfer_cells(
@@ -307,9 +354,6 @@ class Workbook:
         left_col = min(start_col, end_col)
         right_col = max(start_col, end_col)
 
-        shift_row = move_row - top_row
-        shift_col = move_col - left_col
-
         extent_row = move_row + (bottom_row - top_row)
         extent_col = move_col + (right_col - left_col)
         extent_loc = convert_idx_to_location(extent_row, extent_col)
@@ -322,35 +366,28 @@ class Workbook:
         # MAY NOT WORK WITH DEPENDENCIES GRAPH
         # Test with None values
 
-        cell_contents_to_copy = []
-        for row in range(top_row, bottom_row + 1):
-            col_cells = []
-            for col in range(left_col, right_col + 1):
-                curr_loc = convert_idx_to_location(row, col)
-                col_cells.append(self.get_cell_contents(sheet_name, curr_loc))
-                if not isCopy:
-                    self.set_cell_contents(sheet_name, curr_loc, None)
-            cell_contents_to_copy.append(col_cells)
-
-        recon = Reconstructor(parser)
-        for row in range(len(cell_contents_to_copy)):
-            for col in range(len(cell_contents_to_copy[0])):
-                new_loc = convert_idx_to_location(row + move_row, col + move_col)
-                contents = cell_contents_to_copy[row][col]
-                contents = contents.lstrip().rstrip() if contents else contents
-                if contents and contents[0] == "=":
-                    parsed_formula = parser.parse(contents)
-                    mf = MoveFormula(shift_row, shift_col)
-                    moved_formula = mf.transform(parsed_formula)
-                    fixed_formula = recon.reconstruct(
-                        moved_formula, insert_spaces=False
+        # Formula templates are relative to the cell holding them, so the
+        # copies share the source cells' templates and are never reparsed.
+        # The cells are recomputed once everything has been moved
+        with self._batch_recompute():
+            cell_contents_to_copy = []
+            for row in range(top_row, bottom_row + 1):
+                col_cells = []
+                for col in range(left_col, right_col + 1):
+                    curr_loc = convert_idx_to_location(row, col)
+                    col_cells.append(self._copy_cell_source(sheet_name, curr_loc))
+                    if not isCopy:
+                        self.set_cell_contents(sheet_name, curr_loc, None)
+                cell_contents_to_copy.append(col_cells)
+
+            for row in range(len(cell_contents_to_copy)):
+                for col in range(len(cell_contents_to_copy[0])):
+                    new_loc = convert_idx_to_location(row + move_row, col + move_col)
+                    self._paste_cell_source(
+                        to_sheet, new_loc, cell_contents_to_copy[row][col]
                     )
-                    self.set_cell_contents(to_sheet, new_loc, "=" + fixed_formula)
-                elif contents:
-                    self.set_cell_contents(to_sheet, new_loc, contents)
-                else:
-                    self.set_cell_contents(to_sheet, new_loc, None)
 
+    @notify_cell_changes
     def move_cells(
         self,
         sheet_name: str,
@@ -403,6 +440,7 @@ class Workbook:
             sheet_name, start_location, end_location, to_location, to_sheet, False
         )
 
+    @notify_cell_changes
     def copy_cells(
         self,
         sheet_name: str,
@@ -455,12 +493,15 @@ class Workbook:
             sheet_name, start_location, end_location, to_location, to_sheet, True
         )
 
-    def save_workbook(self, fp):
+    def save_workbook(self, fp, include_state: bool = False):
         """Instance method (not a static/class method) to save a workbook to a
         text file or file-like object in JSON format.  Note that the _caller_
         of this function is expected to have opened the file; this function
         merely writes the file.
 
+        With include_state, the value and references of every formula are
+        saved too (see _get_state), so load_workbook can skip evaluating them.
+
         If an IO write error occurs (unlikely but possible), let any raised
         exception propagate through."""
 
@@ -479,6 +520,8 @@ class Workbook:
             # what to do if there are no cell contents
             sheet_dict["cell-contents"] = cell_dict
             workbook_dict["sheets"].append(sheet_dict)
+        if include_state:
+            workbook_dict["state"] = self._get_state(workbook_dict["sheets"])
 
         try:
             workbook_json = json.dumps(workbook_dict)
@@ -487,6 +530,77 @@ class Workbook:
         except TypeError as t:
             raise t("Unable to convert to JSON")
 
+    def _get_state(self, saved_sheets: list) -> dict:
+        """Returns the computed state of the workbook, to save along with the
+        given saved sheets: the value of every formula and the cells and
+        ranges it referenced when it was evaluated, which are its edges in
+        the dependency graph.  The formulas are listed in the graph's
+        topological order, so loading them adds each edge in order."""
+        formulas = []
+        for index, (hidden_name, sheet) in enumerate(self.sheets.items()):
+            for location, cell in sheet.get_sheet_cells().items():
+                if cell.is_formula():
+                    formulas.append((index, hidden_name, location, cell))
+        formulas.sort(key=lambda formula: self._get_cell_order_key(formula[1], formula[2]))
+        return {
+            "version": STATE_VERSION,
+            "numeric-mode": self.numeric.name,
+            "hash": get_content_hash(saved_sheets),
+            # [sheet index, location, value, references]
+            "formulas": [
+                [index, location, encode_value(cell.get_value()), encode_refs(cell.get_children())]
+                for index, _, location, cell in formulas
+            ],
+        }
+
+    def _get_cell_order_key(self, hidden_name: str, location: str) -> float:
+        # Cells without a position have no cell edges, so come first
+        position = self.graph.get_order(hidden_name, location)
+        return float("-inf") if position is None else position
+
+    def _load_state(self, state, saved_sheets: list) -> bool:
+        """Gives the formulas of a just loaded workbook the values and
+        references in the state _get_state returned, and builds the
+        dependency graph from the references.  Returns False, leaving the
+        workbook alone, if there is no state or it wasn't saved for these
+        sheets in this numeric mode, or it doesn't cover every formula."""
+        if not isinstance(state, dict):
+            return False
+        if (
+            state.get("version") != STATE_VERSION
+            or state.get("numeric-mode") != self.numeric.name
+            or state.get("hash") != get_content_hash(saved_sheets)
+        ):
+            return False
+
+        hidden_names = list(self.sheets)
+        loaded = {}
+        try:
+            for index, location, value, refs in state["formulas"]:
+                loaded[(hidden_names[index], location)] = (
+                    decode_value(value, self.numeric),
+                    decode_refs(refs),
+                )
+        except (KeyError, TypeError, ValueError, IndexError):
+            return False
+        formula_count = sum(
+            cell.is_formula()
+            for sheet in self.sheets.values()
+            for cell in sheet.get_sheet_cells().values()
+        )
+        if len(loaded) != formula_count or not all(
+            self.sheets[hidden_name].get_cell(location) is not None
+            and self.sheets[hidden_name].get_cell(location).is_formula()
+            for hidden_name, location in loaded
+        ):
+            return False
+
+        for (hidden_name, location), (value, refs) in loaded.items():
+            self.sheets[hidden_name].set_cell_value(location, value)
+            self.sheets[hidden_name].get_cell(location).set_children(refs)
+            self.add_children_cells(hidden_name, location, refs)
+        return True
+
     def num_sheets(self) -> int:
         """Return the number of spreadsheets in the workbook."""
         return len(self.sheets.keys())  # DON'T need keys() here
@@ -526,17 +640,14 @@ class Workbook:
         sheet = self.sheets[get_hidden_name(hidden_name)]
         return sheet.get_sheet_name()
 
-    def get_formula_value(self, hidden_name: str, cell: Cell, force_recompute: bool):
+    def get_formula_value(self, hidden_name: str, location: str, cell: Cell):
         """Computes the value of the formula in the given cell.
         And also returns the cells referenced in the computation of the formula."""
-        formula_evaluator = FormulaEvaluator(self, hidden_name, self.formula_functions)
+        formula_evaluator = FormulaEvaluator(
+            self, hidden_name, self.formula_functions, location
+        )
         try:
-            if not cell.get_cached_formula() or force_recompute:
-                parsed_formula = parser.parse(cell.get_contents())
-                cell.cache_formula(parsed_formula)
-            else:
-                parsed_formula = cell.get_cached_formula()
-
+            template = self.get_formula_template(location, cell)
         except lark.exceptions.LarkError as E:
             formula_value = CellError(
                 CellErrorType.PARSE_ERROR,
@@ -545,11 +656,16 @@ class Workbook:
             )
             cell_refs = set({})
         else:
-            formula_value = formula_evaluator.visit(parsed_formula)
+            formula_value = template.compiled.evaluate(formula_evaluator)
             cell_refs = formula_evaluator.get_cell_refs()
 
         if formula_value is None:
-            formula_value = Decimal(0)
+            formula_value = self.numeric.to_number(None)
+        elif isinstance(formula_value, RangeRef):
+            formula_value = CellError(
+                CellErrorType.TYPE_ERROR,
+                f"The formula {cell.get_contents()} evaluates to a cell range, not a value.",
+            )
         if cell_refs is None:
             cell_refs = set({})
 
@@ -557,6 +673,62 @@ class Workbook:
 
         return formula_value, cell_refs
 
+    def get_formula_template(self, location: str, cell: Cell):
+        """Returns the formula template of the given cell, parsing its contents
+        if it doesn't have one yet.  Raises a lark.exceptions.LarkError if the
+        formula is invalid."""
+        template = cell.get_formula_template()
+        if template is None:
+            row, col = convert_location_to_idx(location)
+            template = self.parse_cache.get_template(cell.get_contents(), row, col)
+            cell.set_formula_template(template, cell.get_contents(), keep_value=True)
+        return template
+
+    def get_static_refs(self, hidden_name: str, location: str, cell: Cell):
+        """Returns the (hidden sheet name, location) of every cell and the
+        (hidden sheet name, bounds) of every range the formula in the given
+        cell may reference, as two sets found without evaluating it.  Returns
+        None if the formula's references can only be found by evaluating it."""
+        try:
+            template = self.get_formula_template(location, cell)
+        except lark.exceptions.LarkError:
+            return set(), set()
+        if template.is_dynamic:
+            return None
+        row, col = convert_location_to_idx(location)
+        return self._split_refs(template.get_cell_refs(hidden_name, row, col), hidden_name)
+
+    def get_parse_cache_stats(self) -> dict:
+        """Returns the hit/miss/eviction counters of the workbook's shared
+        parse cache, along with its current size and capacity."""
+        return self.parse_cache.get_stats()
+
+    def get_lookup_index_stats(self) -> dict:
+        """Returns the hit/miss/eviction counters of the workbook's VLOOKUP and
+        HLOOKUP indexes, along with their current number and capacity."""
+        return self.lookup_indexes.get_stats()
+
+    def get_range_aggregate_stats(self) -> dict:
+        """Returns the hit/miss/eviction counters of the workbook's range
+        aggregates, along with their current number and capacity."""
+        return self.range_aggregates.get_stats()
+
+    def get_criteria_index_stats(self) -> dict:
+        """Returns the hit/miss/eviction counters of the workbook's SUMIF,
+        COUNTIF and AVERAGEIF indexes, along with their current number and
+        capacity."""
+        return self.criteria_indexes.get_stats()
+
+    def get_function_result_stats(self) -> dict:
+        """Returns the hit/miss/eviction counters of the workbook's memoized
+        function results, along with their current number and capacity."""
+        return self.function_results.get_stats()
+
+    def get_formula_memory_report(self) -> dict:
+        """Returns how many bytes the parse trees of the workbook's formulas
+        take, and how many bytes sharing their common subtrees saves."""
+        return self.parse_cache.get_memory_report()
+
     def get_cell_from_location(self, sheet_name, location):
         """Returns the cell from the location."""
         hidden_name = get_hidden_name(sheet_name)
@@ -564,110 +736,276 @@ class Workbook:
             return None
         return self.sheets[hidden_name].get_cell(location)
 
-    def recompute_cell_value(self, cell_loc):
-        """Recomputes the value of the given cell based on its formula and the value of the dependencies."""
-        # Recompute the value of the specified cell.
-
-        sheet_name, location = cell_loc  # cell.get_location().lower().split("!")
-        hidden_name = get_hidden_name(sheet_name)
-        cell = self.get_cell_from_location(sheet_name, location)
-        bruh = False
-        if not cell or hidden_name not in self.sheets:
-            return
-        if is_formula(cell.get_contents()):
-            old_children = cell.get_children()
-            formula_value, cell_refs = self.get_formula_value(hidden_name, cell, False)
-            # if cell_refs != set({}):
-            #     self.add_children_cells(hidden_name, location, cell_refs)
-            if old_children != cell_refs:
-                bruh = True
-                self.recompute_cell_and_parents(
-                    hidden_name, location, cell.get_contents()
-                )
-            else:
-                old_value = self.sheets[hidden_name].get_cell_value(location)
-                self.sheets[hidden_name].set_cell_value(location, formula_value)
-                new_value = self.sheets[hidden_name].get_cell_value(location)
-                if new_value != old_value:
-                    sheet_name = self.get_sheet_name_from_hidden(hidden_name)
-                    if (sheet_name, location) not in self.cells_changed:
-                        self.cells_changed[(sheet_name, location)] = old_value
-                    elif self.cells_changed[(sheet_name, location)] == new_value:
-                        del self.cells_changed[(sheet_name, location)]
-                    
-                    
-        return bruh
-
     def _set_cycle_detected(
         self,
         capture,
     ):
-        for sheet_name, loc in capture:
-            cell = self.get_cell_from_location(sheet_name, loc)
+        for hidden_name, loc in capture:
+            cell = self.get_cell_from_location(hidden_name, loc)
             if cell:
                 cell_val = cell.get_value()
-                if (
-                    not isinstance(cell_val, CellError)
-                    or not cell_val.get_type() == CellErrorType.CIRCULAR_REFERENCE
-                ):
-                    sheet_name = self.get_sheet_name_from_hidden(sheet_name)
+                if not is_circular_reference(cell_val):
+                    sheet_name = self.get_sheet_name_from_hidden(hidden_name)
                     if (sheet_name, loc) not in self.cells_changed:
                         self.cells_changed[(sheet_name, loc)] = cell_val
-                    elif self.cells_changed[(sheet_name, loc)] == cell_val:
-                       del self.cells_changed[(sheet_name, loc)]
-                cell.set_cell_value(
-                    cell.get_contents(),
+                    elif is_circular_reference(self.cells_changed[(sheet_name, loc)]):
+                        # Back to what it was before the cells changed
+                        del self.cells_changed[(sheet_name, loc)]
+                self.sheets[get_hidden_name(hidden_name)].set_cell_value(
+                    loc,
                     CellError(CellErrorType.CIRCULAR_REFERENCE, "Cycle detected", None),
                 )
 
-    def recompute_cell_and_parents(self, hidden_name, location, contents):
-        """Helper function to recompute the parents of cells."""
+    def evaluate_cell(self, hidden_name, location, cell) -> bool:
+        """Evaluates the formula in the given cell and adds the cells it
+        referenced to the graph.  Returns True if they differ from the cells
+        it referenced when it was last evaluated."""
+        old_refs = set(cell.get_children())
+        formula_value, cell_refs = self.get_formula_value(hidden_name, location, cell)
 
-        cell = self.sheets[hidden_name].get_cell(location)
-        # Compute value if the cell is a formula
-        if is_formula(contents):
-            formula_value, cell_refs = self.get_formula_value(hidden_name, cell, True)
+        # Set the cell value
+        old_value = self.sheets[hidden_name].get_cell_value(location)
+        self.sheets[hidden_name].set_cell_value(location, formula_value)
+        new_value = self.sheets[hidden_name].get_cell_value(location)
+        if old_value != new_value:
+            # self.cells_changed.add(
+            #     (self.get_sheet_name_from_hidden(hidden_name), location)
+            # )
+            sheet_name = self.get_sheet_name_from_hidden(hidden_name)
+            if (sheet_name, location) not in self.cells_changed:
+                self.cells_changed[(sheet_name, location)] = old_value
+            elif self.cells_changed[(sheet_name, location)] == new_value:
+                del self.cells_changed[(sheet_name, location)]
 
-            # Set the cell value
-            old_value = self.sheets[hidden_name].get_cell_value(location)
-            self.sheets[hidden_name].set_cell_value(location, formula_value)
-            new_value = self.sheets[hidden_name].get_cell_value(location)
-            if old_value != new_value:
-                # self.cells_changed.add(
-                #     (self.get_sheet_name_from_hidden(hidden_name), location)
-                # )
-                sheet_name = self.get_sheet_name_from_hidden(hidden_name)
-                if (sheet_name, location) not in self.cells_changed:
-                    self.cells_changed[(sheet_name, location)] = old_value
-                elif self.cells_changed[(sheet_name, location)] == new_value:
-                    del self.cells_changed[(sheet_name, location)]
+        # The cells referenced may differ from the last evaluation, as they do
+        # when INDIRECT is given a different reference
+        if cell_refs != old_refs:
+            self.update_children_cells(hidden_name, location, cell_refs)
+            return True
+        return False
+
+    def recompute_cells(self, cells):
+        """Recomputes the given (hidden sheet name, location) cells, whose
+        contents have been set without being evaluated, in one pass.
+
+        The dependency graph of the cells is built from their static references
+        first, so every cell is evaluated after the cells it references.  Cells
+        in a cycle of static references, and cells using INDIRECT, are
+        recomputed one at a time afterwards, along with anything outside of
+        the given cells that depends on them."""
+        cells = list(dict.fromkeys(cells))
+        static_refs = {}
+        for hidden_name, location in cells:
+            cell = self.sheets[hidden_name].get_cell(location)
+            if cell is not None and cell.is_formula():
+                static_refs[(hidden_name, location)] = self.get_static_refs(
+                    hidden_name, location, cell
+                )
 
-            # We still need to add the children and parent cells if it's a valid formula
-            if cell_refs != set({}):
-                self.add_children_cells(hidden_name, location, cell_refs)
-        # else:
-        # Currently Unnecessary, we aren't resetting parents but we may need
-        # to in the future
-
-        # Recompute the value of the specified cell, and the cells that depend on it.
-        # cycle_detected, capture = self.graph.topological_sort(hidden_name, location)
-        capture, cycle_detected = self.graph.tarjans(hidden_name, location)
-
-        # Technically we don't need to recompute the first cell as it's
-        # already been recomputed
-        # for i in range(len(capture)):
-        #     if len(capture[i]) == 1:
-        #         for cell in capture[i]:
-        #             self.recompute_cell_value(cell)
-
-        for i in range(len(capture)):
-            if len(capture[i]) > 1 or cycle_detected:
-                self._set_cycle_detected(capture[i])
-        for i in range(len(capture)):
-            if len(capture[i]) == 1:
-                for cell in capture[i]:
-                    self.recompute_cell_value(cell)
-                    # break
+        # The ranges referenced by the cells, to find the cells inside them
+        ranges = {}  # {hidden sheet name: RangeIndex}
+        for node, refs in static_refs.items():
+            if refs is not None:
+                for range_sheet, bounds in refs[1]:
+                    ranges.setdefault(range_sheet, RangeIndex()).add(bounds, node)
+        children = {
+            node: set() if refs is None else refs[0] & static_refs.keys()
+            for node, refs in static_refs.items()
+        }
+        for hidden_name, location in static_refs:
+            if hidden_name in ranges:
+                row, col = convert_location_to_idx(location)
+                for parent in ranges[hidden_name].find(row, col):
+                    children[parent].add((hidden_name, location))
+        deferred = []
+        for component in Graph.strongly_connected_components(children):
+            node = component[0]
+            if len(component) > 1 or node in children[node] or static_refs[node] is None:
+                deferred.extend(component)
+            else:
+                hidden_name, location = node
+                self.evaluate_cell(
+                    hidden_name, location, self.sheets[hidden_name].get_cell(location)
+                )
+
+        batch = set(cells)
+        outside_parents = {}
+        for hidden_name, location in cells:
+            for parent in self.graph.get_parents_from_cell(hidden_name, location):
+                if parent not in batch:
+                    outside_parents[parent] = None
+        self.recompute_dirty_cells(deferred + list(outside_parents))
+
+    def recompute_cell_and_parents(self, hidden_name, location):
+        """Recomputes the given cell, if it is a formula, and every cell
+        depending on it."""
+        self.recompute_dirty_cells([(hidden_name, location)])
+
+    def recompute_dirty_cells(self, cells):
+        """Recomputes the given (hidden sheet name, location) cells, whose
+        contents or inputs have changed, and every cell depending on them.
+
+        The cells depending on the given cells are marked dirty first, and
+        the strongly connected components of the dirty cells are then
+        evaluated in one topological order, so each cell is evaluated once
+        however many of the changed cells it depends on.  Cells in a cycle
+        are set to a circular reference error instead."""
+        roots = dict.fromkeys(cells)
+        if self.deferred_cells is not None:
+            self.deferred_cells.update(roots)
+            return
+
+        # The pass works on the cells' node IDs, which stay the same until
+        # release_unused is called at the end
+        graph = self.graph
+        # Formulas set since they were last evaluated have no edges yet, so
+        # their static references order them among the other changed cells.
+        # They only order the pass: a formula may never read some of them,
+        # so only the edges found by evaluating make a cycle.
+        hints = {}  # {child node ID: [IDs of the formulas referencing it]}
+        range_hints = {}  # {hidden sheet name: RangeIndex of node IDs}
+        for hidden_name, location in roots:
+            cell = self.get_cell_from_location(hidden_name, location)
+            if cell is not None and cell.is_formula() and not cell.get_children():
+                refs = self.get_static_refs(hidden_name, location, cell)
+                if refs is None:
+                    continue
+                node = graph.intern(hidden_name, location)
+                for child in refs[0]:
+                    hints.setdefault(graph.intern(*child), []).append(node)
+                for range_sheet, bounds in refs[1]:
+                    range_hints.setdefault(range_sheet, RangeIndex()).add(bounds, node)
+
+        roots = {graph.intern(hidden_name, location): None for hidden_name, location in roots}
+        # The cycles whose cells were evaluated again to refresh their edges.
+        # Each cycle is refreshed once, so the passes always come to an end.
+        refreshed = set()  # Set[frozenset of node IDs]
+        while roots:
+            roots = self._recompute_dirty_pass(roots, hints, range_hints, refreshed)
+        graph.release_unused()
+
+    def _recompute_dirty_pass(
+        self, roots: dict, hints: dict, range_hints: dict, refreshed: set
+    ) -> dict:
+        """Recomputes the given node IDs and the cells depending on them in
+        one topological order.  Returns the nodes left to recompute if a
+        formula turned out to reference a dirty cell that came after it in
+        the order, as INDIRECT may, and an empty dict otherwise.
+
+        The edges of a cycle were found when its cells were last evaluated,
+        and the cycle may be gone by now, as it is from =IF(B1, 1, A1) once
+        B1 is TRUE.  Its cells are evaluated again first, and are only set
+        to a circular reference error if the edges they reference now are
+        the same."""
+        graph = self.graph
+        parents = {}  # The edges of the graph
+        ordering = {}  # The edges of the graph along with the hints
+        # Whether the graph's topological order holds for every dirty cell,
+        # in which case the cells can't be in a cycle and are simply sorted
+        is_ordered = True
+        stack = list(roots)
+        while stack:
+            node = stack.pop()
+            if node in parents:
+                continue
+            parents[node] = list(graph.get_parent_ids(node))
+            ordering[node] = parents[node] + hints.get(node, [])
+            if range_hints:
+                hidden_name, location = graph.get_node(node)
+                if hidden_name in range_hints:
+                    row, col = convert_location_to_idx(location)
+                    ordering[node].extend(range_hints[hidden_name].find(row, col))
+            if is_ordered:
+                is_ordered = len(ordering[node]) == len(parents[node]) and graph.is_node_ordered(node)
+            stack.extend(ordering[node])
+
+        # Every component comes after the components depending on it, so the
+        # order is reversed to evaluate the cells after their children
+        if is_ordered:
+            components = [
+                [node]
+                for node in sorted(parents, key=self._get_order_key, reverse=True)
+            ]
+        else:
+            components = Graph.strongly_connected_components(ordering)
+        pending = dict.fromkeys(parents)
+        for component in reversed(components):
+            if len(component) > 1 or component[0] in ordering[component[0]]:
+                # Only a cycle of the graph's own edges is a cycle
+                members = set(component)
+                component_parents = {
+                    node: [parent for parent in parents[node] if parent in members]
+                    for node in component
+                }
+                subcomponents = reversed(Graph.strongly_connected_components(component_parents))
+            else:
+                subcomponents = [component]
+
+            for subcomponent in subcomponents:
+                for node in subcomponent:
+                    del pending[node]
+                node = subcomponent[0]
+                if len(subcomponent) > 1 or node in parents[node]:
+                    members = [graph.get_node(member) for member in subcomponent]
+                    if frozenset(subcomponent) not in refreshed:
+                        refreshed.add(frozenset(subcomponent))
+                        if self._refresh_cycle(members):
+                            return {**dict.fromkeys(subcomponent), **pending}
+                    self._set_cycle_detected(members)
+                    continue
+                hidden_name, location = graph.get_node(node)
+                cell = self.get_cell_from_location(hidden_name, location)
+                if cell is None or not cell.is_formula():
+                    continue
+
+                if not self.evaluate_cell(hidden_name, location, cell):
+                    continue
+                # An edge to the cell itself or to a cell still to come may
+                # close a cycle, and the order no longer holds either way.
+                # The edges it had before were in order.
+                if graph.references_any(node, {node: None}) or graph.references_any(node, pending):
+                    return {node: None, **pending}
+        return {}
+
+    def _refresh_cycle(self, members: list) -> bool:
+        """Finds the cells the formulas of the given (hidden sheet name,
+        location) cells of a cycle reference now, updating their edges.  The
+        cells are set to the circular reference error they hold if the cycle
+        is still there, and keep it while they are evaluated, so what they
+        reference never depends on what the cycle held before or on the
+        order they are evaluated in.  Returns True if any of them references
+        other cells than it did."""
+        self._set_cycle_detected(members)
+        changed = False
+        for hidden_name, location in members:
+            cell = self.get_cell_from_location(hidden_name, location)
+            if cell is None or not cell.is_formula():
+                continue
+            old_refs = set(cell.get_children())
+            _, cell_refs = self.get_formula_value(hidden_name, location, cell)
+            if cell_refs != old_refs:
+                self.update_children_cells(hidden_name, location, cell_refs)
+                changed = True
+        return changed
+
+    def _get_order_key(self, node: int) -> float:
+        # Cells without a position have no cell edges, so come first
+        position = self.graph.order[node]
+        return float("-inf") if position is None else position
+
+    @contextlib.contextmanager
+    def _batch_recompute(self):
+        """Defers recomputing the cells set inside the block to a single pass
+        once it ends, so a cell depending on many of them is evaluated once."""
+        if self.deferred_cells is not None:
+            yield
+            return
+        self.deferred_cells = {}
+        try:
+            yield
+        finally:
+            cells, self.deferred_cells = self.deferred_cells, None
+            self.recompute_dirty_cells(cells)
 
     def _get_sheet_name_location(self, child, parent_hidden_name):
         if "!" in child:
@@ -682,32 +1020,49 @@ class Workbook:
             child_location = child
         return child_sheet_name.lower(), child_location.lower()
 
+    def _split_refs(self, refs, parent_hidden_name):
+        """Splits the references recorded for a formula into the (hidden sheet
+        name, location) of its cells and the (hidden sheet name, (top, left,
+        bottom, right)) of its ranges."""
+        children = set()
+        ranges = set()
+        for ref in refs:
+            if isinstance(ref, tuple):
+                range_sheet, *bounds = ref
+                ranges.add((get_hidden_name(range_sheet), tuple(bounds)))
+            else:
+                children.add(self._get_sheet_name_location(ref, parent_hidden_name))
+        return children, ranges
+
     def add_children_cells(self, hidden_name, location, cell_refs):
-        """Adds the cells referenced by the formula."""
+        """Adds the cells and ranges referenced by the formula."""
         # Again unnecessary, we aren't resetting parents but we may need later
         # self.graph.update_children(hidden_name, location)
 
-        for child in cell_refs:
+        children, ranges = self._split_refs(cell_refs, hidden_name)
+        for child_sheet_name, child_location in children:
             # We have to update the graph with the new children
-            child_sheet_name, child_location = self._get_sheet_name_location(
-                child, hidden_name
-            )
             self.graph.add_connection(
                 hidden_name, location, child_sheet_name, child_location
             )
+        for range_sheet_name, bounds in ranges:
+            self.graph.add_range_connection(hidden_name, location, range_sheet_name, bounds)
+
+    def update_children_cells(self, hidden_name, location, new_refs):
+        """Replaces the edges from the cells the formula referenced when it was
+        last evaluated with edges from the cells it references now.  Only the
+        edges that differ are touched, so a cell using INDIRECT depends on
+        exactly the cells its reference currently resolves to."""
+        new_children, new_ranges = self._split_refs(new_refs, hidden_name)
+        self.graph.set_children(hidden_name, location, new_children)
+        self.graph.set_range_children(hidden_name, location, new_ranges)
 
     def clean_children_cells(self, hidden_name, location):
         """Cleans the children of the cell."""
+        self.graph.remove_children(hidden_name, location)
         cell = self.sheets[hidden_name].get_cell(location)
         if cell is not None:
-            children = cell.get_children()
-            for child in children:
-                child_hidden_name, child_location = self._get_sheet_name_location(
-                    child, hidden_name
-                )
-                self.graph.update_child(
-                    hidden_name, location, child_hidden_name, child_location
-                )
+            cell.set_children(set())
 
     @notify_cell_changes
     def set_cell_contents(
@@ -742,15 +1097,29 @@ class Workbook:
 
         contents = contents.lstrip().rstrip() if contents is not None else None
 
+        self._set_cell(hidden_name, location, contents)
+
+    @notify_cell_changes
+    def _set_cell_template(self, hidden_name: str, location: str, template) -> None:
+        """Puts a formula template into a cell, as though its contents were
+        set to the formula the template reads as at that location."""
+        self._set_cell(hidden_name, location, None, template)
+
+    def _set_cell(self, hidden_name, location, contents, template=None):
+        """Sets the contents (or formula template) of a cell and recomputes
+        the cell and its parents."""
         old_value = self.sheets[hidden_name].get_cell_value(location)
 
         # Clean the children of the cell before setting the contents incase we set the contents to None
         self.clean_children_cells(hidden_name, location)
 
-        self.sheets[hidden_name].set_cell_contents(hidden_name, location, contents)
+        if template is None:
+            self.sheets[hidden_name].set_cell_contents(hidden_name, location, contents)
+        else:
+            self.sheets[hidden_name].set_cell_template(hidden_name, location, template)
         new_value = self.sheets[hidden_name].get_cell_value(location)
         if new_value != old_value:
-            sheet_name = self.get_sheet_name_from_hidden(sheet_name)
+            sheet_name = self.get_sheet_name_from_hidden(hidden_name)
             if (sheet_name, location) not in self.cells_changed:
                 self.cells_changed[(sheet_name, location)] = old_value
             elif self.cells_changed[(sheet_name, location)] == new_value:
@@ -758,7 +1127,31 @@ class Workbook:
 
         # Recompute cell and parents now actually recomputes the current cell value
 
-        self.recompute_cell_and_parents(hidden_name, location, contents)
+        self.recompute_cell_and_parents(hidden_name, location)
+
+    def _copy_cell_source(self, hidden_name, location):
+        """Returns what copying the given cell elsewhere should put into the
+        target cell: the cell's formula template if it has one, otherwise its
+        contents."""
+        cell = self.sheets[hidden_name].get_cell(location)
+        if cell is None:
+            return None
+        template = cell.get_formula_template()
+        return template if template is not None else cell.get_contents()
+
+    def _paste_cell_source(self, hidden_name, location, source):
+        """Puts a value returned by _copy_cell_source into the given cell.
+        Templates are shared with the source cell unless a relative reference
+        would fall off the sheet, in which case the formula is rebuilt with a
+        #REF! in its place."""
+        if source is None or isinstance(source, str):
+            self.set_cell_contents(hidden_name, location, source)
+            return
+        row, col = convert_location_to_idx(location)
+        if source.fits(row, col):
+            self._set_cell_template(hidden_name, location, source)
+        else:
+            self.set_cell_contents(hidden_name, location, source.render(row, col))
 
 
 
@@ -846,11 +1239,8 @@ class Workbook:
         Updates cells that referenced this new sheet before it actually existed.
         """
         cells_refing_sheet = self.graph.get_sheet_parents(sheet_name)
-        # Iterate through these cells to update the values of their parents.
-        for sheet_name, loc in cells_refing_sheet:
-            self.recompute_cell_and_parents(
-                sheet_name, loc, self.get_cell_contents(sheet_name, loc)
-            )
+        # Recompute these cells and their parents in one pass.
+        self.recompute_dirty_cells(cells_refing_sheet)
 
     @notify_cell_changes
     def new_sheet(self, sheet_name: Optional[str] = None, copy_sheet = False) -> Tuple[int, str]:
@@ -886,7 +1276,7 @@ class Workbook:
         hidden_name = get_hidden_name(sheet_name)  # noqa: F405
         if hidden_name in self.sheets:
             raise ValueError(f"{sheet_name} already exists in the Workbook.")
-        self.sheets[hidden_name] = Sheet(sheet_name)
+        self.sheets[hidden_name] = Sheet(sheet_name, self.numeric)
         if not self.graph.has_sheet(hidden_name):
             self.graph.add_sheet(hidden_name)
         if not copy_sheet:
@@ -966,7 +1356,7 @@ class Workbook:
         self.sheets[get_hidden_name(new_sheet_name)] = sheet
         self.move_sheet(get_hidden_name(new_sheet_name), idx)
 
-        recon = Reconstructor(parser)
+        recon = parser.reconstructor
         fixer = FormulaFixer(old_sheet_name, new_sheet_name)
         cells_refing_renamed_sheet = self.graph.get_sheet_parents(lower_old_sheet_name)
         # Fixes formulas for cells referencing the old sheet name
@@ -976,17 +1366,23 @@ class Workbook:
             if cell is None:
                 cell = self.get_cell_from_location(new_sheet_name, cell_loc)
             contents = cell.get_contents()
-            parsed_formula = parser.parse(contents)
+            parsed_formula = self.parse_cache.parse(contents)
             fixed_parsed_formula = fixer.transform(parsed_formula)
             fixed_formula = recon.reconstruct(fixed_parsed_formula, insert_spaces=False)
             cell.set_contents("=" + fixed_formula, keep_value=True)
 
         # Track what cells are already refing the new name.
-        self.recompute_sheet_parents(get_hidden_name(new_sheet_name))
-        # Update the graph
+        cells_refing_new_name = self.graph.get_sheet_parents(get_hidden_name(new_sheet_name))
+        # Update the graph before recomputing them, so they find the cells
+        # of the renamed sheet, and any cycle through them
         self.graph.rename_sheet(
             get_hidden_name(old_sheet_name), get_hidden_name(new_sheet_name)
         )
+        new_hidden_name = get_hidden_name(new_sheet_name)
+        self.recompute_dirty_cells(
+            (new_hidden_name if sheet_name == lower_old_sheet_name else sheet_name, cell_loc)
+            for sheet_name, cell_loc in cells_refing_new_name
+        )
 
     @notify_cell_changes
     def move_sheet(self, sheet_name: str, index: int) -> None:
@@ -1067,7 +1463,7 @@ class Workbook:
                 break
             copy_index += 1
 
-        prior_parents = set(self.graph.children_to_parents.keys())
+        prior_parents = set(self.graph.get_sheet_names())
 
         self.new_sheet(new_sheet_name, copy_sheet=True)
 
@@ -1077,8 +1473,9 @@ class Workbook:
             for loc, cell in sheet_data:
                 self.set_cell_contents_copy_sheet(old_name, new_sheet_name, loc, cell)
         else:
-            for loc, cell in sheet_data:
-                self.set_cell_contents(new_sheet_name, loc, cell.get_contents())
+            with self._batch_recompute():
+                for loc, cell in sheet_data:
+                    self.set_cell_contents(new_sheet_name, loc, cell.get_contents())
        
         # Return the index and the new sheet name
         new_index = self.num_sheets() - 1
@@ -1098,15 +1495,22 @@ class Workbook:
 
 
 
-        contents = cell.get_contents()
-        contents = contents.lstrip().rstrip() if contents is not None else None
-
         old_value = self.sheets[hidden_name].get_cell_value(location)
 
         # Clean the children of the cell before setting the contents incase we set the contents to None
         self.clean_children_cells(hidden_name, location)
 
-        self.sheets[hidden_name].set_cell_contents(hidden_name, location, contents)
+        # The copy shares the template of the original cell, and only has
+        # text contents if the original's have been built already.
+        template = cell.get_formula_template()
+        if template is None:
+            contents = cell.get_contents()
+            contents = contents.lstrip().rstrip() if contents is not None else None
+            self.sheets[hidden_name].set_cell_contents(hidden_name, location, contents)
+        else:
+            self.sheets[hidden_name].set_cell_template(
+                hidden_name, location, template, cell.contents
+            )
 
         new_value = self.sheets[hidden_name].get_cell_value(location)
         if new_value != old_value:
@@ -1117,10 +1521,11 @@ class Workbook:
                 del self.cells_changed[(sheet_name, location)]
 
         new_cell = self.sheets[hidden_name].get_cell(location)
-        new_cell.cache_formula(cell.get_cached_formula())
         # Compute value if the cell is a formula
-        if is_formula(contents):
-            formula_value, cell_refs = self.get_formula_value(old_sheet_name, new_cell, False)
+        if new_cell is not None and new_cell.is_formula():
+            formula_value, cell_refs = self.get_formula_value(
+                old_sheet_name, location, new_cell
+            )
 
             # Set the cell value
             old_value = self.sheets[hidden_name].get_cell_value(location)
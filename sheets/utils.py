@@ -32,13 +32,11 @@ def convert_to(item, type, error_detail = ""):
                 return False
             else:
                 return CellError(CellErrorType.TYPE_ERROR, error_detail + "\n Failed to convert string to bool")
-        if isinstance(item,Decimal):
-            if item == Decimal(0):
-                return False
-            else:
-                return True
         if isinstance(item,bool):
             return item
+        # Numbers are floats or ints too in the other numeric modes
+        if isinstance(item, (Decimal, float, int)):
+            return item != 0
         if isinstance(item,CellError):
             item : CellError
             return CellError(item.get_type(), f"failed to convert cell error of type {item.get_type()} to bool" + item.get_detail())
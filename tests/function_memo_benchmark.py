@@ -0,0 +1,73 @@
+import context
+import statistics
+import time
+import sheets
+from sheets.Functions import SheetFunction, function_directory
+
+# Measures whether memoizing the results of the built-in functions (see
+# FunctionInfo.memoize) pays off.  Each formula calls a function on the value
+# of one cell, which every formula shares, so a memoized function is run once
+# per change of that cell and its other calls are all cache hits.  Only the
+# functions receiving their arguments evaluated can be memoized, and the
+# aggregates are called on scalars, since range arguments are never memoized.
+# SLOW stands for a registered function costing far more than a cache lookup.
+
+
+class SLOW(SheetFunction):
+    def func(self, args):
+        return sum(i * i for i in range(500)) + args[0]
+
+
+function_directory.register("SLOW", SLOW, min_args=1, max_args=1)
+
+# (function, formula) pairs, the last of which shows the cost of checking the
+# arguments of calls that are never memoized
+FORMULAS = [
+    ("NOT", "=NOT(A1)"),
+    ("EXACT", '=EXACT(A1, "12")'),
+    ("SUM", "=SUM(A1, 1, 2, 3)"),
+    ("MAX", "=MAX(A1, 1, 2, 3)"),
+    ("MIN", "=MIN(A1, 1, 2, 3)"),
+    ("AVERAGE", "=AVERAGE(A1, 1, 2, 3)"),
+    ("SLOW", "=SLOW(A1)"),
+    ("SUM", "=SUM(A1:A3)"),
+]
+
+CELLS = 5000
+RUNS = 15
+
+
+def time_recompute(formula: str) -> float:
+    """Returns the median time in seconds taken to recompute CELLS formulas
+    after the cell they all read changes."""
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    wb.set_cell_contents("Sheet1", "A1", "0")
+    for row in range(1, CELLS + 1):
+        wb.set_cell_contents("Sheet1", f"B{row}", formula)
+    times = []
+    for run in range(RUNS):
+        start = time.perf_counter()
+        wb.set_cell_contents("Sheet1", "A1", str(run + 1))
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def time_function(name: str, formula: str, memoize: bool) -> float:
+    info = function_directory.get(name)
+    original = info.memoize
+    info.memoize = memoize
+    try:
+        return time_recompute(formula)
+    finally:
+        info.memoize = original
+
+
+if __name__ == "__main__":
+    for name, formula in FORMULAS:
+        plain = time_function(name, formula, memoize=False)
+        memoized = time_function(name, formula, memoize=True)
+        print(
+            f"{formula}: {plain * 1000:.1f}ms plain, {memoized * 1000:.1f}ms memoized "
+            f"({(plain - memoized) / plain:+.1%}, median of {RUNS} recomputes of {CELLS} cells)"
+        )
@@ -0,0 +1,61 @@
+import context
+import os
+import statistics
+import subprocess
+import sys
+from sheets.Parser import grammar_cache_path
+
+# Measures how long a fresh process takes to import sheets, evaluate its first
+# formula, and first need the Earley parser (a formula the LALR parser
+# rejects).  Cold runs start without the cached grammar, warm runs with it.
+
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+import sheets
+imported = time.perf_counter()
+wb = sheets.Workbook()
+wb.new_sheet("Sheet1")
+wb.set_cell_contents("Sheet1", "A1", "=1 + 2 * 3")
+wb.get_cell_value("Sheet1", "A1")
+first_formula = time.perf_counter()
+wb.set_cell_contents("Sheet1", "A2", "=1 +")
+earley = time.perf_counter()
+print(imported - start, first_formula - imported, earley - first_formula)
+"""
+
+RUNS = 10
+
+
+def time_startup(cold: bool):
+    """Runs STARTUP_SCRIPT in new interpreters, returning a list of
+    (import, first formula, Earley) times in seconds."""
+    package_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    times = []
+    for i in range(RUNS):
+        if cold and os.path.exists(grammar_cache_path()):
+            os.remove(grammar_cache_path())
+        output = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT],
+            cwd=package_dir,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        times.append(tuple(float(t) for t in output.split()))
+    return times
+
+
+def report(label, times):
+    columns = list(zip(*times))
+    print(
+        f"{label}: import {statistics.median(columns[0]) * 1000:.1f}ms, "
+        f"first formula {statistics.median(columns[1]) * 1000:.1f}ms, "
+        f"first Earley parse {statistics.median(columns[2]) * 1000:.1f}ms "
+        f"(median of {RUNS})"
+    )
+
+
+if __name__ == "__main__":
+    report("cold", time_startup(cold=True))
+    report("warm", time_startup(cold=False))
@@ -0,0 +1,49 @@
+import context
+import pytest
+import sheets
+from decimal import Decimal
+
+
+@pytest.fixture
+def wb():
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    for row in range(1, 101):
+        wb.set_cell_contents("Sheet1", f"A{row}", str(row))
+    return wb
+
+
+@pytest.mark.parametrize(
+    "formula, expected",
+    [
+        ("=SUM(A1:A100)", Decimal(5050)),
+        ("=MIN(A100:A1)", Decimal(1)),
+        ("=MAX(A1:A100, 7)", Decimal(100)),
+        ("=AVERAGE(A1:A100)", Decimal("50.5")),
+    ],
+)
+def test_numeric_ranges(wb, formula, expected):
+    wb.set_cell_contents("Sheet1", "B1", formula)
+    assert wb.get_cell_value("Sheet1", "B1") == expected
+
+
+def test_mixed_arguments_fall_back(wb):
+    wb.set_cell_contents("Sheet1", "A50", "'2")
+    wb.set_cell_contents("Sheet1", "A51", "=TRUE")
+    wb.set_cell_contents("Sheet1", "B1", "=SUM(A1:A100)")
+    wb.set_cell_contents("Sheet1", "B2", "=SUM(A200:A300)")
+    wb.set_cell_contents("Sheet1", "B3", "=MAX(A200)")
+    wb.set_cell_contents("Sheet1", "B4", "=AVERAGE(A200:A300)")
+    assert wb.get_cell_value("Sheet1", "B1") == Decimal(5050 - 50 - 51 + 2 + 1)
+    assert wb.get_cell_value("Sheet1", "B2") == Decimal(0)
+    assert wb.get_cell_value("Sheet1", "B3") == Decimal(0)
+    assert wb.get_cell_value("Sheet1", "B4").get_type() == sheets.CellErrorType.DIVIDE_BY_ZERO
+
+
+def test_errors_in_ranges_win(wb):
+    wb.set_cell_contents("Sheet1", "A10", "=1/0")
+    wb.set_cell_contents("Sheet1", "A20", "#REF!")
+    for function in ("SUM", "MIN", "MAX", "AVERAGE"):
+        wb.set_cell_contents("Sheet1", "B1", f"={function}(A1:A100)")
+        value = wb.get_cell_value("Sheet1", "B1")
+        assert value.get_type() == sheets.CellErrorType.BAD_REFERENCE
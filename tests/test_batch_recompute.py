@@ -0,0 +1,185 @@
+import context
+import io
+import random
+import pytest
+import sheets
+from decimal import Decimal
+
+
+@pytest.fixture
+def wb():
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    return wb
+
+
+@pytest.fixture
+def evaluations(wb, monkeypatch):
+    """The locations of the formulas evaluated, in order."""
+    evaluated = []
+    get_formula_value = wb.get_formula_value
+
+    def counted(hidden_name, location, cell):
+        evaluated.append(location)
+        return get_formula_value(hidden_name, location, cell)
+
+    monkeypatch.setattr(wb, "get_formula_value", counted)
+    return evaluated
+
+
+def test_diamond_is_evaluated_once(wb, evaluations):
+    wb.set_cell_contents("Sheet1", "A1", "1")
+    wb.set_cell_contents("Sheet1", "B1", "=A1 + 1")
+    wb.set_cell_contents("Sheet1", "C1", "=A1 * 2")
+    wb.set_cell_contents("Sheet1", "D1", "=B1 + C1")
+    evaluations.clear()
+    wb.set_cell_contents("Sheet1", "A1", "5")
+    assert sorted(evaluations) == ["b1", "c1", "d1"]
+    assert evaluations[-1] == "d1"
+    assert wb.get_cell_value("Sheet1", "D1") == Decimal(16)
+
+
+def test_move_evaluates_each_cell_once(wb, evaluations):
+    for row in range(1, 6):
+        wb.set_cell_contents("Sheet1", f"A{row}", str(row))
+    wb.set_cell_contents("Sheet1", "C1", "=SUM(B1:B5)")
+    wb.set_cell_contents("Sheet1", "D1", "=C1 * B1")
+    evaluations.clear()
+    wb.move_cells("Sheet1", "A1", "A5", "B1")
+    assert sorted(evaluations) == ["c1", "d1"]
+    assert wb.get_cell_value("Sheet1", "C1") == Decimal(15)
+    assert wb.get_cell_value("Sheet1", "D1") == Decimal(15)
+
+
+def test_copied_chain_is_ordered(wb):
+    # Each cell refers to the cell below it, so pasting top to bottom sets
+    # every formula before the cell it references
+    for row in range(1, 5):
+        wb.set_cell_contents("Sheet1", f"A{row}", f"=A{row + 1} + 1")
+    wb.set_cell_contents("Sheet1", "A5", "1")
+    wb.copy_cells("Sheet1", "A1", "A5", "B1")
+    assert wb.get_cell_value("Sheet1", "B1") == Decimal(5)
+
+
+def test_untaken_branch_is_not_a_cycle(wb):
+    wb.set_cell_contents("Sheet1", "A1", "=IF(FALSE, B1, 1)")
+    wb.set_cell_contents("Sheet1", "B1", "=A1")
+    wb.copy_cells("Sheet1", "A1", "B1", "A2")
+    assert wb.get_cell_value("Sheet1", "A2") == Decimal(1)
+    assert wb.get_cell_value("Sheet1", "B2") == Decimal(1)
+
+
+def test_cycle_made_by_a_batch(wb):
+    wb.set_cell_contents("Sheet1", "A1", "=B1")
+    wb.set_cell_contents("Sheet1", "B1", "=C1")
+    wb.set_cell_contents("Sheet1", "C1", "=A5")
+    wb.set_cell_contents("Sheet1", "A5", "=A1")
+    wb.copy_cells("Sheet1", "A1", "C1", "A2")
+    for location in ["A1", "B1", "C1", "A5"]:
+        assert wb.get_cell_value("Sheet1", location).get_type() == sheets.CellErrorType.CIRCULAR_REFERENCE
+
+
+def test_indirect_reordered_within_a_pass(wb):
+    wb.set_cell_contents("Sheet1", "A1", "1")
+    wb.set_cell_contents("Sheet1", "B1", "=A1 + 1")
+    wb.set_cell_contents("Sheet1", "B2", "=A1 + 2")
+    wb.set_cell_contents("Sheet1", "C1", '=INDIRECT("B1") * 10')
+    wb.set_cell_contents("Sheet1", "D1", "=INDIRECT(IF(A1 > 1, \"B2\", \"B1\"))")
+    assert wb.get_cell_value("Sheet1", "D1") == Decimal(2)
+    wb.set_cell_contents("Sheet1", "A1", "4")
+    assert wb.get_cell_value("Sheet1", "C1") == Decimal(50)
+    assert wb.get_cell_value("Sheet1", "D1") == Decimal(6)
+
+
+def test_move_notifies_recomputed_cells(wb):
+    wb.set_cell_contents("Sheet1", "A1", "1")
+    wb.set_cell_contents("Sheet1", "C1", "=B1 + 1")
+    notified = []
+    wb.notify_cells_changed(lambda _, cells: notified.append(set(cells)))
+    wb.move_cells("Sheet1", "A1", "A1", "B1")
+    assert set().union(*notified) == {("Sheet1", "a1"), ("Sheet1", "b1"), ("Sheet1", "c1")}
+    assert wb.get_cell_value("Sheet1", "C1") == Decimal(2)
+
+
+def reloaded(wb):
+    fp = io.StringIO()
+    wb.save_workbook(fp)
+    fp.seek(0)
+    return sheets.Workbook.load_workbook(fp)
+
+
+def shown(value):
+    if isinstance(value, sheets.CellError):
+        return value.get_type()
+    return value
+
+
+@pytest.mark.parametrize("formula", ["=IF(B1, 1, A1)", "=OR(B1, A1)"])
+def test_conditional_cycle_is_broken(wb, formula):
+    wb.set_cell_contents("Sheet1", "A1", formula)
+    assert shown(wb.get_cell_value("Sheet1", "A1")) == sheets.CellErrorType.CIRCULAR_REFERENCE
+    wb.set_cell_contents("Sheet1", "B1", "TRUE")
+    assert shown(wb.get_cell_value("Sheet1", "A1")) == shown(reloaded(wb).get_cell_value("Sheet1", "A1"))
+    assert wb.get_cell_value("Sheet1", "A1") in (Decimal(1), True)
+
+
+def test_error_ahead_of_a_cycle(wb):
+    wb.new_sheet("Sheet2")
+    wb.set_cell_contents("Sheet2", "B1", "=A$3")
+    wb.set_cell_contents("Sheet2", "A3", "=(1 * AND(Sheet2!C4:C1, C3:B1))")
+    wb.set_cell_contents("Sheet2", "C2", "=#REF!")
+    for location in ["A3", "B1"]:
+        assert shown(wb.get_cell_value("Sheet2", location)) == sheets.CellErrorType.BAD_REFERENCE
+
+
+def test_cycle_through_a_renamed_sheet(wb):
+    wb.new_sheet("Sheet2")
+    wb.set_cell_contents("Sheet2", "B4", "5")
+    wb.set_cell_contents("Sheet2", "A1", "=IF(Sheet2!B4, $B$4, Sheet2!A2)")
+    wb.set_cell_contents("Sheet2", "A2", "=Sheet2!A1")
+    wb.set_cell_contents("Sheet2", "B4", "0")
+    wb.rename_sheet("Sheet2", "Zed")
+    wb.set_cell_contents("Zed", "B4", "5")
+    wb.set_cell_contents("Zed", "C1", "=$B$4")
+    assert wb.get_cell_value("Zed", "A1") == Decimal(5)
+    assert wb.get_cell_value("Zed", "A2") == Decimal(5)
+    assert wb.get_cell_value("Zed", "C1") == Decimal(5)
+
+
+LOCATIONS = [f"{col}{row}" for col in "ABC" for row in range(1, 5)]
+
+
+def random_contents(rng):
+    def ref():
+        location = rng.choice(LOCATIONS)
+        return rng.choice([location, f"{location}:{rng.choice(LOCATIONS)}", f"Sheet2!{location}"])
+
+    return rng.choice([
+        str(rng.randint(0, 3)),
+        rng.choice(["TRUE", "FALSE", None, "=1 +"]),
+        f"=IF({ref()}, {ref()}, {ref()})",
+        f"={rng.choice(['AND', 'OR', 'XOR'])}({ref()}, {ref()})",
+        f"=SUM({ref()})",
+        f"=IFERROR({ref()}, 1)",
+        f"={ref()} + 1",
+    ])
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_edits_match_a_reload(seed):
+    rng = random.Random(seed)
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    wb.new_sheet("Sheet2")
+    for _ in range(30):
+        names = wb.list_sheets()
+        if rng.random() < 0.05:
+            new_name = rng.choice(["Sheet1", "Sheet2", "Zed"])
+            if new_name not in names:
+                wb.rename_sheet(rng.choice(names), new_name)
+        else:
+            wb.set_cell_contents(rng.choice(names), rng.choice(LOCATIONS), random_contents(rng))
+        loaded = reloaded(wb)
+        for name in wb.list_sheets():
+            for location in LOCATIONS:
+                assert shown(wb.get_cell_value(name, location)) == shown(loaded.get_cell_value(name, location))
@@ -0,0 +1,110 @@
+import context
+import pytest
+import sheets
+from sheets.Parser import parser, FormulaEvaluator, FormulaToTemplate
+from sheets.Compiler import FormulaCompiler
+from sheets.Functions import function_directory
+from sheets.CellError import CellError
+from decimal import Decimal
+
+FORMULAS = [
+    "=1 + 2 * 3",
+    "=-A1 / (A2 - 4)",
+    "=A1 / 0",
+    '="total: " & A1 & A3',
+    "=A1 < A2",
+    '=A3 = "HELLO"',
+    "=Sheet2!A1 + A1",
+    "=SUM(A1:A4, 2)",
+    "=IF(A4, A1, A2)",
+    "=IFERROR(A1 / 0, #REF!)",
+    "=VLOOKUP(2, A1:B4, 2)",
+    '=INDIRECT("A" & A1)',
+    "=NOSUCHFUNCTION(1)",
+    "=#value! + #div/0!",
+    "=B10 + 1",
+    "=MissingSheet!A1",
+    "=(A1 + 5) / 2 - 6 * IF(TRUE, 2, 4) - 1/7 + IFERROR(False, 1) - 6 "
+    "+ IF(FALSE, 0 , (1*6-4 * 1/2 + (6*1 - 2/(5+1) * 1000)))",
+    "=A1 + 1 / 0",
+    '=(-(-2)) & "x" & TRUE',
+    '=SUM(1, "2", 3.50) * AVERAGE(2, 4)',
+    "=IF(FALSE, A1, CHOOSE(2, A2, 7))",
+    '=ISBLANK("") + NOT(1 = 2) + VERSION()',
+    "=1 + #REF!",
+]
+
+
+@pytest.fixture
+def workbook():
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    wb.new_sheet("Sheet2")
+    wb.set_cell_contents("Sheet1", "A1", "2")
+    wb.set_cell_contents("Sheet1", "A2", "4.5")
+    wb.set_cell_contents("Sheet1", "A3", "hello")
+    wb.set_cell_contents("Sheet1", "A4", "true")
+    wb.set_cell_contents("Sheet1", "B2", "=A1 * 10")
+    wb.set_cell_contents("Sheet2", "A1", "7")
+    return wb
+
+
+@pytest.mark.parametrize("formula", FORMULAS)
+def test_compiled_matches_interpreted(workbook, formula):
+    tree = parser.parse(formula)
+    template = FormulaToTemplate(3, 5).transform(tree)
+    interpreter = FormulaEvaluator(workbook, "sheet1", function_directory)
+    evaluator = FormulaEvaluator(workbook, "sheet1", function_directory, "e3")
+
+    expected = interpreter.visit(tree)
+    actual = FormulaCompiler().compile(template).evaluate(evaluator)
+
+    if isinstance(expected, CellError):
+        assert isinstance(actual, CellError)
+        assert actual.get_type() == expected.get_type()
+    else:
+        assert actual == expected
+    assert evaluator.get_cell_refs() == interpreter.get_cell_refs()
+
+
+def test_compiled_formula_shared_between_cells():
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    for row in range(1, 11):
+        wb.set_cell_contents("Sheet1", f"A{row}", str(row))
+        wb.set_cell_contents("Sheet1", f"B{row}", f"=A{row} * 2 + $A$1")
+
+    sheet = wb.sheets["sheet1"]
+    templates = {id(sheet.get_cell(f"b{row}").get_formula_template()) for row in range(1, 11)}
+    assert len(templates) == 1
+
+    wb.set_cell_contents("Sheet1", "A1", "4")
+    assert wb.get_cell_value("Sheet1", "B1") == Decimal(12)
+    assert wb.get_cell_value("Sheet1", "B10") == Decimal(24)
+
+
+def test_constant_subtrees_are_folded():
+    compiler = FormulaCompiler()
+    compiled = compiler.compile(parser.parse("=(6*1 - 2/(5+1) * 1000) + IF(TRUE, 2, 4)"))
+    assert compiled.root.value == Decimal(6) - Decimal(2) / Decimal(6) * 1000 + 2
+
+    # Only the constant half of an expression with a reference is folded
+    template = FormulaToTemplate(1, 1).transform(parser.parse("=A2 * (1 + 2)"))
+    compiled = compiler.compile(template)
+    assert not hasattr(compiled.root, "value")
+
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    wb.set_cell_contents("Sheet1", "A2", "2")
+    wb.set_cell_contents("Sheet1", "A1", "=A2 * (1 + 2)")
+    assert wb.get_cell_value("Sheet1", "A1") == Decimal(6)
+
+
+def test_functions_reading_the_workbook_are_not_folded():
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    wb.set_cell_contents("Sheet1", "A1", '=INDIRECT("B1")')
+    wb.set_cell_contents("Sheet1", "B1", "3")
+    assert wb.get_cell_value("Sheet1", "A1") == Decimal(3)
+    wb.set_cell_contents("Sheet1", "B1", "4")
+    assert wb.get_cell_value("Sheet1", "A1") == Decimal(4)
@@ -0,0 +1,94 @@
+import context
+import pytest
+import sheets
+from decimal import Decimal
+from sheets.CriteriaIndex import parse_criterion, NUMBER, TEXT, BOOLEAN, EMPTY
+
+
+@pytest.fixture
+def wb():
+    wb = sheets.Workbook()
+    wb.new_sheet("Table")
+    wb.new_sheet("Sheet1")
+    rows = [
+        ("apple", "red", "3"),
+        ("pear", "green", "5"),
+        ("Apple", "green", "7"),
+        ("plum", "red", "hello"),
+        ("apple", "red", "11"),
+        ("5", "blue", "13"),
+    ]
+    for row, (fruit, colour, amount) in enumerate(rows, start=1):
+        wb.set_cell_contents("Table", f"A{row}", fruit)
+        wb.set_cell_contents("Table", f"B{row}", colour)
+        wb.set_cell_contents("Table", f"C{row}", amount)
+    return wb
+
+
+def value(wb, formula):
+    wb.set_cell_contents("Sheet1", "A1", formula)
+    return wb.get_cell_value("Sheet1", "A1")
+
+
+def test_parse_criterion():
+    assert parse_criterion(Decimal(5)) == ("=", (NUMBER, Decimal(5)))
+    assert parse_criterion(">=10") == (">=", (NUMBER, Decimal(10)))
+    assert parse_criterion("<>Apple") == ("<>", (TEXT, "apple"))
+    assert parse_criterion("=true") == ("=", (BOOLEAN, True))
+    assert parse_criterion("") == ("=", (EMPTY, None))
+    assert parse_criterion("<>") == ("<>", (EMPTY, None))
+
+
+@pytest.mark.parametrize(
+    "formula, expected",
+    [
+        ('=SUMIF(Table!A1:A6, "apple", Table!C1:C6)', Decimal(21)),
+        ('=SUMIF(Table!A1:A6, "apple", Table!C1:C2)', Decimal(21)),
+        ('=SUMIF(Table!C1:C6, ">5")', Decimal(31)),
+        ('=COUNTIF(Table!A1:B6, "red")', Decimal(3)),
+        ('=COUNTIF(Table!A1:A6, "<>apple")', Decimal(3)),
+        ("=COUNTIF(Table!A1:A6, 5)", Decimal(1)),
+        ('=COUNTIF(Table!A1:A10, "")', Decimal(4)),
+        ('=AVERAGEIF(Table!B1:B6, "green", Table!C1:C6)', Decimal(6)),
+        ('=SUMIFS(Table!C1:C6, Table!A1:A6, "apple", Table!B1:B6, "red")', Decimal(14)),
+        ('=COUNTIFS(Table!A1:A6, "apple", Table!C1:C6, "<10")', Decimal(2)),
+        ('=AVERAGEIFS(Table!C1:C6, Table!B1:B6, "red", Table!C1:C6, ">0")', Decimal(7)),
+    ],
+)
+def test_conditional_aggregates(wb, formula, expected):
+    assert value(wb, formula) == expected
+
+
+@pytest.mark.parametrize(
+    "formula, error",
+    [
+        ('=AVERAGEIF(Table!A1:A6, "kiwi", Table!C1:C6)', sheets.CellErrorType.DIVIDE_BY_ZERO),
+        ('=SUMIFS(Table!C1:C6, Table!A1:A5, "apple")', sheets.CellErrorType.TYPE_ERROR),
+        ('=COUNTIFS(Table!A1:A6, "apple", Table!B1:B6)', sheets.CellErrorType.TYPE_ERROR),
+        ('=SUMIF(1, "apple")', sheets.CellErrorType.TYPE_ERROR),
+        ("=COUNTIF(Table!A1:A6, #REF!)", sheets.CellErrorType.BAD_REFERENCE),
+        ('=COUNTIF(Missing!A1:A6, "apple")', sheets.CellErrorType.BAD_REFERENCE),
+    ],
+)
+def test_conditional_aggregate_errors(wb, formula, error):
+    assert value(wb, formula).get_type() == error
+
+
+def test_formulas_share_column_indexes(wb):
+    for row in range(1, 11):
+        wb.set_cell_contents("Sheet1", f"A{row}", f'=SUMIFS(Table!$C$1:$C$6, Table!$A$1:$A$6, "apple", Table!$B$1:$B$6, "red")')
+    stats = wb.get_criteria_index_stats()
+    assert stats["misses"] == 2
+    assert stats["hits"] == 18
+
+
+def test_conditional_aggregates_follow_changes(wb):
+    wb.set_cell_contents("Sheet1", "A1", '=SUMIF(Table!A1:A6, "apple", Table!C1:C6)')
+    wb.set_cell_contents("Table", "C1", "100")
+    assert wb.get_cell_value("Sheet1", "A1") == Decimal(118)
+    wb.set_cell_contents("Table", "A2", "APPLE")
+    assert wb.get_cell_value("Sheet1", "A1") == Decimal(123)
+    wb.set_cell_contents("Table", "C4", "#REF!")
+    assert wb.get_cell_value("Sheet1", "A1") == Decimal(123)
+    wb.set_cell_contents("Table", "A4", "apple")
+    assert wb.get_cell_value("Sheet1", "A1").get_type() == sheets.CellErrorType.BAD_REFERENCE
@@ -0,0 +1,65 @@
+import context
+import pytest
+import sheets
+from sheets.Parser import parser, FormulaToTemplate
+from sheets.FormulaTemplate import FormulaTemplate
+from decimal import Decimal
+
+
+def make_template(formula, row, col):
+    tree = FormulaToTemplate(row, col).transform(parser.parse(formula))
+    return FormulaTemplate(tree, None)
+
+
+def test_template_is_relative_to_its_cell():
+    # =A1 + $B1 * C$2 in D4 and =B2 + $B2 * D$2 in E5 are the same template
+    first = make_template("=A1 + $B1 * C$2 + $E$5", 4, 4)
+    second = make_template("=B2+$B2*D$2+$E$5", 5, 5)
+    assert first.tree == second.tree
+    assert first.render(4, 4) == "=A1+$B1*C$2+$E$5"
+    assert first.render(10, 6) == "=C7+$B7*E$2+$E$5"
+
+
+def test_template_fits():
+    template = make_template("=A1 + SUM(B1:C3)", 2, 2)
+    assert template.fits(2, 2)
+    assert template.fits(9997, 475253)
+    assert not template.fits(1, 2)
+    assert not template.fits(2, 1)
+    assert not template.fits(9999, 2)
+
+
+def test_copy_cells_shares_templates_without_parsing():
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    for row in range(1, 6):
+        wb.set_cell_contents("Sheet1", f"A{row}", str(row))
+        wb.set_cell_contents("Sheet1", f"B{row}", f"=a{row} * 10")
+    misses = wb.get_parse_cache_stats()["misses"]
+
+    wb.copy_cells("Sheet1", "A1", "B5", "C3")
+    assert wb.get_parse_cache_stats()["misses"] == misses
+
+    sheet = wb.sheets["sheet1"]
+    assert sheet.get_cell("d7").get_formula_template() is sheet.get_cell("b5").get_formula_template()
+    # Text is only built on request
+    assert sheet.get_cell("d7").contents is None
+    assert wb.get_cell_value("Sheet1", "D7") == Decimal(50)
+    assert wb.get_cell_contents("Sheet1", "D7") == "=C7*10"
+    # The original text of the copied cells is untouched
+    assert wb.get_cell_contents("Sheet1", "B5") == "=a5 * 10"
+
+    wb.set_cell_contents("Sheet1", "C7", "2")
+    assert wb.get_cell_value("Sheet1", "D7") == Decimal(20)
+
+
+def test_copy_off_the_sheet_becomes_ref_error():
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    wb.set_cell_contents("Sheet1", "B2", "=A1 + $A$1")
+    wb.move_cells("Sheet1", "B2", "B2", "A1")
+    assert wb.get_cell_contents("Sheet1", "A1") == "=#REF!+$A$1"
+
+    # Moving it back doesn't bring the reference back
+    wb.move_cells("Sheet1", "A1", "A1", "B2")
+    assert wb.get_cell_contents("Sheet1", "B2") == "=#REF!+$A$1"
@@ -0,0 +1,140 @@
+import context
+import pytest
+import sheets
+from decimal import Decimal
+from sheets.Functions import SheetFunction, function_directory
+from sheets.FunctionRegistry import FunctionInfo, FunctionRegistry, FunctionResultCache
+
+
+class DOUBLE(SheetFunction):
+    calls = 0
+
+    def func(self, args):
+        DOUBLE.calls += 1
+        return args[0] * 2
+
+
+class FIRST(SheetFunction):
+    def func(self, args):
+        return self.eval_arg(args[0])
+
+
+@pytest.fixture
+def double():
+    DOUBLE.calls = 0
+    function_directory.register("DOUBLE", DOUBLE, min_args=1, max_args=1, memoize=True)
+    yield
+    del function_directory.functions["DOUBLE"]
+
+
+@pytest.fixture
+def first():
+    function_directory.register("FIRST", FIRST, min_args=1, lazy=True)
+    yield
+    del function_directory.functions["FIRST"]
+
+
+@pytest.fixture
+def wb():
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    return wb
+
+
+def test_registry_lookup_is_case_insensitive():
+    registry = FunctionRegistry()
+    info = registry.register("Double", DOUBLE, min_args=1)
+    assert registry.get("double") is info
+    assert "DOUBLE" in registry
+    assert registry.get("TRIPLE") is None
+    assert list(registry) == ["DOUBLE"]
+
+
+def test_invalid_declarations():
+    with pytest.raises(ValueError):
+        FunctionInfo("INDIRECT", DOUBLE, pure=False, memoize=True)
+    with pytest.raises(ValueError):
+        FunctionInfo("IF", DOUBLE, lazy=True, memoize=True)
+    with pytest.raises(ValueError):
+        FunctionResultCache(capacity=0)
+
+
+def test_builtin_metadata():
+    assert function_directory.get("SUM").pure
+    assert not function_directory.get("INDIRECT").pure
+    assert function_directory.get("VLOOKUP").pure
+    assert function_directory.get("SUMIF").pure
+    assert function_directory.get("IF").max_args == 3
+    assert function_directory.get("IF").lazy
+    assert not function_directory.get("SUM").lazy
+    assert function_directory.get("SUM").memoize
+    assert not function_directory.get("NOT").memoize
+
+
+def test_laziness_is_declared_when_registered(wb, first):
+    wb.set_cell_contents("Sheet1", "A1", "=FIRST(B1, 1/0)")
+    wb.set_cell_contents("Sheet1", "B1", "3")
+    assert wb.get_cell_value("Sheet1", "A1") == Decimal(3)
+
+
+@pytest.mark.parametrize(
+    "formula",
+    ["=IF(TRUE)", "=IF(TRUE, 1, 2, 3)", "=NOT()", "=SUM()", "=VLOOKUP(1, A1:B2)", "=VERSION(1)"],
+)
+def test_wrong_number_of_arguments(wb, formula):
+    wb.set_cell_contents("Sheet1", "A1", formula)
+    assert wb.get_cell_value("Sheet1", "A1").get_type() == sheets.CellErrorType.TYPE_ERROR
+
+
+def test_unknown_function(wb):
+    wb.set_cell_contents("Sheet1", "A1", "=TRIPLE(1)")
+    assert wb.get_cell_value("Sheet1", "A1").get_type() == sheets.CellErrorType.BAD_NAME
+
+
+def test_memoized_results(wb, double):
+    wb.set_cell_contents("Sheet1", "A1", "5")
+    for row in range(1, 11):
+        wb.set_cell_contents("Sheet1", f"B{row}", "=DOUBLE(A1)")
+    assert wb.get_cell_value("Sheet1", "B10") == Decimal(10)
+    assert DOUBLE.calls == 1
+
+    wb.set_cell_contents("Sheet1", "A1", "6")
+    assert wb.get_cell_value("Sheet1", "B10") == Decimal(12)
+    assert DOUBLE.calls == 2
+    stats = wb.get_function_result_stats()
+    assert stats["misses"] == 2
+    assert stats["size"] == 2
+
+
+def test_memoized_results_keep_argument_types(wb, double):
+    wb.set_cell_contents("Sheet1", "C1", "1")
+    wb.set_cell_contents("Sheet1", "C2", "'1")
+    wb.set_cell_contents("Sheet1", "C3", "TRUE")
+    for row in range(1, 4):
+        wb.set_cell_contents("Sheet1", f"A{row}", f"=DOUBLE(C{row})")
+    assert wb.get_cell_value("Sheet1", "A1") == Decimal(2)
+    assert wb.get_cell_value("Sheet1", "A2") == Decimal(11)
+    assert DOUBLE.calls == 3
+
+
+def test_aggregates_of_ranges_are_not_memoized(wb):
+    wb.set_cell_contents("Sheet1", "A1", "1")
+    wb.set_cell_contents("Sheet1", "B1", "=SUM(A1, 2)")
+    wb.set_cell_contents("Sheet1", "B2", "=SUM(A1, 2)")
+    wb.set_cell_contents("Sheet1", "B3", "=SUM(A1:A2)")
+    wb.set_cell_contents("Sheet1", "A2", "5")
+    assert wb.get_cell_value("Sheet1", "B2") == Decimal(3)
+    assert wb.get_cell_value("Sheet1", "B3") == Decimal(6)
+    stats = wb.get_function_result_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_calls_reading_ranges_are_not_folded(wb):
+    wb.set_cell_contents("Sheet1", "A1", "1")
+    wb.set_cell_contents("Sheet1", "B1", "x")
+    wb.set_cell_contents("Sheet1", "C1", "=VLOOKUP(1, A1:B1, 2)")
+    wb.set_cell_contents("Sheet1", "C2", '=SUMIF(A1:A2, ">0")')
+    wb.set_cell_contents("Sheet1", "B1", "y")
+    wb.set_cell_contents("Sheet1", "A2", "4")
+    assert wb.get_cell_value("Sheet1", "C1") == "y"
+    assert wb.get_cell_value("Sheet1", "C2") == Decimal(5)
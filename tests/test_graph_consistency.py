@@ -0,0 +1,66 @@
+import context
+import pytest
+import sheets
+from decimal import Decimal
+from sheets.Graph import Graph
+
+
+@pytest.fixture
+def wb():
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    wb.new_sheet("Other")
+    return wb
+
+
+def test_edges_are_not_duplicated():
+    g = Graph()
+    for _ in range(3):
+        g.add_connection("sheet1", "b1", "sheet1", "a1")
+        g.add_connection("sheet1", "c1", "sheet1", "a1")
+    assert list(g.get_parents_from_cell("sheet1", "a1")) == [("sheet1", "b1"), ("sheet1", "c1")]
+    g.update_child("sheet1", "b1", "sheet1", "a1")
+    g.update_child("sheet1", "b1", "sheet1", "a1")
+    assert list(g.get_parents_from_cell("sheet1", "a1")) == [("sheet1", "c1")]
+    assert g.check_consistency() == []
+
+
+def test_check_consistency_finds_one_sided_edges():
+    g = Graph()
+    g.add_connection("sheet1", "b1", "sheet1", "a1")
+    g.parent_ids[g.intern("sheet1", "a2")][g.intern("sheet1", "b2")] = None
+    g.child_ids[g.get_node_id("sheet1", "b1")].add(g.intern("sheet1", "a3"))
+    assert g.check_consistency() == [
+        (("sheet1", "b1"), ("sheet1", "a3")),
+        (("sheet1", "b2"), ("sheet1", "a2")),
+    ]
+
+
+def test_high_fan_in(wb):
+    count = 2000
+    for row in range(1, count + 1):
+        wb.set_cell_contents("Sheet1", f"B{row}", "=A1 + 1")
+    for value in range(3):
+        wb.set_cell_contents("Sheet1", "A1", str(value))
+    assert len(wb.graph.get_parents_from_cell("sheet1", "a1")) == count
+    assert wb.get_cell_value("Sheet1", f"B{count}") == Decimal(3)
+
+    for row in range(1, count + 1):
+        wb.set_cell_contents("Sheet1", f"B{row}", "=A2")
+    assert len(wb.graph.get_parents_from_cell("sheet1", "a1")) == 0
+    assert len(wb.graph.get_parents_from_cell("sheet1", "a2")) == count
+    assert wb.graph.check_consistency() == []
+
+
+def test_consistent_after_sheet_operations(wb):
+    wb.set_cell_contents("Sheet1", "A1", "=Other!A1 + Sheet1!B1")
+    wb.set_cell_contents("Other", "A1", "=New!A1")
+    wb.set_cell_contents("Sheet1", "B1", "=A1")
+    wb.rename_sheet("Sheet1", "New")
+    assert wb.graph.check_consistency() == []
+    assert wb.get_cell_value("Other", "A1").get_type() == sheets.CellErrorType.CIRCULAR_REFERENCE
+
+    wb.copy_sheet("New")
+    wb.set_cell_contents("New", "B1", "5")
+    wb.move_cells("New", "A1", "B1", "C3")
+    assert wb.graph.check_consistency() == []
@@ -0,0 +1,69 @@
+import context
+import pytest
+import sheets
+from decimal import Decimal
+from sheets.Functions import resolve_reference
+
+
+@pytest.fixture
+def wb():
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    wb.new_sheet("My Sheet")
+    wb.set_cell_contents("Sheet1", "A1", "1")
+    wb.set_cell_contents("Sheet1", "A2", "2")
+    wb.set_cell_contents("Sheet1", "A3", "3")
+    wb.set_cell_contents("My Sheet", "B2", "20")
+    return wb
+
+
+def test_resolve_reference():
+    assert resolve_reference("A1") == (None, "a1", None)
+    assert resolve_reference("$B$2") == (None, "b2", None)
+    assert resolve_reference("'My Sheet'!B2") == ("'My Sheet'", "b2", None)
+    assert resolve_reference("Sheet1!B3:A1") == ("Sheet1", None, (1, 1, 3, 2))
+    assert resolve_reference("'My Sheet'!A1:$B$2") == ("My Sheet", None, (1, 1, 2, 2))
+    assert resolve_reference("not a reference") is None
+
+
+def test_indirect_values(wb):
+    wb.set_cell_contents("Sheet1", "B1", '=INDIRECT("A2")')
+    wb.set_cell_contents("Sheet1", "B2", "=INDIRECT(\"'My Sheet'!B2\")")
+    wb.set_cell_contents("Sheet1", "B3", '=SUM(INDIRECT("A1:A3"))')
+    wb.set_cell_contents("Sheet1", "B4", '=INDIRECT("A1:A")')
+    assert wb.get_cell_value("Sheet1", "B1") == Decimal(2)
+    assert wb.get_cell_value("Sheet1", "B2") == Decimal(20)
+    assert wb.get_cell_value("Sheet1", "B3") == Decimal(6)
+    assert wb.get_cell_value("Sheet1", "B4").get_type() == sheets.CellErrorType.BAD_REFERENCE
+
+
+def test_indirect_follows_its_target(wb):
+    wb.set_cell_contents("Sheet1", "C1", "'A1")
+    wb.set_cell_contents("Sheet1", "B1", "=INDIRECT(C1)")
+    assert wb.get_cell_value("Sheet1", "B1") == Decimal(1)
+
+    wb.set_cell_contents("Sheet1", "C1", "'A3")
+    assert wb.get_cell_value("Sheet1", "B1") == Decimal(3)
+    wb.set_cell_contents("Sheet1", "A3", "30")
+    assert wb.get_cell_value("Sheet1", "B1") == Decimal(30)
+
+
+def test_old_target_is_no_longer_a_dependency(wb):
+    wb.set_cell_contents("Sheet1", "C1", "'A1")
+    wb.set_cell_contents("Sheet1", "B1", "=INDIRECT(C1)")
+    wb.set_cell_contents("Sheet1", "C1", "'A2")
+    assert ("sheet1", "b1") not in wb.graph.get_parents_from_cell("sheet1", "a1")
+    assert ("sheet1", "b1") in wb.graph.get_parents_from_cell("sheet1", "a2")
+
+    changed = []
+    wb.notify_cells_changed(lambda workbook, cells: changed.extend(cells))
+    wb.set_cell_contents("Sheet1", "A1", "100")
+    assert changed == [("Sheet1", "a1")]
+
+
+def test_edges_are_not_duplicated(wb):
+    wb.set_cell_contents("Sheet1", "B1", '=INDIRECT("A1") + A1')
+    for value in range(5):
+        wb.set_cell_contents("Sheet1", "A1", str(value))
+    assert list(wb.graph.get_parents_from_cell("sheet1", "a1")) == [("sheet1", "b1")]
+    assert wb.get_cell_value("Sheet1", "B1") == Decimal(8)
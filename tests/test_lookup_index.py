@@ -0,0 +1,68 @@
+import context
+import pytest
+import sheets
+from decimal import Decimal
+
+
+@pytest.fixture
+def wb():
+    wb = sheets.Workbook()
+    wb.new_sheet("Table")
+    wb.new_sheet("Sheet1")
+    for row in range(1, 11):
+        wb.set_cell_contents("Table", f"A{row}", f"'key{row}")
+        wb.set_cell_contents("Table", f"B{row}", str(row * 10))
+    return wb
+
+
+def test_lookups_share_one_index(wb):
+    for row in range(1, 11):
+        wb.set_cell_contents("Sheet1", f"A{row}", f'=VLOOKUP("key{row}", Table!$A$1:$B$10, 2)')
+    for row in range(1, 11):
+        assert wb.get_cell_value("Sheet1", f"A{row}") == Decimal(row * 10)
+    stats = wb.get_lookup_index_stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 9
+    assert stats["size"] == 1
+
+
+def test_changing_values_keeps_index(wb):
+    wb.set_cell_contents("Sheet1", "A1", '=VLOOKUP("key3", Table!A1:B10, 2)')
+    wb.set_cell_contents("Table", "B3", "7")
+    assert wb.get_cell_value("Sheet1", "A1") == Decimal(7)
+    assert wb.get_lookup_index_stats()["misses"] == 1
+
+
+def test_changing_keys_rebuilds_index(wb):
+    wb.set_cell_contents("Sheet1", "A1", '=VLOOKUP("key3", Table!A1:B10, 2)')
+    wb.set_cell_contents("Table", "A2", "'key3")
+    assert wb.get_cell_value("Sheet1", "A1") == Decimal(20)
+    wb.set_cell_contents("Table", "A2", None)
+    wb.set_cell_contents("Table", "A3", None)
+    assert wb.get_cell_value("Sheet1", "A1").get_type() == sheets.CellErrorType.TYPE_ERROR
+    wb.set_cell_contents("Table", "A10", "=\"key\" & 3")
+    assert wb.get_cell_value("Sheet1", "A1") == Decimal(100)
+    wb.set_cell_contents("Table", "A1", "=1/0")
+    assert wb.get_cell_value("Sheet1", "A1").get_type() == sheets.CellErrorType.DIVIDE_BY_ZERO
+
+
+def test_hlookup_key_row(wb):
+    for col in "CDE":
+        wb.set_cell_contents("Table", f"{col}1", f"'{col}")
+        wb.set_cell_contents("Table", f"{col}2", f"'row {col}")
+    wb.set_cell_contents("Table", "D2", "=TRUE")
+    wb.set_cell_contents("Sheet1", "A1", '=HLOOKUP("D", Table!C1:E2, 2)')
+    assert wb.get_cell_value("Sheet1", "A1") is True
+    wb.set_cell_contents("Table", "C1", "'D")
+    assert wb.get_cell_value("Sheet1", "A1") == "row C"
+    assert wb.get_lookup_index_stats()["misses"] == 2
+
+
+def test_deleted_sheet_is_not_indexed(wb):
+    wb.set_cell_contents("Sheet1", "A1", '=VLOOKUP("key3", Table!A1:B10, 2)')
+    wb.del_sheet("Table")
+    assert wb.get_cell_value("Sheet1", "A1").get_type() == sheets.CellErrorType.BAD_REFERENCE
+    wb.new_sheet("Table")
+    wb.set_cell_contents("Table", "A4", "'key3")
+    wb.set_cell_contents("Table", "B4", "5")
+    assert wb.get_cell_value("Sheet1", "A1") == Decimal(5)
@@ -0,0 +1,95 @@
+import context
+import pytest
+import sheets
+from decimal import Decimal
+from sheets.Graph import Graph
+
+
+@pytest.fixture
+def wb():
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    return wb
+
+
+def test_intern():
+    g = Graph()
+    a1 = g.intern("s", "a1")
+    assert g.intern("s", "a1") == a1
+    assert g.get_node_id("s", "a1") == a1
+    assert g.get_node(a1) == ("s", "a1")
+    assert g.get_node_id("s", "a2") is None
+    assert g.get_node_id("other", "a1") is None
+
+
+def test_edges_between_ids():
+    g = Graph()
+    g.add_connection("s", "b1", "s", "a1")
+    g.add_range_connection("s", "c1", "s", (1, 1, 2, 1))
+    a1, b1, c1 = (g.get_node_id("s", location) for location in ["a1", "b1", "c1"])
+    assert list(g.get_parent_ids(a1)) == [b1, c1]
+    assert g.get_child_ids(b1) == {a1}
+    assert g.children_to_parents == {"s": {"a1": {("s", "b1"): None}}}
+    assert g.parents_to_children == {"s": {"b1": {("s", "a1")}}}
+
+
+def test_ids_of_cells_without_edges_are_reused():
+    g = Graph()
+    g.add_connection("s", "b1", "s", "a1")
+    b1 = g.get_node_id("s", "b1")
+    g.remove_children("s", "b1")
+    # Not until they are released
+    assert g.get_node_id("s", "b1") == b1
+    g.release_unused()
+    assert g.get_node_id("s", "a1") is None
+    assert g.get_node_id("s", "b1") is None
+
+    g.add_connection("s", "d1", "s", "c1")
+    assert len(g.nodes) == 2
+    assert g.get_parents_from_cell("s", "c1") == {("s", "d1"): None}
+    assert g.get_order("s", "c1") < g.get_order("s", "d1")
+    assert g.check_order() == []
+
+
+def test_rename_keeps_ids(wb):
+    wb.set_cell_contents("Sheet1", "A1", "=B1 + New!A1")
+    wb.set_cell_contents("Sheet1", "B1", "2")
+    a1 = wb.graph.get_node_id("sheet1", "a1")
+    b1 = wb.graph.get_node_id("sheet1", "b1")
+    wb.rename_sheet("Sheet1", "New")
+    assert wb.graph.get_node_id("new", "b1") == b1
+    # The cell referenced under the new name is merged with it
+    assert wb.graph.get_node_id("new", "a1") == a1
+    assert wb.graph.get_node_id("sheet1", "a1") is None
+    assert wb.graph.check_consistency() == []
+    wb.set_cell_contents("New", "B1", "3")
+    assert wb.get_cell_value("New", "A1").get_type() == sheets.CellErrorType.CIRCULAR_REFERENCE
+
+
+def test_workbook_releases_cells(wb):
+    for row in range(1, 101):
+        wb.set_cell_contents("Sheet1", f"B{row}", f"=A{row} * 2")
+    for row in range(1, 101):
+        wb.set_cell_contents("Sheet1", f"B{row}", None)
+    assert wb.graph.node_ids[wb.graph.sheet_ids["sheet1"]] == {}
+    for row in range(1, 101):
+        wb.set_cell_contents("Sheet1", f"D{row}", f"=C{row} + 1")
+    assert len(wb.graph.nodes) <= 201
+    wb.set_cell_contents("Sheet1", "C7", "4")
+    assert wb.get_cell_value("Sheet1", "D7") == Decimal(5)
+    assert wb.graph.check_consistency() == []
+
+
+def test_rename_only_changes_the_sheet_name():
+    g = Graph()
+    for row in range(1, 50):
+        g.add_connection("s", f"a{row + 1}", "s", f"a{row}")
+    g.add_range_connection("other", "a1", "s", (1, 1, 10, 1))
+    nodes = list(g.nodes)
+    g.rename_sheet("s", "t")
+    # Every node is kept by sheet ID, so none of them changes
+    assert g.nodes == nodes
+    assert not g.has_sheet("s")
+    assert g.get_parents_from_cell("t", "a5") == {("t", "a6"): None, ("other", "a1"): None}
+    assert g.get_ranges_from_cell("other", "a1") == {("t", (1, 1, 10, 1))}
+    assert g.check_consistency() == []
@@ -0,0 +1,108 @@
+import context
+import io
+import pytest
+import sheets
+from decimal import Decimal
+
+
+def make_workbook(numeric_mode):
+    wb = sheets.Workbook(numeric_mode)
+    wb.new_sheet("Sheet1")
+    return wb
+
+
+def value(wb, formula):
+    wb.set_cell_contents("Sheet1", "Z1", formula)
+    return wb.get_cell_value("Sheet1", "Z1")
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        sheets.Workbook("binary")
+
+
+def test_decimal_mode_is_the_default():
+    wb = make_workbook("decimal")
+    wb.set_cell_contents("Sheet1", "A1", "1.50")
+    assert wb.get_cell_value("Sheet1", "A1") == Decimal("1.5")
+    assert value(wb, "=0.1 + 0.2") == Decimal("0.3")
+    assert type(value(wb, "=A1 * 2")) is Decimal
+    assert sheets.Workbook().numeric is wb.numeric
+
+
+@pytest.mark.parametrize(
+    "formula, expected",
+    [
+        ("=A1 + A2", 5.5),
+        ("=A1 / 2", 0.75),
+        ("=-A1 * 0", 0.0),
+        ('=A2 & "x"', "4x"),
+        ("=SUM(A1:A3)", 5.5),
+        ("=AVERAGE(A1:A2)", 2.75),
+        ("=MAX(A1:A3, 10)", 10.0),
+        ('=SUMIF(A1:A3, ">2")', 4.0),
+        ('=COUNTIF(A1:A3, ">0")', 2.0),
+        ("=IF(A1, A2, 0)", 4.0),
+        ("=A2 = 4", True),
+        ("=CHOOSE(A2 - 2, 7, 8)", 8.0),
+    ],
+)
+def test_float_mode(formula, expected):
+    wb = make_workbook("float")
+    wb.set_cell_contents("Sheet1", "A1", "1.5")
+    wb.set_cell_contents("Sheet1", "A2", "4")
+    result = value(wb, formula)
+    assert result == expected
+    assert type(result) is type(expected)
+
+
+def test_float_mode_is_inexact():
+    wb = make_workbook("float")
+    assert value(wb, "=0.1 + 0.2") == 0.1 + 0.2
+    assert value(wb, "=1/0").get_type() == sheets.CellErrorType.DIVIDE_BY_ZERO
+    assert value(wb, '="abc" + 1').get_type() == sheets.CellErrorType.TYPE_ERROR
+
+
+@pytest.mark.parametrize(
+    "formula, expected",
+    [
+        ("=A1 + A2", 10),
+        ("=A1 * A2 - 1", 23),
+        ("=A1 / 2", 3),
+        ("=A1 / 4", Decimal("1.5")),
+        ("=A3 * 2", 5),
+        ("=A3 + 1", Decimal("3.5")),
+        ("=SUM(A1:A3)", Decimal("12.5")),
+        ("=AVERAGE(A1:A2)", 5),
+        ("=MIN(A1:A3)", Decimal("2.5")),
+        ('=COUNTIF(A1:A3, ">3")', 2),
+    ],
+)
+def test_hybrid_mode(formula, expected):
+    wb = make_workbook("hybrid")
+    wb.set_cell_contents("Sheet1", "A1", "6")
+    wb.set_cell_contents("Sheet1", "A2", "4")
+    wb.set_cell_contents("Sheet1", "A3", "2.50")
+    result = value(wb, formula)
+    assert result == expected
+    assert type(result) is type(expected)
+
+
+def test_hybrid_mode_keeps_large_integers_exact():
+    wb = make_workbook("hybrid")
+    wb.set_cell_contents("Sheet1", "A1", "9" * 40)
+    assert value(wb, "=A1 + 1") == 10 ** 40
+    assert value(wb, "=A1 * A1") == (10 ** 40 - 1) ** 2
+
+
+def test_load_workbook_numeric_mode():
+    wb = make_workbook("float")
+    wb.set_cell_contents("Sheet1", "A1", "2")
+    wb.set_cell_contents("Sheet1", "A2", "=A1 / 8")
+    fp = io.StringIO()
+    wb.save_workbook(fp)
+
+    loaded = sheets.Workbook.load_workbook(fp, numeric_mode="hybrid")
+    assert loaded.get_cell_value("Sheet1", "A1") == 2
+    assert type(loaded.get_cell_value("Sheet1", "A1")) is int
+    assert loaded.get_cell_value("Sheet1", "A2") == Decimal("0.25")
@@ -0,0 +1,84 @@
+import context
+import pytest
+import lark
+import sheets
+import sheets.ParseCache
+from sheets.Parser import parser
+from sheets.ParseCache import ParseCache
+from sheets.CellErrorType import CellErrorType
+from decimal import Decimal
+
+
+def test_identical_formulas_parse_once():
+    cache = ParseCache(parser)
+    first = cache.parse("=A1 + 1")
+    second = cache.parse("  =A1 + 1 ")
+    assert first is second
+    assert cache.get_stats() == {
+        "hits": 1,
+        "misses": 1,
+        "evictions": 0,
+        "size": 1,
+        "capacity": ParseCache.DEFAULT_CAPACITY,
+    }
+
+
+def test_least_recently_used_is_evicted():
+    cache = ParseCache(parser, capacity=2)
+    cache.parse("=1")
+    cache.parse("=2")
+    cache.parse("=1")
+    cache.parse("=3")
+    stats = cache.get_stats()
+    assert stats["evictions"] == 1
+    assert stats["size"] == 2
+    assert "=1" in cache.entries
+    assert "=2" not in cache.entries
+
+    cache.set_capacity(1)
+    assert cache.get_stats()["evictions"] == 2
+    assert list(cache.entries) == ["=3"]
+
+
+def test_parse_errors_are_cached():
+    cache = ParseCache(parser)
+    for _ in range(3):
+        with pytest.raises(lark.exceptions.LarkError):
+            cache.parse("=1 +")
+    assert cache.get_stats()["misses"] == 1
+    assert cache.get_stats()["hits"] == 2
+
+
+def test_workbook_shares_parse_cache():
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    wb.set_cell_contents("Sheet1", "A1", "2")
+    for row in range(1, 51):
+        wb.set_cell_contents("Sheet1", f"B{row}", "=A1 * 2")
+    wb.set_cell_contents("Sheet1", "C1", "=1 +")
+
+    assert wb.get_cell_value("Sheet1", "B50") == Decimal(4)
+    assert wb.get_cell_value("Sheet1", "C1").get_type() == CellErrorType.PARSE_ERROR
+    stats = wb.get_parse_cache_stats()
+    assert stats["misses"] == 2
+    assert stats["hits"] >= 49
+
+
+def test_cached_templates_are_not_transformed_again(monkeypatch):
+    cache = ParseCache(parser)
+    transforms = []
+    transform = sheets.ParseCache.FormulaToTemplate.transform
+
+    def counted(self, tree):
+        transforms.append((self.row, self.col))
+        return transform(self, tree)
+
+    monkeypatch.setattr(sheets.ParseCache.FormulaToTemplate, "transform", counted)
+    absolute = cache.get_template("=$A$1 + 1", 1, 1)
+    assert cache.get_template("=$A$1 + 1", 7, 3) is absolute
+    # Only the columns of =A$1 are relative, so every row of a column shares it
+    column = cache.get_template("=A$1", 2, 2)
+    assert cache.get_template("=A$1", 9, 2) is column
+    assert cache.get_template("=A$1", 2, 3) is not column
+    assert transforms == [(1, 1), (2, 2), (2, 3)]
+    assert cache.get_template("=B1", 2, 2) is cache.get_template("=C2", 3, 3)
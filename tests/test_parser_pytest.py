@@ -1,4 +1,5 @@
 import context
+import sheets
 import sheets.Parser as Parser
 import pytest
 import lark
@@ -6,6 +7,7 @@ import random
 from sheets.CellError import CellError
 from sheets.CellErrorType import *
 import decimal
+import os
 
 def test_simple_addition():
    parser = lark.Lark.open('sheets/formulas.lark', start='formula')
@@ -129,3 +131,102 @@ def test_error_presedence():
 
 
 
+
+
+def test_lalr_matches_earley():
+    earley = lark.Lark.open('sheets/formulas.lark', start='formula', maybe_placeholders=False)
+    formulas = [
+        "=A1 + 5 * -B$2",
+        "=Sheet1!A1 & 'My Sheet'!$B$2 & \"text\"",
+        "=A1!=B1",
+        "=TRUE <> false",
+        "=SUM(A1:B2, Sheet2!C3:D4, 3) / 2",
+        "=IF(A1 >= 2, \"yes\", #REF!)",
+        "=LOG10(5)",
+        "=f()",
+        "=(1 + 2) * 3 < 4 = 5",
+        "=Sheet1 !A1",
+        "='Sheet1' !A1",
+        "=SUM(Sheet1 !A1:A2)",
+    ]
+    for formula in formulas:
+        assert Parser.parser.lalr_parser.parse(formula) == earley.parse(formula)
+        assert Parser.parser.parse(formula) == earley.parse(formula)
+
+
+def test_space_before_sheet_bang():
+    wb = sheets.Workbook()
+    wb.new_sheet()
+    wb.set_cell_contents("Sheet1", "A1", "2")
+    wb.set_cell_contents("Sheet1", "A2", "3")
+    for formula, value in [("=Sheet1 !A1", 2), ("='Sheet1' !A1", 2), ("=SUM(Sheet1 !A1:A2)", 5)]:
+        wb.set_cell_contents("Sheet1", "B1", formula)
+        assert wb.get_cell_value("Sheet1", "B1") == value
+
+
+def test_parser_raises_lark_errors():
+    with pytest.raises(lark.exceptions.LarkError):
+        Parser.parser.parse("=1 +")
+    with pytest.raises(lark.exceptions.LarkError):
+        Parser.parser.parse("=A1 & -B1")
+
+
+def test_parsers_built_lazily():
+    formula_parser = Parser.FormulaParser()
+    assert formula_parser._lalr_parser is None
+    assert formula_parser._earley_parser is None
+    formula_parser.parse("=A1 + 1")
+    # Valid formulas never need the Earley parser
+    assert formula_parser._earley_parser is None
+    with pytest.raises(lark.exceptions.LarkError):
+        formula_parser.parse("=1 +")
+    assert formula_parser._earley_parser is not None
+
+
+def test_earley_grammar_cache(tmp_path, monkeypatch):
+    cache_path = str(tmp_path / "formulas.pickle")
+    monkeypatch.setattr(Parser, "grammar_cache_path", lambda: cache_path)
+    formula = "=SUM(A1:B2, 'My Sheet'!C3) & \"text\""
+
+    cold = Parser.load_earley_parser()
+    with open(cache_path, "rb") as fp:
+        assert fp.read()
+    warm = Parser.load_earley_parser()
+    assert warm.parse(formula) == cold.parse(formula)
+
+    # A corrupt cache is rebuilt rather than breaking the parser
+    with open(cache_path, "wb") as fp:
+        fp.write(b"not a grammar")
+    assert Parser.load_earley_parser().parse(formula) == cold.parse(formula)
+
+
+def test_grammar_cache_path_tracks_grammar(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    path = Parser.grammar_cache_path()
+    assert path == Parser.grammar_cache_path()
+    assert os.path.dirname(path) == str(tmp_path / "sheets")
+    assert os.path.basename(path).startswith("formulas_")
+
+
+def test_grammar_cache_created_private(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    Parser.load_earley_parser()
+    path = Parser.grammar_cache_path()
+    assert os.stat(os.path.dirname(path)).st_mode & 0o777 == 0o700
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+
+def test_grammar_cache_others_can_write_is_not_loaded(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    Parser.load_earley_parser()
+    path = Parser.grammar_cache_path()
+    os.chmod(path, 0o666)
+
+    def refuse(fp):
+        raise AssertionError("loaded a cache others can write to")
+
+    monkeypatch.setattr(Parser.pickle, "load", refuse)
+    assert Parser.load_earley_parser().parse("=A1 + 1")
+    os.chmod(path, 0o600)
+    os.chmod(os.path.dirname(path), 0o777)
+    assert Parser.load_earley_parser().parse("=A1 + 1")
@@ -0,0 +1,70 @@
+import context
+import collections
+import pytest
+import sheets
+from sheets.RangeAggregate import sum_aggregates
+from sheets.RangeRef import RangeRef
+from decimal import Decimal
+
+
+@pytest.fixture
+def wb():
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    for row in range(1, 101):
+        wb.set_cell_contents("Sheet1", f"A{row}", str(row))
+    wb.set_cell_contents("Sheet1", "B1", "=SUM(A1:A100)")
+    wb.set_cell_contents("Sheet1", "B2", "=AVERAGE(A1:A100)")
+    wb.set_cell_contents("Sheet1", "B3", "=MIN(A1:A100)")
+    wb.set_cell_contents("Sheet1", "B4", "=MAX(A1:A100, 0.5)")
+    return wb
+
+
+def values(wb):
+    return [wb.get_cell_value("Sheet1", f"B{row}") for row in range(1, 5)]
+
+
+def test_edits_are_applied_to_aggregates(wb):
+    misses = wb.get_range_aggregate_stats()["misses"]
+    wb.set_cell_contents("Sheet1", "A1", "1.25")
+    wb.set_cell_contents("Sheet1", "A100", None)
+    assert values(wb) == [Decimal("4950.25"), Decimal("4950.25") / 99, Decimal("1.25"), Decimal(99)]
+    wb.set_cell_contents("Sheet1", "A50", "-7")
+    assert values(wb)[2] == Decimal(-7)
+    wb.set_cell_contents("Sheet1", "A50", "50")
+    assert values(wb)[2] == Decimal("1.25")
+    assert wb.get_range_aggregate_stats()["misses"] == misses
+
+
+def test_sum_keeps_exponent_of_plain_sum(wb):
+    wb.set_cell_contents("Sheet1", "A1", "1.25")
+    wb.set_cell_contents("Sheet1", "A1", "1")
+    evaluator = sheets.Parser.FormulaEvaluator(wb, "sheet1", wb.formula_functions)
+    aggregate = RangeRef(evaluator, "sheet1", 1, 1, 100, 1).get_aggregate()
+    assert aggregate.total == Decimal("5050.00")
+    assert str(sum_aggregates([aggregate])) == "5050"
+
+
+def test_text_and_errors_use_regular_path(wb):
+    wb.set_cell_contents("Sheet1", "A1", "'10")
+    assert values(wb)[0] == Decimal(5059)
+    wb.set_cell_contents("Sheet1", "A2", "=1/0")
+    assert values(wb)[0].get_type() == sheets.CellErrorType.DIVIDE_BY_ZERO
+    wb.set_cell_contents("Sheet1", "A1", "1")
+    wb.set_cell_contents("Sheet1", "A2", "2")
+    assert values(wb) == [Decimal(5050), Decimal("50.5"), Decimal(1), Decimal(100)]
+
+
+def test_large_magnitudes_use_regular_path(wb):
+    wb.set_cell_contents("Sheet1", "A1", "1234567890123456789012345")
+    wb.set_cell_contents("Sheet1", "A2", "0.0001")
+    expected = sum([Decimal("1234567890123456789012345"), Decimal("0.0001")] + [Decimal(row) for row in range(3, 101)])
+    assert values(wb)[0] == expected
+
+
+def test_aggregate_rebuilt_once_changes_are_lost(wb):
+    wb.sheets["sheet1"].change_log = collections.deque(maxlen=2)
+    misses = wb.get_range_aggregate_stats()["misses"]
+    wb.set_cell_contents("Sheet1", "A1", "2")
+    assert values(wb)[0] == Decimal(5051)
+    assert wb.get_range_aggregate_stats()["misses"] > misses
@@ -0,0 +1,124 @@
+import context
+import io
+import pytest
+import sheets
+from decimal import Decimal
+from sheets.Graph import Graph
+from sheets.RangeIndex import RangeIndex, get_bucket
+
+
+@pytest.fixture
+def wb():
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    wb.new_sheet("Other")
+    return wb
+
+
+def test_get_bucket():
+    # A single cell is its own block
+    assert get_bucket((5, 3, 5, 3)) == (0, 0, 5, 3)
+    # Rows 4 to 7 are one aligned block of 4 rows, rows 3 to 4 are not
+    assert get_bucket((4, 1, 7, 1))[0] == 2
+    assert get_bucket((3, 1, 4, 1))[0] == 3
+
+
+def test_range_index_find():
+    index = RangeIndex()
+    index.add((1, 1, 100, 1), ("sheet1", "b1"))
+    index.add((1, 1, 100, 1), ("sheet1", "b2"))
+    index.add((50, 1, 60, 3), ("sheet1", "c1"))
+    assert len(index) == 2
+    assert list(index.find(1, 1)) == [("sheet1", "b1"), ("sheet1", "b2")]
+    assert set(index.find(55, 1)) == {("sheet1", "b1"), ("sheet1", "b2"), ("sheet1", "c1")}
+    assert list(index.find(55, 3)) == [("sheet1", "c1")]
+    assert index.find(101, 1) == {}
+
+    index.remove((1, 1, 100, 1), ("sheet1", "b1"))
+    index.remove((1, 1, 100, 1), ("sheet1", "b2"))
+    index.remove((1, 1, 100, 1), ("sheet1", "b2"))
+    assert len(index) == 1
+    assert list(index.find(55, 1)) == [("sheet1", "c1")]
+    index.remove((50, 1, 60, 3), ("sheet1", "c1"))
+    assert not index.buckets and not index.levels
+
+
+def test_large_range_is_one_edge(wb):
+    wb.set_cell_contents("Sheet1", "B1", "=SUM(A1:A9999)")
+    assert wb.graph.get_children_from_cell("sheet1", "b1") == set()
+    assert wb.graph.get_ranges_from_cell("sheet1", "b1") == {("sheet1", (1, 1, 9999, 1))}
+    assert list(wb.graph.get_parents_from_cell("sheet1", "a5000")) == [("sheet1", "b1")]
+    assert list(wb.graph.get_parents_from_cell("sheet1", "b5000")) == []
+
+    wb.set_cell_contents("Sheet1", "A5000", "7")
+    wb.set_cell_contents("Sheet1", "A1", "=A5000 * 2")
+    assert wb.get_cell_value("Sheet1", "B1") == Decimal(21)
+
+    wb.set_cell_contents("Sheet1", "B1", "=1")
+    assert len(wb.graph.get_range_index("sheet1")) == 0
+    assert wb.graph.check_consistency() == []
+
+
+def test_ranges_on_other_sheets(wb):
+    wb.set_cell_contents("Sheet1", "A1", "=SUM(Other!A1:B2) + COUNTIF(Other!B1:B9, \">1\")")
+    wb.set_cell_contents("Other", "B2", "3")
+    assert wb.get_cell_value("Sheet1", "A1") == Decimal(4)
+    wb.set_cell_contents("Other", "B9", "5")
+    assert wb.get_cell_value("Sheet1", "A1") == Decimal(5)
+
+
+def test_cycle_through_a_range(wb):
+    wb.set_cell_contents("Sheet1", "A5", "=SUM(A1:A10)")
+    assert wb.get_cell_value("Sheet1", "A5").get_type() == sheets.CellErrorType.CIRCULAR_REFERENCE
+    wb.set_cell_contents("Sheet1", "A5", "=SUM(A1:A4)")
+    assert wb.get_cell_value("Sheet1", "A5") == Decimal(0)
+
+
+def test_short_circuit_grows_its_range(wb):
+    wb.set_cell_contents("Sheet1", "A1", "FALSE")
+    wb.set_cell_contents("Sheet1", "B1", "=AND(A1:A10)")
+    assert wb.get_cell_value("Sheet1", "B1") is False
+    # Only the rows read are referenced
+    assert wb.graph.get_ranges_from_cell("sheet1", "b1") == {("sheet1", (1, 1, 1, 1))}
+    wb.set_cell_contents("Sheet1", "A1", "TRUE")
+    assert wb.get_cell_value("Sheet1", "B1") is True
+    assert wb.graph.get_ranges_from_cell("sheet1", "b1") == {("sheet1", (1, 1, 10, 1))}
+
+
+def test_rename_keeps_ranges(wb):
+    wb.set_cell_contents("Sheet1", "A1", "=SUM(B1:B5) + SUM(Other!A1:A5)")
+    wb.set_cell_contents("Other", "B1", "=SUM(Sheet1!C1:C3)")
+    wb.rename_sheet("Sheet1", "Renamed")
+    assert wb.graph.check_consistency() == []
+    assert wb.graph.get_range_index("sheet1") is None
+    wb.set_cell_contents("Renamed", "B3", "2")
+    wb.set_cell_contents("Other", "A2", "3")
+    assert wb.get_cell_value("Renamed", "A1") == Decimal(5)
+    wb.set_cell_contents("Renamed", "C2", "4")
+    assert wb.get_cell_value("Other", "B1") == Decimal(4)
+
+
+def test_load_orders_cells_inside_ranges(wb):
+    wb.set_cell_contents("Sheet1", "A1", "=SUM(A2:A4)")
+    wb.set_cell_contents("Sheet1", "A2", "=A3 + 1")
+    wb.set_cell_contents("Sheet1", "A3", "=A4 * 2")
+    wb.set_cell_contents("Sheet1", "A4", "5")
+    fp = io.StringIO()
+    wb.save_workbook(fp)
+    fp.seek(0)
+    loaded = sheets.Workbook.load_workbook(fp)
+    assert loaded.get_cell_value("Sheet1", "A1") == Decimal(26)
+    assert loaded.graph.check_consistency() == []
+
+
+def test_range_edges_in_graph():
+    g = Graph()
+    g.add_range_connection("sheet1", "a1", "sheet2", (1, 1, 10, 10))
+    g.add_connection("sheet1", "a2", "sheet2", "c3")
+    assert list(g.get_parents_from_cell("sheet2", "c3")) == [("sheet1", "a2"), ("sheet1", "a1")]
+    assert g.get_sheet_parents("sheet2") == {("sheet1", "a1"), ("sheet1", "a2")}
+    g.set_range_children("sheet1", "a1", {("sheet2", (5, 5, 6, 6))})
+    assert list(g.get_parents_from_cell("sheet2", "c3")) == [("sheet1", "a2")]
+    g.remove_children("sheet1", "a1")
+    assert list(g.get_parents_from_cell("sheet2", "e5")) == []
+    assert g.check_consistency() == []
@@ -0,0 +1,73 @@
+import context
+import pytest
+import sheets
+from sheets.RangeRef import RangeRef
+from decimal import Decimal
+
+
+def make_workbook():
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    wb.new_sheet("Other Sheet")
+    wb.set_cell_contents("Sheet1", "A1", "1")
+    wb.set_cell_contents("Sheet1", "A3", "3")
+    wb.set_cell_contents("Sheet1", "B1", "'x")
+    wb.set_cell_contents("Sheet1", "B2", "'y")
+    wb.set_cell_contents("Sheet1", "B3", "'z")
+    wb.set_cell_contents("Other Sheet", "C2", "5")
+    return wb
+
+
+def test_aggregates_skip_empty_cells():
+    wb = make_workbook()
+    wb.set_cell_contents("Sheet1", "D1", "=SUM(A1:A5)")
+    wb.set_cell_contents("Sheet1", "D2", "=AVERAGE(A3:A1)")
+    wb.set_cell_contents("Sheet1", "D3", "=MIN(A2:A2)")
+    wb.set_cell_contents("Sheet1", "D4", "=MAX('Other Sheet'!A1:C3, A1)")
+    assert wb.get_cell_value("Sheet1", "D1") == Decimal(4)
+    assert wb.get_cell_value("Sheet1", "D2") == Decimal(2)
+    assert wb.get_cell_value("Sheet1", "D3") == Decimal(0)
+    assert wb.get_cell_value("Sheet1", "D4") == Decimal(5)
+
+
+def test_range_cells_are_dependencies():
+    wb = make_workbook()
+    wb.set_cell_contents("Sheet1", "D1", "=SUM(A1:A5)")
+    wb.set_cell_contents("Sheet1", "A5", "10")
+    assert wb.get_cell_value("Sheet1", "D1") == Decimal(14)
+    wb.set_cell_contents("Sheet1", "D2", "=SUM(A1:A5, D2)")
+    assert wb.get_cell_value("Sheet1", "D2").get_type() == sheets.CellErrorType.CIRCULAR_REFERENCE
+
+
+def test_lookups_read_rows_and_columns():
+    wb = make_workbook()
+    wb.set_cell_contents("Sheet1", "D1", '=VLOOKUP(3, A1:B3, 2)')
+    wb.set_cell_contents("Sheet1", "D2", '=HLOOKUP(1, A1:B3, 3)')
+    assert wb.get_cell_value("Sheet1", "D1") == "z"
+    assert wb.get_cell_value("Sheet1", "D2") == Decimal(3)
+
+
+def test_bad_ranges():
+    wb = make_workbook()
+    wb.set_cell_contents("Sheet1", "D1", "=SUM(Missing!A1:A2)")
+    wb.set_cell_contents("Sheet1", "D2", "=IF(TRUE, A1:A3, 0)")
+    assert wb.get_cell_value("Sheet1", "D1").get_type() == sheets.CellErrorType.BAD_REFERENCE
+    assert wb.get_cell_value("Sheet1", "D2").get_type() == sheets.CellErrorType.TYPE_ERROR
+
+    # Ranges can run past ZZZZ9999 once their corners are resolved
+    evaluator = sheets.Parser.FormulaEvaluator(wb, "Sheet1", {})
+    values = RangeRef(evaluator, "Sheet1", 9998, 1, 10000, 1).get_values()
+    assert values[:2] == [None, None]
+    assert values[2].get_type() == sheets.CellErrorType.BAD_REFERENCE
+
+
+def test_values_are_read_without_building_cells():
+    wb = make_workbook()
+    evaluator = sheets.Parser.FormulaEvaluator(wb, "Sheet1", {})
+    cell_range = RangeRef(evaluator, "Sheet1", 1, 1, 9999, 2)
+    assert cell_range.get_num_rows() == 9999
+    assert cell_range.get_num_cols() == 2
+    assert cell_range.get_values(skip_empty=True) == [Decimal(1), "x", "y", Decimal(3), "z"]
+    assert cell_range.get_row(1) == [None, "y"]
+    assert cell_range.get_column(0)[:3] == [Decimal(1), None, Decimal(3)]
+    assert ("Sheet1", 1, 1, 9999, 2) in evaluator.refs
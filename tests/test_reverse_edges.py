@@ -0,0 +1,71 @@
+import context
+import pytest
+import sheets
+from decimal import Decimal
+from sheets.Graph import Graph
+
+
+@pytest.fixture
+def wb():
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    wb.new_sheet("Other")
+    return wb
+
+
+def assert_mirrored(wb):
+    """Every edge is in both directions of the graph."""
+    assert wb.graph.check_consistency() == []
+
+
+def test_set_and_remove_children():
+    g = Graph()
+    g.add_connection("sheet1", "a1", "sheet1", "b1")
+    g.add_connection("sheet1", "a1", "sheet2", "c1")
+    assert g.get_children_from_cell("sheet1", "a1") == {("sheet1", "b1"), ("sheet2", "c1")}
+
+    g.set_children("sheet1", "a1", {("sheet2", "c1"), ("sheet2", "c2")})
+    assert list(g.get_parents_from_cell("sheet1", "b1")) == []
+    assert list(g.get_parents_from_cell("sheet2", "c2")) == [("sheet1", "a1")]
+
+    g.remove_children("sheet1", "a1")
+    assert g.get_children_from_cell("sheet1", "a1") == set()
+    assert list(g.get_parents_from_cell("sheet2", "c1")) == []
+    assert list(g.get_parents_from_cell("sheet2", "c2")) == []
+
+
+def test_replacing_a_formula_removes_its_edges(wb):
+    wb.set_cell_contents("Sheet1", "A1", "=B1 + Other!C1")
+    assert wb.graph.get_children_from_cell("sheet1", "a1") == {("sheet1", "b1"), ("other", "c1")}
+    wb.set_cell_contents("Sheet1", "A1", "=B2")
+    assert wb.graph.get_children_from_cell("sheet1", "a1") == {("sheet1", "b2")}
+    assert list(wb.graph.get_parents_from_cell("other", "c1")) == []
+    wb.set_cell_contents("Sheet1", "A1", None)
+    assert wb.graph.get_children_from_cell("sheet1", "a1") == set()
+    assert list(wb.graph.get_parents_from_cell("sheet1", "b2")) == []
+    assert_mirrored(wb)
+
+
+def test_indirect_targets_are_mirrored(wb):
+    wb.set_cell_contents("Sheet1", "A1", '=INDIRECT(B1)')
+    wb.set_cell_contents("Sheet1", "B1", "C1")
+    assert ("sheet1", "c1") in wb.graph.get_children_from_cell("sheet1", "a1")
+    wb.set_cell_contents("Sheet1", "B1", "Other!D1")
+    assert ("sheet1", "c1") not in wb.graph.get_children_from_cell("sheet1", "a1")
+    assert ("other", "d1") in wb.graph.get_children_from_cell("sheet1", "a1")
+    assert_mirrored(wb)
+
+
+def test_formulas_on_a_renamed_sheet_stay_live(wb):
+    wb.set_cell_contents("Sheet1", "A1", "=Other!A1 + 1")
+    wb.set_cell_contents("Sheet1", "A2", "=A1 * 2")
+    wb.set_cell_contents("Other", "B1", "=Sheet1!A2")
+    wb.rename_sheet("Sheet1", "Renamed")
+
+    wb.set_cell_contents("Other", "A1", "4")
+    assert wb.get_cell_value("Renamed", "A1") == Decimal(5)
+    assert wb.get_cell_value("Renamed", "A2") == Decimal(10)
+    assert wb.get_cell_value("Other", "B1") == Decimal(10)
+    assert wb.graph.get_children_from_cell("other", "b1") == {("renamed", "a2")}
+    assert "sheet1" not in wb.graph.parents_to_children
+    assert_mirrored(wb)
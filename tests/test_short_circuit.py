@@ -0,0 +1,100 @@
+import context
+import pytest
+import sheets
+from decimal import Decimal
+
+
+@pytest.fixture
+def wb():
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    return wb
+
+
+def value(wb, formula):
+    wb.set_cell_contents("Sheet1", "Z1", formula)
+    return wb.get_cell_value("Sheet1", "Z1")
+
+
+def parents(wb, location):
+    return list(wb.graph.get_parents_from_cell("sheet1", location))
+
+
+@pytest.mark.parametrize(
+    "formula, expected",
+    [
+        ("=AND(FALSE, 1/0)", False),
+        ("=OR(TRUE, 1/0)", True),
+        ("=XOR(TRUE, FALSE, 1/0)", True),
+        ("=XOR(TRUE, TRUE, TRUE)", False),
+        ("=AND(A1:A3)", True),
+        ("=OR(A1:A3, FALSE)", True),
+    ],
+)
+def test_result_decided_early(wb, formula, expected):
+    for row in range(1, 4):
+        wb.set_cell_contents("Sheet1", f"A{row}", "TRUE")
+    assert value(wb, formula) is expected
+
+
+@pytest.mark.parametrize(
+    "formula, error",
+    [
+        ("=AND(1/0, FALSE)", sheets.CellErrorType.DIVIDE_BY_ZERO),
+        ("=OR(FALSE, #REF!)", sheets.CellErrorType.BAD_REFERENCE),
+        ("=XOR(TRUE, 1/0)", sheets.CellErrorType.TYPE_ERROR),
+        ("=AND(Missing!A1:A3)", sheets.CellErrorType.BAD_REFERENCE),
+        # The first error reached, not the highest precedence one
+        ("=AND(1/0, #REF!)", sheets.CellErrorType.DIVIDE_BY_ZERO),
+        ("=OR(FALSE, 1/0, #REF!)", sheets.CellErrorType.DIVIDE_BY_ZERO),
+        ("=XOR(1/0, #REF!)", sheets.CellErrorType.TYPE_ERROR),
+    ],
+)
+def test_errors_before_the_result_is_decided(wb, formula, error):
+    assert value(wb, formula).get_type() == error
+
+
+@pytest.mark.parametrize("function", ["AND", "OR", "XOR"])
+@pytest.mark.parametrize("first", ["FALSE", "TRUE", "=#REF!", None])
+def test_range_holding_the_formula_is_circular(wb, function, first):
+    # However far the range is read, and whichever cell is set last
+    formula = f'={function}(Sheet1!A4:B1) = ""'
+    wb.set_cell_contents("Sheet1", "A1", first)
+    wb.set_cell_contents("Sheet1", "A4", formula)
+    wb.set_cell_contents("Sheet1", "B1", "=#REF!")
+    assert value(wb, "=A4").get_type() == sheets.CellErrorType.CIRCULAR_REFERENCE
+
+    wb.set_cell_contents("Sheet1", "A4", None)
+    wb.set_cell_contents("Sheet1", "A4", formula)
+    wb.set_cell_contents("Sheet1", "A1", first)
+    assert value(wb, "=A4").get_type() == sheets.CellErrorType.CIRCULAR_REFERENCE
+
+
+def test_skipped_arguments_are_not_references(wb):
+    wb.set_cell_contents("Sheet1", "A1", "TRUE")
+    wb.set_cell_contents("Sheet1", "B1", "=OR(A1, A2)")
+    assert ("sheet1", "b1") in parents(wb, "a1")
+    assert ("sheet1", "b1") not in parents(wb, "a2")
+
+    wb.set_cell_contents("Sheet1", "A1", "FALSE")
+    assert ("sheet1", "b1") in parents(wb, "a2")
+    wb.set_cell_contents("Sheet1", "A2", "TRUE")
+    assert wb.get_cell_value("Sheet1", "B1") is True
+
+
+def test_ranges_are_read_until_decided(wb):
+    wb.set_cell_contents("Sheet1", "A2", "0")
+    wb.set_cell_contents("Sheet1", "B1", "=AND(A1:A5)")
+    assert wb.get_cell_value("Sheet1", "B1") is False
+    assert ("sheet1", "b1") in parents(wb, "a2")
+    assert ("sheet1", "b1") not in parents(wb, "a3")
+
+
+def test_untaken_branches_are_not_references(wb):
+    wb.set_cell_contents("Sheet1", "B1", "=IF(A1, CHOOSE(2, A2, A3, A4), A5)")
+    assert parents(wb, "a5") == [("sheet1", "b1")]
+    wb.set_cell_contents("Sheet1", "A1", "TRUE")
+    wb.set_cell_contents("Sheet1", "A3", "7")
+    assert wb.get_cell_value("Sheet1", "B1") == Decimal(7)
+    assert parents(wb, "a5") == []
+    assert parents(wb, "a2") == []
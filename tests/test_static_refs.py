@@ -0,0 +1,64 @@
+import context
+import json
+import pytest
+import sheets
+from sheets.Parser import parser, FormulaToTemplate
+from sheets.FormulaTemplate import FormulaTemplate
+from sheets.Graph import Graph
+from decimal import Decimal
+
+
+def make_template(formula, row, col):
+    tree = FormulaToTemplate(row, col).transform(parser.parse(formula))
+    return FormulaTemplate(tree, None)
+
+
+def test_cell_refs_include_both_branches_and_ranges():
+    template = make_template("=IF(A1, Other!B2, SUM(C1:D2)) + $E$5", 3, 3)
+    assert template.get_cell_refs("sheet1", 3, 3) == {
+        "sheet1!a1",
+        "Other!b2",
+        ("sheet1", 1, 3, 2, 4),
+        "sheet1!e5",
+    }
+    # The same template anchored one row down
+    assert "sheet1!a2" in template.get_cell_refs("sheet1", 4, 3)
+    assert template.get_sheet_names() == {"Other"}
+    assert not template.is_dynamic
+
+
+def test_indirect_is_dynamic():
+    assert make_template('=INDIRECT("A" & 1)', 1, 1).is_dynamic
+    assert make_template("=indirect(B1)", 1, 1).is_dynamic
+
+
+def test_strongly_connected_components_order():
+    children = {
+        "a": {"b"},
+        "b": {"c"},
+        "c": {"b", "d"},
+        "d": set(),
+    }
+    components = Graph.strongly_connected_components(children)
+    assert [sorted(c) for c in components] == [["d"], ["b", "c"], ["a"]]
+
+
+def test_load_evaluates_chain_in_dependency_order(tmp_path):
+    # Cells are listed before the cells they depend on
+    cells = {f"A{row}": f"=A{row + 1} + 1" for row in range(1, 50)}
+    cells["A50"] = "1"
+    cells["B1"] = "=B1"
+    cells["C1"] = '=INDIRECT("A1") * 2'
+    data = {"sheets": [{"name": "Sheet1", "cell-contents": cells}]}
+    path = tmp_path / "chain.json"
+    path.write_text(json.dumps(data))
+
+    with open(path) as fp:
+        wb = sheets.Workbook.load_workbook(fp)
+    assert wb.get_cell_value("Sheet1", "A1") == Decimal(50)
+    assert wb.get_cell_value("Sheet1", "C1") == Decimal(100)
+    assert wb.get_cell_value("Sheet1", "B1").get_type() == sheets.CellErrorType.CIRCULAR_REFERENCE
+
+    wb.set_cell_contents("Sheet1", "A50", "2")
+    assert wb.get_cell_value("Sheet1", "A1") == Decimal(51)
+    assert wb.get_cell_value("Sheet1", "C1") == Decimal(102)
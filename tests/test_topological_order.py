@@ -0,0 +1,155 @@
+import context
+import io
+import random
+import pytest
+import sheets
+from decimal import Decimal
+from sheets.Graph import Graph
+
+
+@pytest.fixture
+def wb():
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    return wb
+
+
+def test_edges_in_order_need_no_search():
+    g = Graph()
+    g.add_connection("s", "b1", "s", "a1")
+    g.add_connection("s", "c1", "s", "b1")
+    assert g.get_order("s", "a1") < g.get_order("s", "b1") < g.get_order("s", "c1")
+    assert g.check_order() == []
+
+
+def test_chain_built_backwards_is_reordered():
+    g = Graph()
+    # Each formula references a cell that is only referenced later on
+    for row in range(1, 20):
+        g.add_connection("s", f"a{row}", "s", f"a{row + 1}")
+        g.add_connection("s", f"b{row}", "s", f"a{row}")
+    assert g.check_order() == []
+    assert not g.back_edges
+    positions = [g.get_order("s", f"a{row}") for row in range(1, 21)]
+    assert positions == sorted(positions, reverse=True)
+
+
+def test_back_edges():
+    g = Graph()
+    g.add_connection("s", "a1", "s", "a2")
+    g.add_connection("s", "a2", "s", "a3")
+    g.add_connection("s", "a3", "s", "a1")
+    assert g.get_back_edges() == [(("s", "a3"), ("s", "a1"))]
+    assert not g.is_ordered("s", "a1")
+    assert g.is_ordered("s", "a2")
+
+    # Breaking the cycle elsewhere puts the back edge in order
+    g.update_child("s", "a1", "s", "a2")
+    assert not g.back_edges
+    assert g.is_ordered("s", "a1")
+    assert g.check_order() == []
+
+    g.add_connection("s", "a4", "s", "a4")
+    assert not g.is_ordered("s", "a4")
+    g.remove_children("s", "a4")
+    assert not g.back_edges
+
+
+def test_cells_referenced_by_ranges_are_not_ordered(wb):
+    wb.set_cell_contents("Sheet1", "B1", "=SUM(A1:A3)")
+    assert not wb.graph.is_ordered("sheet1", "a2")
+    assert wb.graph.is_ordered("sheet1", "a4")
+
+
+def test_rename_merges_positions(wb):
+    wb.set_cell_contents("Sheet1", "A1", "=New!B1 + 1")
+    wb.new_sheet("Other")
+    wb.set_cell_contents("Other", "A1", "=Sheet1!A1")
+    wb.set_cell_contents("Sheet1", "B1", "=Other!A1")
+    wb.rename_sheet("Sheet1", "New")
+    assert wb.graph.check_order() == []
+    assert wb.get_cell_value("New", "A1").get_type() == sheets.CellErrorType.CIRCULAR_REFERENCE
+    wb.set_cell_contents("New", "B1", "4")
+    assert wb.graph.check_order() == []
+    assert wb.get_cell_value("Other", "A1") == Decimal(5)
+
+
+def test_random_edits_match_a_fresh_load():
+    rng = random.Random(130)
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    locations = [f"{column}{row}" for column in "ABCD" for row in range(1, 5)]
+    for _ in range(300):
+        location = rng.choice(locations)
+        kind = rng.random()
+        if kind < 0.2:
+            contents = str(rng.randint(1, 9))
+        elif kind < 0.3:
+            contents = None
+        elif kind < 0.4:
+            contents = f"=SUM({rng.choice(locations)}:{rng.choice(locations)})"
+        elif kind < 0.5:
+            contents = f'=INDIRECT("{rng.choice(locations)}") + 1'
+        else:
+            contents = f"={rng.choice(locations)} + {rng.choice(locations)}"
+        wb.set_cell_contents("Sheet1", location, contents)
+        assert wb.graph.check_order() == []
+
+        fp = io.StringIO()
+        wb.save_workbook(fp)
+        fp.seek(0)
+        loaded = sheets.Workbook.load_workbook(fp)
+        for other in locations:
+            assert str(wb.get_cell_value("Sheet1", other)) == str(loaded.get_cell_value("Sheet1", other)), (
+                contents,
+                location,
+                other,
+            )
+
+
+def test_unrelated_removals_leave_back_edges_alone(monkeypatch):
+    g = Graph()
+    # The cells edited below come first, so every back edge spans them
+    for row in range(1, 52):
+        g.add_connection("s", f"e{row}", "s", f"c{row}")
+    g.add_connection("s", "d1", "s", "c1")
+    for row in range(1, 201):
+        g.add_connection("s", f"a{row}", "s", f"b{row}")
+        g.add_connection("s", f"b{row}", "s", f"a{row}")
+    assert len(g.back_edges) == 200
+
+    retried = []
+    add_to_order = Graph._add_to_order
+
+    def counted(self, parent, child):
+        retried.append((parent, child))
+        return add_to_order(self, parent, child)
+
+    monkeypatch.setattr(Graph, "_add_to_order", counted)
+    for row in range(2, 52):
+        g.set_children("s", "d1", {("s", f"c{row}")})
+    # Only the new edges are put in order; no back edge is tried again
+    assert len(retried) == 50
+    assert len(g.back_edges) == 200
+
+    # Breaking one cycle only retries its own back edge
+    retried.clear()
+    g.remove_children("s", "a7")
+    assert len(g.back_edges) == 199
+    assert len(retried) <= 1
+    assert g.check_order() == []
+
+
+def test_every_back_edge_closes_a_cycle():
+    rng = random.Random(22)
+    g = Graph()
+    locations = [f"a{row}" for row in range(1, 13)]
+    for _ in range(400):
+        parent, child = rng.choice(locations), rng.choice(locations)
+        if rng.random() < 0.5:
+            g.add_connection("s", parent, "s", child)
+        else:
+            g.update_child("s", parent, "s", child)
+        assert g.check_order() == []
+        for back_parent, back_child in list(g.back_edges):
+            assert not g._add_to_order(back_parent, back_child)
@@ -0,0 +1,55 @@
+import context
+import gc
+import pytest
+import sheets
+from sheets.Parser import parser, FormulaToTemplate
+from sheets.TreeInterner import TreeInterner
+from decimal import Decimal
+
+
+def template_tree(formula, row=1, col=1):
+    return FormulaToTemplate(row, col).transform(parser.parse(formula))
+
+
+def test_common_subtrees_are_shared():
+    interner = TreeInterner()
+    first = interner.intern(template_tree("=A2 * 2 + SUM($A$1:$A$3)"))
+    second = interner.intern(template_tree("=A2 * 3 + SUM($A$1:$A$3)"))
+    assert first == template_tree("=A2 * 2 + SUM($A$1:$A$3)")
+    assert first is not second
+    # add_expr(mul_expr(cell, *, number), +, function)
+    assert first.children[2] is second.children[2]
+    assert first.children[0].children[0] is second.children[0].children[0]
+    assert first.children[1] is second.children[1]
+
+    # Relative references are shared once normalized to offsets
+    third = interner.intern(template_tree("=B3 * 2 + SUM($A$1:$A$3)", 2, 2))
+    assert third is first
+
+
+def test_unused_trees_and_tokens_are_dropped():
+    interner = TreeInterner()
+    interner.SWEEP_THRESHOLD = 4
+    interner.sweep_at = 4
+    kept = interner.intern(template_tree("=1 + 2"))
+    for i in range(100):
+        interner.intern(template_tree(f'="text {i}"'))
+    gc.collect()
+    interner.intern(template_tree("=3"))
+    assert len(interner.tokens) < 10
+    assert interner.intern(template_tree("=1 + 2")) is kept
+
+
+def test_memory_report():
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    for row in range(1, 21):
+        wb.set_cell_contents("Sheet1", f"A{row}", str(row))
+        wb.set_cell_contents("Sheet1", f"B{row}", f"=A{row} * {row} + SUM($A$1:$A$5)")
+    assert wb.get_cell_value("Sheet1", "B3") == Decimal(24)
+
+    report = wb.get_formula_memory_report()
+    assert report["trees"] == 20
+    assert report["nodes"] < report["unshared_nodes"]
+    assert report["bytes_saved"] == report["unshared_bytes"] - report["bytes"]
+    assert report["bytes_saved"] > 0
@@ -0,0 +1,120 @@
+import context
+import io
+import json
+import pytest
+import sheets
+from decimal import Decimal
+
+
+@pytest.fixture
+def wb():
+    wb = sheets.Workbook()
+    wb.new_sheet("Sheet1")
+    wb.new_sheet("Other")
+    wb.set_cell_contents("Sheet1", "A1", "4")
+    wb.set_cell_contents("Sheet1", "A2", "=A1 * 2.5")
+    wb.set_cell_contents("Sheet1", "A3", "=SUM(A1:A2) + Other!B1")
+    wb.set_cell_contents("Sheet1", "A4", '=A1 & "x"')
+    wb.set_cell_contents("Sheet1", "A5", "=A1 > 3")
+    wb.set_cell_contents("Sheet1", "A6", "=A1 / 0")
+    wb.set_cell_contents("Sheet1", "A7", '=INDIRECT("A" & A1)')
+    wb.set_cell_contents("Sheet1", "A8", "=Missing!A1")
+    wb.set_cell_contents("Sheet1", "B1", "=B2")
+    wb.set_cell_contents("Sheet1", "B2", "=B1")
+    wb.set_cell_contents("Other", "B1", "=Sheet1!A2 - 1")
+    return wb
+
+
+@pytest.fixture
+def evaluations(monkeypatch):
+    """The locations of the formulas evaluated by any workbook."""
+    evaluated = []
+    get_formula_value = sheets.Workbook.get_formula_value
+
+    def counted(self, hidden_name, location, cell):
+        evaluated.append(location)
+        return get_formula_value(self, hidden_name, location, cell)
+
+    monkeypatch.setattr(sheets.Workbook, "get_formula_value", counted)
+    return evaluated
+
+
+def save(wb, **kwargs) -> io.StringIO:
+    fp = io.StringIO()
+    wb.save_workbook(fp, **kwargs)
+    fp.seek(0)
+    return fp
+
+
+def values(wb) -> dict:
+    return {
+        (sheet_name, location): str(wb.get_cell_value(sheet_name, location))
+        for sheet_name in wb.list_sheets()
+        for location in wb.sheets[sheet_name.lower()].get_sheet_cells()
+    }
+
+
+def test_state_is_optional(wb):
+    assert "state" not in json.load(save(wb))
+    assert "state" in json.load(save(wb, include_state=True))
+
+
+def test_warm_load_evaluates_nothing(wb, evaluations):
+    fp = save(wb, include_state=True)
+    evaluations.clear()
+    loaded = sheets.Workbook.load_workbook(fp)
+    assert evaluations == []
+    assert values(loaded) == values(wb)
+    assert loaded.get_cell_value("Sheet1", "A2") == Decimal(10)
+    assert loaded.get_cell_value("Sheet1", "A4") == "4x"
+    assert loaded.get_cell_value("Sheet1", "A5") is True
+    assert loaded.get_cell_value("Sheet1", "A6").get_type() == sheets.CellErrorType.DIVIDE_BY_ZERO
+    assert loaded.get_cell_value("Sheet1", "B1").get_type() == sheets.CellErrorType.CIRCULAR_REFERENCE
+    assert loaded.graph.check_consistency() == []
+    assert loaded.graph.check_order() == []
+
+
+def test_edits_after_a_warm_load(wb):
+    loaded = sheets.Workbook.load_workbook(save(wb, include_state=True))
+    loaded.set_cell_contents("Sheet1", "A1", "2")
+    wb.set_cell_contents("Sheet1", "A1", "2")
+    assert values(loaded) == values(wb)
+    assert loaded.get_cell_value("Other", "B1") == Decimal(4)
+
+    # The references INDIRECT followed and the missing sheet are kept too
+    loaded.set_cell_contents("Sheet1", "A2", "7")
+    assert loaded.get_cell_value("Sheet1", "A7") == Decimal(7)
+    loaded.new_sheet("Missing")
+    loaded.set_cell_contents("Missing", "A1", "3")
+    assert loaded.get_cell_value("Sheet1", "A8") == Decimal(3)
+    loaded.set_cell_contents("Sheet1", "B2", "1")
+    assert loaded.get_cell_value("Sheet1", "B1") == Decimal(1)
+
+
+def test_state_of_other_contents_is_ignored(wb, evaluations):
+    saved = json.load(save(wb, include_state=True))
+    saved["sheets"][0]["cell-contents"]["A1"] = "6"
+    evaluations.clear()
+    loaded = sheets.Workbook.load_workbook(io.StringIO(json.dumps(saved)))
+    assert evaluations != []
+    assert loaded.get_cell_value("Sheet1", "A2") == Decimal(15)
+
+
+def test_state_of_another_numeric_mode_is_ignored(wb):
+    fp = save(wb, include_state=True)
+    loaded = sheets.Workbook.load_workbook(fp, numeric_mode="float")
+    assert loaded.get_cell_value("Sheet1", "A2") == 10.0
+    assert type(loaded.get_cell_value("Sheet1", "A2")) is float
+
+
+@pytest.mark.parametrize("numeric_mode", ["float", "hybrid"])
+def test_numbers_keep_their_type(numeric_mode):
+    wb = sheets.Workbook(numeric_mode)
+    wb.new_sheet()
+    wb.set_cell_contents("Sheet1", "A1", "=1 / 3")
+    wb.set_cell_contents("Sheet1", "A2", "=2 * 3")
+    loaded = sheets.Workbook.load_workbook(save(wb, include_state=True), numeric_mode)
+    for location in ["A1", "A2"]:
+        value = wb.get_cell_value("Sheet1", location)
+        loaded_value = loaded.get_cell_value("Sheet1", location)
+        assert loaded_value == value and type(loaded_value) is type(value)